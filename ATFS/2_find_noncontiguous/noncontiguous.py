@@ -0,0 +1,382 @@
+"""
+Pure-Python non-contiguous tree farm detector (no arcpy)
+
+2_find_noncontiguous_BPH.py runs MakeFeatureLayer, GetCount, a 42-foot dissolved
+Buffer, MultipartToSinglepart and another GetCount for every tree farm with more than
+one part - five geoprocessing calls per farm. Here every farm is classified in one pass:
+
+    1. explode the features into single parts and project them to Albers (one
+       vectorized transform over all vertices)
+    2. one STRtree over all parts; a single "dwithin" query finds the pairs of parts
+       that are within 2 x 42 ft of each other, and pairs from different tree farms
+       are dropped
+    3. union-find over those pairs gives the connected parts of each farm; a farm with
+       more than one component is non-contiguous
+
+Two 42 ft buffers touch exactly when their parts are at most 84 ft apart, and the
+dissolve chains touching buffers together, so the components are the buffer parts
+the arcpy script counts (up to ArcGIS's arc densification of the round buffer ends).
+
+Outputs are the same as the arcpy script: noncontiguous_farms.txt (in this folder by
+default) and a layer with the original features of the non-contiguous farms
+(NonContiguousFarms.shp instead of the scratch GDB feature class).
+
+Statewide inputs (OR_33.shp, hundreds of thousands of parcels) can be split across
+processes with --workers. Parts of different tree farms are never linked, so the farms
+are partitioned by treefarm_id: every farm goes whole into one partition (largest
+farms first, onto the least loaded partition), each worker reads only its partition's
+features from the shapefile (by feature id) and classifies them with the same serial
+algorithm, and the per-farm component counts are merged. The result is identical to
+the serial run, and no process holds the whole dataset's geometries.
+
+Every run also saves a fingerprint store (noncontiguous_fingerprints.json in the output
+folder): per treefarm_id, a hash of the WKB of each of its parts, and its component
+count. With --incremental, the parts are hashed and compared to the store from the
+previous run, and only the farms whose part set changed (or that are new) are projected
+and classified; every other farm keeps its cached count, and farms that are gone are
+dropped. A farm's verdict depends only on its own parts, so the result is the same as a
+full run, in time proportional to the edits. A missing store, or one saved with another
+link distance or source projection, means a full run.
+
+Usage:
+    python noncontiguous.py <tree farm shapefile> [output folder] [--field treefarm_id] [--workers N] [--incremental]
+"""
+
+import hashlib
+import heapq
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyogrio
+import shapely
+
+# Shared reprojection module (cached pyproj transformers)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "WoodPro", "Tract Export ", "TractExport"))
+import projection
+
+BUFFER_FEET = 42
+FOOT = 0.3048  # meters
+LINK_DISTANCE = 2 * BUFFER_FEET * FOOT  # parts whose 42 ft buffers touch
+ID_FIELDS = ("treefarm_id", "treefarm_i")  # shapefiles truncate field names to 10 characters
+RESULTS_NAME = "noncontiguous_farms.txt"
+LAYER_NAME = "NonContiguousFarms.shp"
+FINGERPRINTS_NAME = "noncontiguous_fingerprints.json"
+FINGERPRINT_VERSION = 1  # bump when the hashing changes, so older stores are not reused
+PARTITIONS_PER_WORKER = 4  # more partitions than workers, so one slow partition doesn't hold up the rest
+
+
+class UnionFind:
+    """Disjoint sets over 0..n-1 (union by size, path halving)"""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return False
+        if self.size[i] < self.size[j]:
+            i, j = j, i
+        self.parent[j] = i
+        self.size[i] += self.size[j]
+        return True
+
+    def roots(self):
+        return np.fromiter((self.find(i) for i in range(len(self.parent))), dtype="int64", count=len(self.parent))
+
+
+def resolve_id_field(columns, id_field=None):
+    """The tree farm ID column (case-insensitive), treefarm_id or its shapefile form treefarm_i"""
+    by_name = {c.lower(): c for c in columns}
+    for name in ([id_field] if id_field else ID_FIELDS):
+        if name.lower() in by_name:
+            return by_name[name.lower()]
+    raise ValueError(f"No tree farm ID field ({id_field or ', '.join(ID_FIELDS)}) in: {', '.join(columns)}")
+
+
+def split_parts(geometries, ids):
+    """
+    Single parts of every feature, unprojected: (part_ids, parts). Null and empty
+    geometries have no parts, like MultipartToSinglepart.
+    """
+    parts, index = shapely.get_parts(np.asarray(geometries, dtype=object), return_index=True)
+    keep = ~shapely.is_empty(parts)
+    return np.asarray(ids)[index[keep]], parts[keep]
+
+
+def to_albers(parts, src_crs):
+    return projection.transform_geometries(parts, src_crs, projection.ALBERS, transformation=None)
+
+
+def link_pairs(part_ids, parts, distance=LINK_DISTANCE):
+    """(i, j) index arrays, i < j, of parts of the same tree farm within distance of each other"""
+    if not len(parts):
+        return np.zeros(0, dtype="int64"), np.zeros(0, dtype="int64")
+    i, j = shapely.STRtree(parts).query(parts, predicate="dwithin", distance=distance)
+    same = (i < j) & (part_ids[i] == part_ids[j])
+    return i[same], j[same]
+
+
+def count_components(part_ids, pairs):
+    """{tree farm id: number of connected components of its parts}"""
+    uf = UnionFind(len(part_ids))
+    for i, j in zip(*[p.tolist() for p in pairs]):
+        uf.union(i, j)
+    components = pd.DataFrame({"id": part_ids, "root": uf.roots()}).groupby("id", sort=True)["root"].nunique()
+    return {k: int(n) for k, n in components.items()}
+
+
+def find_noncontiguous(part_ids, parts, distance=LINK_DISTANCE):
+    """(sorted non-contiguous tree farm ids, {id: components}) for exploded, projected parts"""
+    components = count_components(part_ids, link_pairs(part_ids, parts, distance))
+    return [k for k, n in components.items() if n > 1], components
+
+
+def part_counts(part_ids):
+    """{tree farm id: number of single parts}"""
+    ids, counts = np.unique(part_ids, return_counts=True)
+    return dict(zip(ids.tolist(), counts.tolist()))
+
+
+def part_hashes(parts):
+    """Hex digest of each part's WKB (as read, before projection)"""
+    return [hashlib.blake2b(wkb, digest_size=12).hexdigest() for wkb in shapely.to_wkb(parts).tolist()]
+
+
+def farm_fingerprints(part_ids, parts):
+    """{tree farm id: sorted part hashes} - the farm's part set, independent of feature and part order"""
+    fingerprints = {}
+    for treefarm_id, digest in zip(part_ids.tolist(), part_hashes(parts)):
+        fingerprints.setdefault(treefarm_id, []).append(digest)
+    for digests in fingerprints.values():
+        digests.sort()
+    return fingerprints
+
+
+def load_fingerprints(store_path, src_crs, distance=LINK_DISTANCE):
+    """
+    {tree farm id: {"parts": sorted part hashes, "components": n}} from the previous
+    run's store; empty when there is none or it was saved for another source
+    projection or link distance.
+    """
+    if not os.path.exists(store_path):
+        return {}
+    with open(store_path) as f:
+        store = json.load(f)
+    if (store.get("version") != FINGERPRINT_VERSION or store.get("crs") != src_crs
+            or not np.isclose(store.get("distance", -1), distance)):
+        return {}
+    return {treefarm_id: {"parts": digests, "components": n} for treefarm_id, digests, n in store["farms"]}
+
+
+def save_fingerprints(store_path, src_crs, distance, fingerprints, components):
+    """Write the store for the next incremental run (farms as [id, part hashes, components])"""
+    store = {
+        "version": FINGERPRINT_VERSION,
+        "crs": src_crs,
+        "distance": distance,
+        "farms": [[treefarm_id, fingerprints[treefarm_id], components[treefarm_id]] for treefarm_id in components],
+    }
+    tmp_path = store_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(store, f, separators=(",", ":"))
+    os.replace(tmp_path, store_path)
+    return store_path
+
+
+def find_noncontiguous_incremental(part_ids, parts, src_crs, cached, distance=LINK_DISTANCE):
+    """
+    find_noncontiguous() for unprojected parts, re-classifying only the farms whose
+    part set differs from cached (load_fingerprints()). Returns (sorted
+    non-contiguous ids, {id: components}, fingerprints, changed farm ids).
+    """
+    fingerprints = farm_fingerprints(part_ids, parts)
+    changed = [k for k, digests in fingerprints.items() if k not in cached or cached[k]["parts"] != digests]
+    rows = np.isin(part_ids, changed)
+    changed_components = find_noncontiguous(part_ids[rows], to_albers(parts[rows], src_crs), distance)[1]
+    components = {k: changed_components[k] if k in changed_components else cached[k]["components"]
+                  for k in sorted(fingerprints)}
+    return [k for k, n in components.items() if n > 1], components, fingerprints, sorted(changed)
+
+
+def plan_partitions(ids, num_partitions):
+    """
+    Row indices per partition, every tree farm's rows in one partition. Farms go
+    largest first (ties by id) onto the partition with the fewest rows, so the plan
+    is balanced and the same for the same input.
+    """
+    codes, uniques = pd.factorize(pd.Series(ids), sort=True)
+    sizes = np.bincount(codes, minlength=len(uniques))
+    order = np.lexsort((np.arange(len(uniques)), -sizes))
+    heap = [(0, p) for p in range(max(1, min(num_partitions, len(uniques))))]
+    assignment = np.zeros(len(uniques), dtype="int64")
+    for farm in order:
+        load, p = heapq.heappop(heap)
+        assignment[farm] = p
+        heapq.heappush(heap, (load + int(sizes[farm]), p))
+    row_partition = assignment[codes]
+    return [np.flatnonzero(row_partition == p) for p in range(len(heap))]
+
+
+def classify_partition(path, id_field, fids, distance=LINK_DISTANCE):
+    """
+    Worker: read the features fids from path, explode, project and classify them:
+    (components, part counts, fingerprints)
+    """
+    farms = pyogrio.read_dataframe(path, columns=[id_field], fids=fids)
+    part_ids, parts = split_parts(farms.geometry.values, farms[id_field].values)
+    components = find_noncontiguous(part_ids, to_albers(parts, farms.crs.to_wkt()), distance)[1]
+    return components, part_counts(part_ids), farm_fingerprints(part_ids, parts)
+
+
+def find_noncontiguous_partitioned(path, id_field, ids, fids, workers, num_partitions=None, distance=LINK_DISTANCE):
+    """
+    find_noncontiguous() over partitions of whole tree farms in a process pool.
+    ids / fids: tree farm id and feature id of every feature of path (read_ids()).
+    Returns (sorted non-contiguous ids, {id: components}, {id: parts}, fingerprints),
+    the same as the serial run.
+    """
+    partitions = [fids[rows] for rows in plan_partitions(ids, num_partitions or workers * PARTITIONS_PER_WORKER)]
+    components = {}
+    parts = {}
+    fingerprints = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(classify_partition, path, id_field, fids, distance) for fids in partitions if len(fids)]
+        for future in futures:
+            partition_components, partition_parts, partition_fingerprints = future.result()
+            components.update(partition_components)
+            parts.update(partition_parts)
+            fingerprints.update(partition_fingerprints)
+    components = {k: components[k] for k in sorted(components)}
+    return [k for k, n in components.items() if n > 1], components, parts, fingerprints
+
+
+def read_ids(path, id_field=None):
+    """(id field, tree farm id of every feature, feature ids) without reading any geometry"""
+    id_field = resolve_id_field(pyogrio.read_info(path)["fields"], id_field)
+    ids = pyogrio.read_dataframe(path, columns=[id_field], read_geometry=False, fid_as_index=True)[id_field]
+    return id_field, ids.values, ids.index.values
+
+
+def load_parts(path, id_field=None):
+    """(tree farms frame, id field, part_ids, unprojected parts) for a tree farm shapefile/feature layer"""
+    farms = gpd.read_file(path, engine="pyogrio")
+    id_field = resolve_id_field(farms.columns, id_field)
+    part_ids, parts = split_parts(farms.geometry.values, farms[id_field].values)
+    return farms, id_field, part_ids, parts
+
+
+def write_results(ids, results_file):
+    """noncontiguous_farms.txt in the arcpy script's format"""
+    with open(results_file, "w") as f:
+        f.write("Non-contiguous tree farm IDs:\n")
+        for treefarm_id in ids:
+            f.write(f"{treefarm_id}\n")
+    return results_file
+
+
+def write_layer(farms, id_field, ids, layer_path):
+    """The original features of the non-contiguous farms (None when there are none)"""
+    if not len(ids):
+        return None
+    farms[farms[id_field].isin(ids)].to_file(layer_path, engine="pyogrio")
+    return layer_path
+
+
+def run(path, out_folder=None, id_field=None, distance=LINK_DISTANCE, workers=1, incremental=False):
+    """
+    Classify every tree farm in path and write the results; returns a summary dict.
+    workers > 1: partitioned by tree farm across that many processes.
+    incremental: re-classify only the farms changed since the fingerprint store in
+    out_folder was saved (in this process; workers apply to full runs).
+    """
+    out_folder = out_folder or os.path.dirname(os.path.abspath(__file__))
+    store_path = os.path.join(out_folder, FINGERPRINTS_NAME)
+    start = time.perf_counter()
+    changed = None
+    if workers > 1 and not incremental:
+        id_field, ids, fids = read_ids(path, id_field)
+        src_crs = pyogrio.read_info(path)["crs"]
+        loaded = time.perf_counter()
+        noncontiguous, components, parts, fingerprints = find_noncontiguous_partitioned(path, id_field, ids, fids,
+                                                                                        workers, distance=distance)
+        classified = time.perf_counter()
+        # only the non-contiguous farms' features are read for the output layer
+        farms = gpd.read_file(path, engine="pyogrio", fids=fids[pd.Series(ids).isin(noncontiguous).values])
+        num_features = len(ids)
+    else:
+        workers = 1
+        farms, id_field, part_ids, part_geometries = load_parts(path, id_field)
+        src_crs = pyogrio.read_info(path)["crs"]
+        loaded = time.perf_counter()
+        cached = load_fingerprints(store_path, src_crs, distance) if incremental else {}
+        noncontiguous, components, fingerprints, changed = find_noncontiguous_incremental(
+            part_ids, part_geometries, farms.crs.to_wkt(), cached, distance)
+        classified = time.perf_counter()
+        parts = part_counts(part_ids)
+        num_features = len(farms)
+
+    os.makedirs(out_folder, exist_ok=True)
+    results_file = write_results(noncontiguous, os.path.join(out_folder, RESULTS_NAME))
+    layer = write_layer(farms, id_field, noncontiguous, os.path.join(out_folder, LAYER_NAME))
+    save_fingerprints(store_path, src_crs, distance, fingerprints, components)
+    return {
+        "features": num_features,
+        "parts": sum(parts.values()),
+        "farms": len(components),
+        "multipart_farms": sum(1 for n in parts.values() if n > 1),
+        "noncontiguous": noncontiguous,
+        "results_file": results_file,
+        "layer": layer,
+        "workers": workers,
+        "incremental": incremental,
+        "rechecked": len(changed) if changed is not None else len(components),
+        "fingerprints": store_path,
+        "load_seconds": round(loaded - start, 2),
+        "classify_seconds": round(classified - loaded, 2),
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    incremental = "--incremental" in args
+    if incremental:
+        args.remove("--incremental")
+    options = {"--field": None, "--workers": "1"}
+    for option in options:
+        if option in args:
+            i = args.index(option)
+            options[option] = args[i + 1]
+            del args[i:i + 2]
+    if not args:
+        print(__doc__)
+        sys.exit(1)
+
+    summary = run(args[0], args[1] if len(args) > 1 else None, options["--field"], workers=int(options["--workers"]),
+                  incremental=incremental)
+    print(f"{summary['features']:,} features, {summary['parts']:,} parts, {summary['farms']:,} tree farms "
+          f"({summary['multipart_farms']:,} with multiple parts)")
+    print(f"Loaded in {summary['load_seconds']}s, classified in {summary['classify_seconds']}s "
+          f"({summary['workers']} worker{'s' if summary['workers'] > 1 else ''})")
+    if summary["incremental"]:
+        print(f"Incremental: re-checked {summary['rechecked']:,} of {summary['farms']:,} tree farms")
+    print("\nNon-contiguous tree farm IDs:")
+    print(summary["noncontiguous"])
+    print("Total non-contiguous tree farms:", len(summary["noncontiguous"]))
+    print(f"Results saved to: {summary['results_file']}")
+    if summary["layer"]:
+        print(f"Created {summary['layer']} with all non-contiguous tree farms")
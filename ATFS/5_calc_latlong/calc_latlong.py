@@ -0,0 +1,250 @@
+"""
+Pure-Python lat/long and acreage stage (no arcpy)
+
+5_calc_latlong_BPH.py runs CalculateGeometryAttributes (inside X/Y and area in Albers)
+and then two CalculateField passes to format the longitude and latitude strings -
+three passes that each rewrite the shapefile - before a SearchCursor writes
+7_update_treefarm.sql. Here dbo_treefarm.shp is read once and every attribute is
+computed for all features at once:
+
+    1. project the polygons to USA Contiguous Albers (WGS_1984_(ITRF00)_To_NAD_1983,
+       the script's geographicTransformations setting) in one vectorized transform
+    2. totalacres: planar Albers area in US survey acres (ACRES_US)
+    3. dlongitude / dlatitude: the inside point in decimal degrees of the Albers
+       geographic coordinate system (NAD83), like INSIDE_X / INSIDE_Y with
+       coordinate_format DD. The inside point is the centroid when it lies inside the
+       feature, otherwise a point on the surface (ArcGIS picks its own interior point
+       there, so only those features can differ from the arcpy results)
+    4. longitude / latitude: "%.6f" text of dlongitude / dlatitude
+    5. the SQL values: acres rounded to 2 decimals, and totalfores clamped to
+       totalacres when larger or within 0.1 acre of it
+
+The shapefile is then written once with all five attributes, and 7_update_treefarm.sql
+the same as the arcpy script (two UPDATE statements per tree farm).
+
+Two UPDATE statements per farm mean tens of thousands of single-row statements for a
+statewide load. With --bulk the SQL file is set-based instead: the values are loaded
+into a #treefarm_update staging table - multi-row INSERT ... VALUES batches (1,000 rows,
+SQL Server's limit per VALUES list), or with --bulk csv a BULK INSERT of
+7_update_treefarm.csv written next to the SQL file (the path in the SQL file must be
+readable by the SQL Server service; edit it if the server sees the folder elsewhere) -
+and then one UPDATE ... FROM join updates treefarm and one treefarmlocation, both in a
+single transaction. If a treefarm_id occurs more than once, its last row is loaded,
+which is the row whose UPDATE statements would have run last.
+
+Usage:
+    python calc_latlong.py [tree farm shapefile] [sql file] [--bulk [csv]]
+
+The defaults are tmp_treefarm/dbo_treefarm.shp and 7_update_treefarm.sql in this folder.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+# Shared reprojection module (cached pyproj transformers, named datum transformations)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "WoodPro", "Tract Export ", "TractExport"))
+import projection
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SHAPEFILE = os.path.join(HERE, "tmp_treefarm", "dbo_treefarm.shp")
+SQL_NAME = "7_update_treefarm.sql"
+REQUIRED_FIELDS = ("treefarm_i", "totalfores", "totalacres")
+SQ_METERS_PER_ACRE = 4046.872609874252  # US survey acre
+FORESTED_TOLERANCE = 0.1  # acres; totalfores this close to totalacres is set to totalacres
+STAGING_TABLE = "#treefarm_update"
+INSERT_BATCH_ROWS = 1000  # most rows SQL Server accepts in one INSERT ... VALUES
+UPDATE_COLUMNS = ("treefarm_id", "totalacres", "totalforestedacres", "longitude", "latitude")
+
+
+def resolve_fields(columns, names):
+    """{name: actual column} for each name, case-insensitive; ValueError listing the missing ones"""
+    by_name = {c.lower(): c for c in columns}
+    missing = [name for name in names if name.lower() not in by_name]
+    if missing:
+        raise ValueError(f"Missing fields: {missing}")
+    return {name: by_name[name.lower()] for name in names}
+
+
+def inside_points(geometries):
+    """Centroid of each geometry, or a point on its surface when the centroid falls outside it"""
+    centroids = shapely.centroid(geometries)
+    inside = shapely.contains(geometries, centroids) | shapely.is_empty(geometries)
+    return np.where(inside, centroids, shapely.point_on_surface(geometries))
+
+
+def geometry_attributes(geometries, src_crs):
+    """(dlongitude, dlatitude, totalacres) arrays; NaN for null and empty geometries"""
+    albers = projection.transform_geometries(geometries, src_crs, projection.ALBERS)
+    acres = shapely.area(albers) / SQ_METERS_PER_ACRE
+    points = inside_points(albers)
+    lon, lat = projection.transform_xy(shapely.get_x(points), shapely.get_y(points), projection.ALBERS, projection.NAD83)
+    return lon, lat, acres
+
+
+def format_degrees(values):
+    """"%.6f" text of each value (None where NaN), like the CalculateField expressions"""
+    text = np.char.mod("%.6f", np.nan_to_num(values)).astype(object)
+    text[np.isnan(values)] = None
+    return text
+
+
+def calc_attributes(farms):
+    """Add/overwrite dlongitude, dlatitude, totalacres, longitude and latitude in place; returns farms"""
+    fields = resolve_fields(farms.columns, REQUIRED_FIELDS)
+    lon, lat, acres = geometry_attributes(farms.geometry.values, farms.crs.to_wkt())
+    by_name = {c.lower(): c for c in farms.columns}
+    for name, values in (("dlongitude", lon), ("dlatitude", lat), ("longitude", format_degrees(lon)),
+                         ("latitude", format_degrees(lat))):
+        farms[by_name.get(name, name)] = values
+    farms[fields["totalacres"]] = acres
+    return farms
+
+
+def update_values(farms):
+    """
+    One row per tree farm with the values the SQL file sets: treefarm_id, totalacres,
+    totalforestedacres (both rounded to 2 decimals, totalfores clamped to totalacres
+    when larger or within FORESTED_TOLERANCE of it), longitude and latitude.
+    """
+    fields = resolve_fields(farms.columns, REQUIRED_FIELDS + ("longitude", "latitude"))
+    missing = farms[fields["totalfores"]].isna() | farms.geometry.isna() | farms.geometry.is_empty
+    if missing.any():
+        raise ValueError(f"No totalfores or no geometry for treefarm_i: {farms.loc[missing, fields['treefarm_i']].tolist()}")
+    # Python's correctly rounded round(), as the arcpy script applies it to the cursor values;
+    # np.round (scale, rint, unscale) differs on values like 155.695 (stored as 155.69499...)
+    totalacres = np.array([round(v, 2) for v in farms[fields["totalacres"]].astype("float64").tolist()], dtype="float64")
+    totalfores = np.array([round(v, 2) for v in farms[fields["totalfores"]].astype("float64").tolist()], dtype="float64")
+    clamp = (totalfores > totalacres) | (np.abs(totalfores - totalacres) < FORESTED_TOLERANCE)
+    return pd.DataFrame({
+        "treefarm_id": farms[fields["treefarm_i"]].to_numpy().astype("int64"),
+        "totalacres": totalacres,
+        "totalforestedacres": np.where(clamp, totalacres, totalfores),
+        "longitude": farms[fields["longitude"]].to_numpy(),
+        "latitude": farms[fields["latitude"]].to_numpy(),
+    })
+
+
+def write_update_sql(values, sql_file):
+    """7_update_treefarm.sql as the arcpy script writes it: a treefarm and a treefarmlocation UPDATE per farm"""
+    with open(sql_file, "w") as f_sql:
+        f_sql.write("use atfs\n")
+        f_sql.write("go\n")
+        for treefarm_id, totalacres, totalfores, longitude, latitude in zip(*[values[c].tolist() for c in UPDATE_COLUMNS]):
+            f_sql.write(f"update treefarm set totalacres = {totalacres}, totalforestedacres = {totalfores} "
+                        f"where treefarm_id = {treefarm_id}\n")
+            f_sql.write(f"update treefarmlocation set acres = {totalacres}, longitude = '{longitude}', "
+                        f"latitude = '{latitude}', forestedacres = {totalfores} where treefarm_id = {treefarm_id}\n")
+    return sql_file
+
+
+def _sql_text(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def write_bulk_sql(values, sql_file, csv_file=None):
+    """
+    Set-based 7_update_treefarm.sql: load the STAGING_TABLE (INSERT ... VALUES batches,
+    or BULK INSERT of csv_file, which is written here), then update treefarm and
+    treefarmlocation with one join each in one transaction. Returns (sql_file, staged rows).
+    """
+    values = values.drop_duplicates("treefarm_id", keep="last")
+    with open(sql_file, "w") as f_sql:
+        f_sql.write("use atfs\n")
+        f_sql.write("go\n")
+        f_sql.write("set nocount on\n")
+        f_sql.write("set xact_abort on\n")  # any error rolls back the whole transaction
+        f_sql.write(f"if object_id('tempdb..{STAGING_TABLE}') is not null drop table {STAGING_TABLE}\n")
+        f_sql.write(f"create table {STAGING_TABLE} (treefarm_id int not null primary key, "
+                    "totalacres decimal(18, 2) not null, totalforestedacres decimal(18, 2) not null, "
+                    "longitude varchar(32) null, latitude varchar(32) null)\n")
+        if csv_file:
+            values.to_csv(csv_file, columns=list(UPDATE_COLUMNS), index=False, lineterminator="\n")
+            f_sql.write(f"bulk insert {STAGING_TABLE} from {_sql_text(os.path.abspath(csv_file))} "
+                        "with (format = 'CSV', firstrow = 2, rowterminator = '0x0a', tablock)\n")
+        else:
+            rows = [f"({treefarm_id}, {totalacres}, {totalfores}, {_sql_text(longitude)}, {_sql_text(latitude)})"
+                    for treefarm_id, totalacres, totalfores, longitude, latitude
+                    in zip(*[values[c].tolist() for c in UPDATE_COLUMNS])]
+            for start in range(0, len(rows), INSERT_BATCH_ROWS):
+                f_sql.write(f"insert into {STAGING_TABLE} ({', '.join(UPDATE_COLUMNS)}) values\n")
+                f_sql.write(",\n".join(rows[start:start + INSERT_BATCH_ROWS]) + "\n")
+        f_sql.write("begin transaction\n")
+        f_sql.write("update t set t.totalacres = s.totalacres, t.totalforestedacres = s.totalforestedacres\n"
+                    f"from treefarm t join {STAGING_TABLE} s on s.treefarm_id = t.treefarm_id\n")
+        f_sql.write("update l set l.acres = s.totalacres, l.longitude = s.longitude, l.latitude = s.latitude, "
+                    "l.forestedacres = s.totalforestedacres\n"
+                    f"from treefarmlocation l join {STAGING_TABLE} s on s.treefarm_id = l.treefarm_id\n")
+        f_sql.write("commit transaction\n")
+        f_sql.write(f"drop table {STAGING_TABLE}\n")
+        f_sql.write("go\n")
+    return sql_file, len(values)
+
+
+def run(shapefile_path=SHAPEFILE, sql_file=None, bulk=None):
+    """
+    Compute the attributes, rewrite the shapefile once and write the SQL file; returns a
+    summary dict. bulk: None for per-farm UPDATE statements, "values" or "csv" for the
+    set-based staging table load (write_bulk_sql()).
+    """
+    sql_file = sql_file or os.path.join(HERE, SQL_NAME)
+    start = time.perf_counter()
+    farms = gpd.read_file(shapefile_path, engine="pyogrio")
+    loaded = time.perf_counter()
+    calc_attributes(farms)
+    values = update_values(farms)
+    calculated = time.perf_counter()
+    farms.to_file(shapefile_path, engine="pyogrio")
+    csv_file = os.path.splitext(sql_file)[0] + ".csv" if bulk == "csv" else None
+    if bulk:
+        staged = write_bulk_sql(values, sql_file, csv_file)[1]
+    else:
+        write_update_sql(values, sql_file)
+        staged = None
+    return {
+        "features": len(farms),
+        "forested_equal": int((values["totalforestedacres"] == values["totalacres"]).sum()),
+        "sql_file": sql_file,
+        "csv_file": csv_file,
+        "staged": staged,
+        "load_seconds": round(loaded - start, 2),
+        "calc_seconds": round(calculated - loaded, 2),
+        "write_seconds": round(time.perf_counter() - calculated, 2),
+    }
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] in ("-h", "--help"):
+        print(__doc__)
+        sys.exit(0)
+    bulk = None
+    if "--bulk" in args:
+        i = args.index("--bulk")
+        bulk = "values"
+        if i + 1 < len(args) and args[i + 1] in ("values", "csv"):
+            bulk = args.pop(i + 1)
+        del args[i]
+    shapefile_path = args[0] if args else SHAPEFILE
+    print(f"Input shapefile: {shapefile_path}")
+    if not os.path.exists(shapefile_path):
+        print(f"ERROR: Shapefile not found: {shapefile_path}")
+        sys.exit(1)
+    try:
+        summary = run(shapefile_path, args[1] if len(args) > 1 else None, bulk)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    print(f"{summary['features']:,} tree farms ({summary['forested_equal']:,} with forested acres equal to total acres)")
+    print(f"Loaded in {summary['load_seconds']}s, calculated in {summary['calc_seconds']}s, "
+          f"written in {summary['write_seconds']}s")
+    print(f"Created {summary['sql_file']}")
+    if summary["staged"] is not None:
+        print(f"Bulk update of {summary['staged']:,} tree farms through {STAGING_TABLE}")
+    if summary["csv_file"]:
+        print(f"Created {summary['csv_file']} (BULK INSERT source)")
@@ -5,7 +5,7 @@ import logging
 import json
 from os.path import join, splitext, basename, isdir
 import fiona
-from fiona.transform import transform_geom
+from shapely.geometry import mapping, shape
 import tempfile
 import warnings
 from fiona.errors import FionaDeprecationWarning  # Import the specific warning type
@@ -24,6 +24,10 @@ INPUT_PATH = "Archive2.zip"  # Input directory or ZIP file
 OUTPUT_DIR = "Output"  # Output directory
 TARGET_CRS = 'EPSG:3857'  # Target CRS for reprojection (Web Mercator)
 
+# Shared reprojection module (cached pyproj transformers, one call per shapefile)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "WoodPro", "Tract Export ", "TractExport"))
+import projection
+
 
 # -----------------------------------
 # Utility Functions
@@ -73,11 +77,19 @@ def convert_to_arcgis_json(input_path, output_path, target_crs):
         features = []
 
         with fiona.open(input_path, 'r') as source:
-            source_crs = source.crs
-
-            for feature in source:
-                if feature['geometry']:
-                    transformed_geom = transform_geom(source_crs, TARGET_CRS, feature['geometry'])
+            source_crs = source.crs_wkt
+            records = [feature for feature in source if feature['geometry']]
+
+            # Reproject every vertex of the shapefile with one cached-transformer call
+            # (transformation=None keeps PROJ's default datum operation and include_z keeps z values,
+            # as fiona's transform_geom did)
+            geometries = projection.transform_geometries([shape(feature['geometry']) for feature in records],
+                                                          source_crs, TARGET_CRS, transformation=None,
+                                                          include_z=True)
+
+            for feature, geom in zip(records, geometries):
+                if geom is not None:
+                    transformed_geom = mapping(geom)
                     geom_type = transformed_geom['type']
                     if geom_type == 'Point':
                         geometry = {"x": transformed_geom['coordinates'][0], "y": transformed_geom['coordinates'][1]}
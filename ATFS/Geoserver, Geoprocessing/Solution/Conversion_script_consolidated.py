@@ -2,11 +2,16 @@ import zipfile
 import fiona
 import json
 import os
+import sys
 import tempfile
-from fiona.transform import transform_geom
+from shapely.geometry import mapping, shape
 
 TARGET_CRS = 'EPSG:3857'
 
+# Shared reprojection module (cached pyproj transformers, one call per shapefile)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "WoodPro", "Tract Export ", "TractExport"))
+import projection
+
 def extract_shapefiles(zip_path, temp_dir):
     extracted_files = []
     with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -22,10 +27,19 @@ def convert_to_arcgis_json(input_shp):
     features = []
 
     with fiona.open(input_shp, 'r') as source:
-        source_crs = source.crs
-        for feature in source:
-            if feature['geometry']:
-                transformed_geom = transform_geom(source_crs, TARGET_CRS, feature['geometry'])
+        source_crs = source.crs_wkt
+        records = [feature for feature in source if feature['geometry']]
+
+        # Reproject every vertex of the shapefile with one cached-transformer call
+        # (transformation=None keeps PROJ's default datum operation and include_z keeps z values,
+        # as fiona's transform_geom did)
+        geometries = projection.transform_geometries([shape(feature['geometry']) for feature in records],
+                                                      source_crs, TARGET_CRS, transformation=None,
+                                                      include_z=True)
+
+        for feature, geom in zip(records, geometries):
+            if geom is not None:
+                transformed_geom = mapping(geom)
                 geom_type = transformed_geom['type']
                 if geom_type == 'Point':
                     geometry = {"x": transformed_geom['coordinates'][0], "y": transformed_geom['coordinates'][1]}
@@ -1,12 +1,26 @@
 # Import necessary libraries
+import os
+import sys
 import requests
 import json
 import datetime
 from pprint import pprint
 
+# Shared geometry fetch options live with the tract export scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Tract Export "))
+from geometry_fetch import geometry_params, payload_report, print_payload_report
 
-def query_rest_endpoint():
-    """Query ArcGIS REST endpoint for harvest data and display results"""
+# Explicit field list instead of outFields=*
+HARVEST_FIELDS = "report_location,report_tract_no,Tract_Name,harvest_status,PurchDate"
+
+
+def query_rest_endpoint(geometry_profile="webmap", out_fields=HARVEST_FIELDS, report_payload=False):
+    """Query ArcGIS REST endpoint for harvest data and display results
+
+    geometry_profile/out_fields control the geometry payload (see geometry_fetch.py);
+    pass geometry_profile="full", out_fields=None for the old full-precision outFields=* pull.
+    report_payload makes an extra full-precision request to show the bytes saved.
+    """
     try:
         # REST endpoint URL
         rest_url = "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_NSApps_DB_Views/MapServer/3/query"
@@ -16,13 +30,12 @@ def query_rest_endpoint():
         date_filter = thirty_days_ago.strftime("%Y-%m-%d")
 
         # Build query parameters - start simple
-        params = {
-            'where': "1=1",  # Get all records for testing, we'll filter later
-            'outFields': '*',  # Get all fields
-            'returnGeometry': 'true',
-            'f': 'json',
-            'resultRecordCount': 10  # Limit to 10 records for the POC
-        }
+        params = geometry_params(
+            geometry_profile,
+            out_fields,
+            where="1=1",  # Get all records for testing, we'll filter later
+            resultRecordCount=10  # Limit to 10 records for the POC
+        )
 
         print("Querying REST endpoint...")
         print(f"URL: {rest_url}")
@@ -40,6 +53,14 @@ def query_rest_endpoint():
         # Parse the JSON response
         data = response.json()
 
+        # Show how much the reduced geometry request saves over the full pull
+        if report_payload and geometry_profile != "full":
+            try:
+                print_payload_report(payload_report(rest_url, params['where'], profile=geometry_profile,
+                                                    out_fields=out_fields, sample_size=10))
+            except Exception as e:
+                print(f"Payload report failed: {str(e)}")
+
         # Check if we got the expected data structure
         if 'features' not in data:
             print("Warning: 'features' not found in response")
@@ -0,0 +1,290 @@
+"""
+WoodPro Service Latency Monitor
+===============================
+
+Lightweight SLO monitor for the Canfor WoodPro REST services. Runs the same canary
+queries as the Query Performance Analyzer (report_location filter, explicit
+outFields, no geometry) on a schedule and keeps a rolling latency histogram per
+service and location.
+
+Histograms use fixed log-spaced buckets (~10% relative error) kept in a ring of
+time slots, so memory per service/location is constant no matter how long the
+monitor runs. p50/p95/p99 and the error rate are computed over sliding windows
+by merging the slots that fall inside each window.
+
+When a window breaches its SLO, an alert is written to the log, appended to
+alerts.jsonl and, if MONITOR_WEBHOOK_URL is set, posted as JSON to a webhook.
+
+Usage:
+------
+    python latency_monitor.py            # run until Ctrl+C
+    python latency_monitor.py once       # run one round of canaries and print percentiles
+
+Requirements:
+------------
+- Python 3.6+
+- requests library
+"""
+
+import bisect
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+# Canary query definitions - mirror the analyzer's layer 3 queries
+SERVICES = {
+    "CSP_Data": {
+        "query_url": "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_CSP_Data/MapServer/3/query",
+        "fields": "report_location,report_tract_no,tract_status_desc,harvest_status,days_since_last_load",
+        "locations": ["AXI", "CRO", "MOB", "THM"],
+    },
+    "NSApps_DB_Views": {
+        "query_url": "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_NSApps_DB_Views/MapServer/3/query",
+        "fields": "report_location,report_tract_no,Tract_Name,tract_status_desc,harvest_status",
+        "locations": ["AXI", "CRO", "MOB", "THM"],
+    },
+}
+
+# SLO thresholds per service (latency in ms, error rate as a fraction)
+SLOS = {
+    "CSP_Data": {"p50_ms": 3000, "p95_ms": 10000, "p99_ms": 30000, "error_rate": 0.05},
+    "NSApps_DB_Views": {"p50_ms": 3000, "p95_ms": 10000, "p99_ms": 30000, "error_rate": 0.05},
+}
+
+INTERVAL_SECONDS = 300       # Time between canary rounds
+SLOT_SECONDS = 300           # Histogram ring slot width
+WINDOWS = {"15m": 900, "1h": 3600, "24h": 86400}
+MIN_SAMPLES = 3              # Don't alert on a window with fewer samples than this
+ALERT_COOLDOWN_SECONDS = 3600
+REQUEST_TIMEOUT = 90
+MAX_WORKERS = 4
+
+LOG_FILE = "latency_monitor.log"
+ALERT_FILE = "alerts.jsonl"
+SNAPSHOT_FILE = "latency_snapshot.json"
+WEBHOOK_URL = os.getenv("MONITOR_WEBHOOK_URL")
+
+# Log-spaced bucket upper bounds from 10 ms to 5 minutes, 10% apart
+BUCKET_BOUNDS = [10 * 1.1 ** i for i in range(int(math.log(300000 / 10, 1.1)) + 2)]
+
+logger = logging.getLogger("latency_monitor")
+
+
+class RollingHistogram:
+    """
+    Latency histogram over a sliding time range with bounded memory.
+
+    Keeps one bucket-count array per SLOT_SECONDS slot in a ring long enough to cover
+    the largest window; a slot is cleared when the ring wraps around to it.
+    """
+
+    def __init__(self, max_window: int = max(WINDOWS.values()), slot_seconds: int = SLOT_SECONDS):
+        self.slot_seconds = slot_seconds
+        self.num_slots = math.ceil(max_window / slot_seconds) + 1
+        self.counts = [[0] * (len(BUCKET_BOUNDS) + 1) for _ in range(self.num_slots)]
+        self.errors = [0] * self.num_slots
+        self.slot_ids = [-1] * self.num_slots
+
+    def _slot(self, now: float) -> int:
+        slot_id = int(now // self.slot_seconds)
+        index = slot_id % self.num_slots
+        if self.slot_ids[index] != slot_id:
+            self.counts[index] = [0] * (len(BUCKET_BOUNDS) + 1)
+            self.errors[index] = 0
+            self.slot_ids[index] = slot_id
+        return index
+
+    def record(self, latency_ms: Optional[float], now: Optional[float] = None) -> None:
+        """Record a latency sample, or an error when latency_ms is None"""
+        index = self._slot(now if now is not None else time.time())
+        if latency_ms is None:
+            self.errors[index] += 1
+        else:
+            self.counts[index][bisect.bisect_left(BUCKET_BOUNDS, latency_ms)] += 1
+
+    def window(self, seconds: int, now: Optional[float] = None) -> Tuple[List[int], int]:
+        """Merged bucket counts and error count for the last `seconds`"""
+        now = now if now is not None else time.time()
+        newest = int(now // self.slot_seconds)
+        oldest = int((now - seconds) // self.slot_seconds)
+        merged = [0] * (len(BUCKET_BOUNDS) + 1)
+        errors = 0
+        for index, slot_id in enumerate(self.slot_ids):
+            if oldest <= slot_id <= newest:
+                merged = [a + b for a, b in zip(merged, self.counts[index])]
+                errors += self.errors[index]
+        return merged, errors
+
+    def summary(self, seconds: int, now: Optional[float] = None) -> Dict:
+        """p50/p95/p99 (bucket upper bound), sample count and error rate over a window"""
+        counts, errors = self.window(seconds, now)
+        samples = sum(counts)
+        total = samples + errors
+        result = {"samples": samples, "errors": errors,
+                  "error_rate": round(errors / total, 3) if total else 0.0}
+        for name, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            result[name] = _percentile(counts, q) if samples else None
+        return result
+
+
+def _percentile(counts: List[int], q: float) -> float:
+    """Upper bound of the bucket holding the q-th quantile"""
+    target = q * sum(counts)
+    running = 0
+    for i, count in enumerate(counts):
+        running += count
+        if running >= target and count:
+            return round(BUCKET_BOUNDS[i], 1) if i < len(BUCKET_BOUNDS) else float("inf")
+    return float("inf")
+
+
+def run_canary(query_url: str, location: str, fields: str) -> Optional[int]:
+    """Run one analyzer-style query; returns elapsed ms, or None on any failure"""
+    params = {
+        "where": f"report_location='{location}'",
+        "outFields": fields,
+        "returnGeometry": "false",
+        "f": "json"
+    }
+    try:
+        start_time = time.time()
+        response = requests.get(query_url, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        elapsed_ms = round((time.time() - start_time) * 1000)
+        if "error" in data:
+            logger.warning(f"{query_url} {location}: {data['error'].get('message', 'Unknown error')}")
+            return None
+        return elapsed_ms
+    except Exception as e:
+        logger.warning(f"{query_url} {location}: {e}")
+        return None
+
+
+class LatencyMonitor:
+    """Schedules canary rounds, keeps histograms and raises SLO alerts"""
+
+    def __init__(self, services: Dict = SERVICES, slos: Dict = SLOS):
+        self.services = services
+        self.slos = slos
+        self.histograms = {
+            (service, loc): RollingHistogram()
+            for service, definition in services.items()
+            for loc in definition["locations"]
+        }
+        self.last_alert = {}
+
+    def run_round(self) -> None:
+        """Run every canary once (in parallel) and record the results"""
+        jobs = [(service, loc) for service, loc in self.histograms]
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            results = executor.map(
+                lambda job: run_canary(self.services[job[0]]["query_url"], job[1], self.services[job[0]]["fields"]),
+                jobs)
+            for job, latency_ms in zip(jobs, results):
+                self.histograms[job].record(latency_ms)
+                logger.info(f"{job[0]:<16} {job[1]:<6} {'ERROR' if latency_ms is None else f'{latency_ms:,} ms'}")
+
+    def evaluate(self, now: Optional[float] = None) -> List[Dict]:
+        """Check every window of every histogram against its service SLO"""
+        now = now if now is not None else time.time()
+        breaches = []
+        for (service, loc), histogram in self.histograms.items():
+            slo = self.slos.get(service, {})
+            for window_name, seconds in WINDOWS.items():
+                summary = histogram.summary(seconds, now)
+                if summary["samples"] + summary["errors"] < MIN_SAMPLES:
+                    continue
+                for metric, threshold in slo.items():
+                    value = summary.get(metric)
+                    if value is not None and value > threshold:
+                        breaches.append({
+                            "service": service, "location": loc, "window": window_name,
+                            "metric": metric, "value": value, "threshold": threshold,
+                            "samples": summary["samples"], "errors": summary["errors"]
+                        })
+        return breaches
+
+    def alert(self, breaches: List[Dict], now: Optional[float] = None) -> None:
+        """Log, append and post breaches, at most once per cooldown per breach key"""
+        now = now if now is not None else time.time()
+        for breach in breaches:
+            key = (breach["service"], breach["location"], breach["window"], breach["metric"])
+            if now - self.last_alert.get(key, 0) < ALERT_COOLDOWN_SECONDS:
+                continue
+            self.last_alert[key] = now
+            breach["timestamp"] = datetime.fromtimestamp(now).isoformat(timespec="seconds")
+
+            logger.error(f"SLO BREACH {breach['service']} {breach['location']} {breach['window']}: "
+                         f"{breach['metric']}={breach['value']} > {breach['threshold']}")
+            with open(ALERT_FILE, "a") as f:
+                f.write(json.dumps(breach) + "\n")
+            if WEBHOOK_URL:
+                try:
+                    requests.post(WEBHOOK_URL, json=breach, timeout=10)
+                except Exception as e:
+                    logger.warning(f"Webhook failed: {e}")
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """Current percentiles for every service/location/window"""
+        now = now if now is not None else time.time()
+        output = {"generated_at": datetime.fromtimestamp(now).isoformat(timespec="seconds"), "services": {}}
+        for (service, loc), histogram in self.histograms.items():
+            output["services"].setdefault(service, {})[loc] = {
+                window_name: histogram.summary(seconds, now) for window_name, seconds in WINDOWS.items()
+            }
+        return output
+
+    def run_forever(self) -> None:
+        """Canary loop - one round every INTERVAL_SECONDS"""
+        logger.info(f"Monitoring {len(self.histograms)} canaries every {INTERVAL_SECONDS}s")
+        while True:
+            started = time.time()
+            self.run_round()
+            self.alert(self.evaluate())
+            with open(SNAPSHOT_FILE, "w") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            time.sleep(max(0, INTERVAL_SECONDS - (time.time() - started)))
+
+
+def print_snapshot(snapshot: Dict, window_name: str = "15m") -> None:
+    """Console table of one window of a snapshot"""
+    print(f"\n{'Service':<16} {'Loc':<6} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>6}")
+    print("-" * 64)
+    for service, locations in snapshot["services"].items():
+        for loc, windows in locations.items():
+            s = windows[window_name]
+            fmt = lambda v: f"{v:>9,.0f}" if v is not None else f"{'-':>9}"
+            print(f"{service:<16} {loc:<6} {s['samples']:>4} {fmt(s['p50_ms'])} {fmt(s['p95_ms'])} "
+                  f"{fmt(s['p99_ms'])} {s['error_rate']:>6.1%}")
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+        handlers=[logging.FileHandler(LOG_FILE), logging.StreamHandler()]
+    )
+    monitor = LatencyMonitor()
+
+    if len(sys.argv) > 1 and sys.argv[1] == "once":
+        monitor.run_round()
+        print_snapshot(monitor.snapshot())
+        return
+
+    try:
+        monitor.run_forever()
+    except KeyboardInterrupt:
+        print("\nMonitor stopped")
+
+
+if __name__ == "__main__":
+    main()
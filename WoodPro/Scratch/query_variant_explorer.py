@@ -0,0 +1,333 @@
+"""
+Query Variant Explorer
+======================
+
+Builds on Diagnostic.py. Instead of trying seven hand-written query variants one
+at a time, this script generates a grid of query shapes, runs every shape several
+times in parallel and ranks the shapes that return correct results by latency and
+payload size.
+
+Grid dimensions (edit the constants below to narrow or widen the search):
+- where-clause form (equals, UPPER, IN, LIKE)
+- outFields set (minimal, report fields, *)
+- returnGeometry (false / true)
+- orderByFields (none / report_tract_no)
+- pagination style (single request, resultOffset pages, objectIds chunks)
+
+A variant is "correct" when every trial finishes without an API error and returns
+exactly as many features as a returnCountOnly query for the same location.
+
+Usage:
+------
+    python query_variant_explorer.py            # explore AXI with the default grid
+    python query_variant_explorer.py CRO 5      # explore CRO with 5 trials per variant
+
+Results are printed as a ranking table per layer and saved to variant_ranking.json.
+The "best" entry for each layer is a params template ({loc} placeholder) that the
+report/export scripts can copy directly.
+
+Requirements:
+------------
+- Python 3.6+
+- requests library
+"""
+
+import itertools
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import requests
+
+from Diagnostic import FIELDS, TIMEOUT, URL
+
+# Layers to explore - both views have been used by the report scripts
+LAYERS = {
+    "NSApps_DB_Views/3": URL,
+    "WoodPro_CSP_Data/3": "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_CSP_Data/MapServer/3/query",
+}
+
+# Grid dimensions
+WHERE_FORMS = {
+    "equals": "report_location='{loc}'",
+    "upper": "UPPER(report_location)='{loc}'",
+    "in": "report_location IN ('{loc}')",
+    "like": "report_location LIKE '{loc}%'",
+}
+OUT_FIELD_SETS = {
+    "minimal": "report_location,report_tract_no",
+    "report": FIELDS,
+    "all": "*",
+}
+RETURN_GEOMETRY = ["false", "true"]
+ORDER_BY_FIELDS = [None, "report_tract_no"]
+PAGINATION_STYLES = [
+    ("single", None),
+    ("offset", 500),
+    ("offset", 1000),
+    ("objectids", 500),
+]
+
+DEFAULT_LOCATION = "AXI"  # Small location, keeps the full grid cheap
+TRIALS = 3
+MAX_WORKERS = 6  # Keep this modest - the Canfor server times out under heavy load
+OUTPUT_FILE = "variant_ranking.json"
+MAX_PAGED_FEATURES = 100000  # Guard against servers that ignore resultOffset
+
+
+def build_variant_grid() -> List[Dict]:
+    """Generate every combination of the grid dimensions as a variant definition"""
+    variants = []
+    for where_name, fields_name, geometry, order_by, (paging, page_size) in itertools.product(
+            WHERE_FORMS, OUT_FIELD_SETS, RETURN_GEOMETRY, ORDER_BY_FIELDS, PAGINATION_STYLES):
+        name_parts = [where_name, fields_name, f"geom={geometry}", f"order={order_by or 'none'}", paging]
+        if page_size:
+            name_parts[-1] = f"{paging}{page_size}"
+
+        params = {
+            "where": WHERE_FORMS[where_name],
+            "outFields": OUT_FIELD_SETS[fields_name],
+            "returnGeometry": geometry,
+            "f": "json"
+        }
+        if order_by:
+            params["orderByFields"] = order_by
+
+        variants.append({
+            "name": " | ".join(name_parts),
+            "where_form": where_name,
+            "field_set": fields_name,
+            "pagination": paging,
+            "page_size": page_size,
+            "params": params
+        })
+    return variants
+
+
+def get_expected_count(query_url: str, location: str) -> Optional[int]:
+    """Reference count for a location using the canonical where clause"""
+    params = {
+        "where": f"report_location='{location}'",
+        "returnCountOnly": "true",
+        "f": "json"
+    }
+    try:
+        response = requests.get(query_url, params=params, timeout=TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        if "error" in data:
+            print(f"Count failed for {location}: {data['error'].get('message', 'Unknown error')}")
+            return None
+        return data.get("count", 0)
+    except Exception as e:
+        print(f"Error getting count for {location}: {e}")
+        return None
+
+
+def _request(query_url: str, params: Dict, stats: Dict) -> Dict:
+    """Single GET that accumulates request count and payload bytes into stats"""
+    response = requests.get(query_url, params=params, timeout=TIMEOUT)
+    response.raise_for_status()
+    stats["requests"] += 1
+    stats["bytes"] += len(response.content)
+    data = response.json()
+    if "error" in data:
+        raise RuntimeError(data["error"].get("message", "Unknown error"))
+    return data
+
+
+def run_variant_once(query_url: str, variant: Dict, location: str) -> Dict:
+    """
+    Execute one variant to completion (all pages) and measure it
+
+    Returns:
+        Dict: elapsed_ms, bytes, requests, features and error (None on success)
+    """
+    params = {k: v.format(loc=location) if isinstance(v, str) else v
+              for k, v in variant["params"].items()}
+    stats = {"requests": 0, "bytes": 0}
+    features = 0
+    truncated = False
+    error = None
+
+    start_time = time.perf_counter()
+    try:
+        if variant["pagination"] == "single":
+            data = _request(query_url, params, stats)
+            features = len(data.get("features", []))
+            truncated = bool(data.get("exceededTransferLimit"))
+
+        elif variant["pagination"] == "offset":
+            offset = 0
+            while True:
+                page_params = dict(params, resultOffset=offset, resultRecordCount=variant["page_size"])
+                data = _request(query_url, page_params, stats)
+                page = data.get("features", [])
+                features += len(page)
+                offset += len(page)
+                if not page or (len(page) < variant["page_size"] and not data.get("exceededTransferLimit")):
+                    break
+                if offset > MAX_PAGED_FEATURES:
+                    raise RuntimeError("Pagination did not terminate - resultOffset may be unsupported")
+
+        elif variant["pagination"] == "objectids":
+            id_params = {"where": params["where"], "returnIdsOnly": "true", "f": "json"}
+            data = _request(query_url, id_params, stats)
+            object_ids = sorted(data.get("objectIds") or [])
+            chunk_params = {k: v for k, v in params.items() if k != "where"}
+            for i in range(0, len(object_ids), variant["page_size"]):
+                chunk = object_ids[i:i + variant["page_size"]]
+                chunk_params["objectIds"] = ",".join(str(oid) for oid in chunk)
+                data = _request(query_url, chunk_params, stats)
+                features += len(data.get("features", []))
+
+    except Exception as e:
+        error = str(e)
+
+    return {
+        "elapsed_ms": round((time.perf_counter() - start_time) * 1000),
+        "bytes": stats["bytes"],
+        "requests": stats["requests"],
+        "features": features,
+        "truncated": truncated,
+        "error": error
+    }
+
+
+def explore_layer(layer_name: str, query_url: str, location: str, variants: List[Dict],
+                  trials: int = TRIALS, max_workers: int = MAX_WORKERS) -> List[Dict]:
+    """Run every variant `trials` times in parallel and summarize each variant"""
+    expected = get_expected_count(query_url, location)
+    print(f"\n--- {layer_name}: {location} (expected {expected} records) ---")
+    print(f"Variants: {len(variants)} x {trials} trials, {max_workers} workers")
+
+    runs = {v["name"]: [] for v in variants}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run_variant_once, query_url, variant, location): variant["name"]
+            for variant in variants
+            for _ in range(trials)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            runs[futures[future]].append(future.result())
+            if done % 50 == 0 or done == len(futures):
+                print(f"  {done}/{len(futures)} runs complete")
+
+    summaries = []
+    for variant in variants:
+        trial_runs = runs[variant["name"]]
+        errors = [r["error"] for r in trial_runs if r["error"]]
+        correct = (
+            expected is not None
+            and not errors
+            and all(r["features"] == expected and not r["truncated"] for r in trial_runs)
+        )
+        summaries.append({
+            "layer": layer_name,
+            "variant": variant["name"],
+            "field_set": variant["field_set"],
+            "correct": correct,
+            "median_ms": statistics.median(r["elapsed_ms"] for r in trial_runs),
+            "max_ms": max(r["elapsed_ms"] for r in trial_runs),
+            "median_bytes": statistics.median(r["bytes"] for r in trial_runs),
+            "requests": trial_runs[0]["requests"],
+            "features": [r["features"] for r in trial_runs],
+            "errors": errors[:1],
+            "params": variant["params"],
+            "page_size": variant["page_size"],
+            "pagination": variant["pagination"]
+        })
+    return summaries
+
+
+def rank_variants(summaries: List[Dict]) -> List[Dict]:
+    """Rank correct variants by median latency, then by median payload size"""
+    correct = [s for s in summaries if s["correct"]]
+    return sorted(correct, key=lambda s: (s["median_ms"], s["median_bytes"]))
+
+
+def print_ranking(layer_name: str, ranked: List[Dict], summaries: List[Dict], top: int = 15) -> None:
+    """Print the ranking table and an error breakdown for one layer"""
+    print(f"\n{'=' * 108}")
+    print(f"RANKING FOR {layer_name} ({len(ranked)}/{len(summaries)} variants correct)")
+    print(f"{'=' * 108}")
+    print(f"{'#':<4} {'Variant':<66} {'Median ms':>10} {'Max ms':>8} {'KB':>9} {'Reqs':>5}")
+    print("-" * 108)
+    for i, s in enumerate(ranked[:top], 1):
+        print(f"{i:<4} {s['variant']:<66} {s['median_ms']:>10,.0f} {s['max_ms']:>8,} "
+              f"{s['median_bytes'] / 1024:>9,.1f} {s['requests']:>5}")
+
+    failed = [s for s in summaries if not s["correct"]]
+    if failed:
+        print(f"\nIncorrect variants: {len(failed)}")
+        for s in failed[:10]:
+            reason = s["errors"][0] if s["errors"] else f"features {s['features']}"
+            print(f"  ❌ {s['variant']}: {reason}")
+
+
+def best_shapes(ranked: List[Dict]) -> Dict:
+    """Best params template overall and per outFields set"""
+    best = {}
+    for s in ranked:
+        key = s["field_set"]
+        if key not in best:
+            best[key] = _shape(s)
+    if ranked:
+        best["overall"] = _shape(ranked[0])
+    return best
+
+
+def _shape(summary: Dict) -> Dict:
+    return {
+        "variant": summary["variant"],
+        "params": summary["params"],
+        "pagination": summary["pagination"],
+        "page_size": summary["page_size"],
+        "median_ms": summary["median_ms"],
+        "median_bytes": summary["median_bytes"]
+    }
+
+
+def main():
+    location = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_LOCATION
+    trials = int(sys.argv[2]) if len(sys.argv) > 2 else TRIALS
+
+    print("Query Variant Explorer")
+    print("=" * 60)
+    variants = build_variant_grid()
+    print(f"Generated {len(variants)} variants per layer")
+
+    output = {
+        "location": location,
+        "trials": trials,
+        "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "layers": {}
+    }
+
+    for layer_name, query_url in LAYERS.items():
+        summaries = explore_layer(layer_name, query_url, location, variants, trials)
+        ranked = rank_variants(summaries)
+        print_ranking(layer_name, ranked, summaries)
+
+        output["layers"][layer_name] = {
+            "query_url": query_url,
+            "best": best_shapes(ranked),
+            "ranking": ranked,
+            "incorrect": [s["variant"] for s in summaries if not s["correct"]]
+        }
+
+        if ranked:
+            print(f"\n✅ Best shape for {layer_name}: {ranked[0]['variant']}")
+        else:
+            print(f"\n❌ No correct variants for {layer_name}")
+
+    with open(OUTPUT_FILE, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nResults saved to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
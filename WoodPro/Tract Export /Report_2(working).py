@@ -11,8 +11,14 @@ import os
 from datetime import datetime, date
 import calendar
 import json
-import geopandas as gpd
-from shapely.geometry import shape
+
+from geometry_export import PAGE_WORKERS, print_export_report, stream_export
+from geometry_fetch import payload_report, print_payload_report
+from harvest_aggregation import aggregate, combine_frames, features_frame, mill_results, print_mill_lines, print_summary
+
+MILLS = ["AXI", "CAM", "CON", "CRO", "DAR", "DER", "EST-L", "EST-S",
+         "FUL", "GRA", "HER", "IRO", "JAC", "LAT", "MLT", "MOB",
+         "THM", "URB", "WDC"]
 
 
 def get_auth_token(username, password):
@@ -199,8 +205,20 @@ def discover_spatial_services(canfor_token, canfor_session, sewall_token=None, s
     return working_services
 
 
-def export_geometries_to_shapefile(canfor_username, canfor_password, canfor_token, canfor_session, month_info="", test_mills=None):
-    """Export tract geometries to shapefile format for selected mills and month."""
+def export_geometries_to_shapefile(canfor_username, canfor_password, canfor_token, canfor_session, month_info="", mills=None,
+                                   geometry_profile="full", out_fields=None, report_payload=False, workers=PAGE_WORKERS):
+    """Export tract geometries for all mills to one shapefile.
+
+    Every mill is paged through in full, mills are fetched concurrently and pages are
+    streamed into the shapefile as they arrive (see geometry_export.py), so memory
+    doesn't grow with the number of features.
+
+    geometry_profile selects the geometry_fetch profile. The default "full" keeps the
+    shapefile as before (outFields=*, full precision); "export" or "webmap" are opt-in
+    reduced pulls with fewer fields. out_fields optionally overrides the profile's field
+    list. With report_payload (off by default, it costs an extra full-precision request)
+    the first mill is also sampled at full precision to report the payload bytes saved.
+    """
     
     # Try to get Sewall credentials (from the example solution)
     sewall_username = "canfor_app" 
@@ -225,136 +243,40 @@ def export_geometries_to_shapefile(canfor_username, canfor_password, canfor_toke
         print("\nNo spatial services found. Unable to generate shapefiles without geometry data.")
         return None
     
-    # Use test mills or default to first few mills for testing
-    if test_mills is None:
-        test_mills = ["AXI", "CAM", "CON"]  # Start with just 3 mills for testing
+    mills = mills or MILLS
     
-    print(f"\nExporting geometries for {len(test_mills)} mills{month_info}...")
+    print(f"\nExporting geometries for {len(mills)} mills{month_info}...")
     
-    all_features = []
-    
-    for mill in test_mills:
+    if report_payload and geometry_profile != "full":
         try:
-            params = {
-                "where": f"report_location='{mill}'",
-                "outFields": "*",  # Get all fields for export
-                "returnGeometry": "true",  # Important: include geometries
-                "f": "json",
-                "token": geometry_token,
-                "resultRecordCount": 10  # Limit to 10 features per mill for testing
-            }
-            
-            response = geometry_session.get(geometry_url, params=params, timeout=30)
-            data = response.json()
-            
-            if "error" in data:
-                print(f"  {mill}: ERROR - {data['error']['message']}")
-                continue
-                
-            features = data.get("features", [])
-            
-            if not features:
-                print(f"  {mill}: No features found")
-                continue
-                
-            # Debug: Check what we're actually getting back
-            if mill == "AXI":  # Only debug first mill to avoid spam
-                sample_feature = features[0]
-                print(f"  DEBUG - Sample feature keys: {list(sample_feature.keys())}")
-                if 'geometry' in sample_feature:
-                    print(f"  DEBUG - Geometry keys: {list(sample_feature['geometry'].keys()) if sample_feature['geometry'] else 'None'}")
-                else:
-                    print(f"  DEBUG - No 'geometry' key found")
-                    
-            # Add mill identifier to each feature
-            for feature in features:
-                feature["attributes"]["source_mill"] = mill
-                
-            all_features.extend(features)
-            print(f"  {mill}: {len(features)} geometries collected")
-            
+            print_payload_report(payload_report(
+                geometry_url, f"report_location='{mills[0]}'", profile=geometry_profile, out_fields=out_fields,
+                session=geometry_session, token=geometry_token, sample_size=10, timeout=30))
         except Exception as e:
-            print(f"  {mill}: ERROR - {str(e)}")
+            print(f"  Payload report failed: {str(e)}")
     
-    if not all_features:
-        print("No geometries found to export")
-        return None
+    # Generate filename
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    safe_month = month_info.replace(' ', '_').replace('-', '').strip('_') if month_info else "all_data"
+    filename = f"harvest_tracts{safe_month}_{timestamp}.shp"
     
-    # Convert to GeoDataFrame
     try:
-        # Extract geometries and attributes
-        geometries = []
-        attributes = []
-        
-        print(f"Processing {len(all_features)} features...")
-        
-        for i, feature in enumerate(all_features):
-            geom_data = feature.get("geometry")
-            if geom_data:
-                try:
-                    # Debug geometry structure for first feature
-                    if i == 0:
-                        print(f"  DEBUG - Geometry structure: {geom_data}")
-                    
-                    # Convert ArcGIS geometry to Shapely geometry
-                    # Handle ArcGIS polygon format with rings
-                    if 'rings' in geom_data:
-                        # ArcGIS polygon format
-                        geojson_geom = {
-                            "type": "Polygon",
-                            "coordinates": geom_data['rings']
-                        }
-                        geom = shape(geojson_geom)
-                    else:
-                        # Try standard format
-                        geom = shape(geom_data)
-                    
-                    if geom and not geom.is_empty:
-                        geometries.append(geom)
-                        attributes.append(feature["attributes"])
-                    else:
-                        print(f"  Feature {i+1}: Empty geometry, skipping")
-                except Exception as geom_error:
-                    print(f"  Feature {i+1}: Geometry conversion failed - {geom_error}")
-                    # Try to see what the actual geometry data looks like
-                    if i < 3:  # Only debug first few features
-                        print(f"    DEBUG - Raw geometry: {geom_data}")
-            else:
-                print(f"  Feature {i+1}: No geometry data")
-        
-        print(f"Successfully processed {len(geometries)} geometries")
-            
-        if not geometries:
-            print("No valid geometries found after processing")
-            return None
-            
-        # Create GeoDataFrame
-        gdf = gpd.GeoDataFrame(attributes, geometry=geometries)
-        
-        # Set coordinate reference system (assuming Web Mercator or WGS84)
-        # Try to detect from first geometry or use common default
-        gdf.crs = "EPSG:4326"  # WGS84, most common for web services
-        
-        # Generate filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        safe_month = month_info.replace(' ', '_').replace('-', '').strip('_') if month_info else "all_data"
-        filename = f"harvest_tracts{safe_month}_{timestamp}.shp"
-        
-        # Export to shapefile
-        gdf.to_file(filename)
-        
-        print(f"\nGeometry export successful!")
-        print(f"File: {filename}")
-        print(f"Features: {len(gdf)}")
-        print(f"Columns: {', '.join(gdf.columns[:-1])}")  # Exclude geometry column
-        print(f"Geometry types: {gdf.geometry.geom_type.value_counts().to_dict()}")
-        
-        return filename
-        
+        report = stream_export(geometry_url, mills, filename, profile=geometry_profile, out_fields=out_fields,
+                               session=geometry_session, token=geometry_token, workers=workers)
     except Exception as e:
         print(f"Export failed: {str(e)}")
         print(f"Error details: {type(e).__name__}")
         return None
+    
+    print_export_report(report)
+    
+    if not report["features_written"]:
+        print("No geometries found to export")
+        return None
+    
+    print(f"\nGeometry export successful!")
+    print(f"File: {filename}")
+    return filename
 
 
 def generate_harvest_report(username=None, password=None, query_month=True, export_geometries=False):
@@ -378,9 +300,7 @@ def generate_harvest_report(username=None, password=None, query_month=True, expo
     
     # API endpoint and mill locations
     url = "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_CSP_Data/MapServer/3/query"
-    mills = ["AXI", "CAM", "CON", "CRO", "DAR", "DER", "EST-L", "EST-S",
-             "FUL", "GRA", "HER", "IRO", "JAC", "LAT", "MLT", "MOB",
-             "THM", "URB", "WDC"]
+    mills = MILLS
     
     # Core harvest fields 
     fields = "report_location,harvest_status,complete_status,supplier,SaleType,tract_status_desc"
@@ -389,9 +309,8 @@ def generate_harvest_report(username=None, password=None, query_month=True, expo
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("-" * 80)
     
-    results = []
-    total_records = 0
-    all_suppliers = set()
+    frames = []
+    query_log = {}
     
     for mill in mills:
         try:
@@ -407,53 +326,29 @@ def generate_harvest_report(username=None, password=None, query_month=True, expo
             data = response.json()
             
             if "error" in data:
+                query_log[mill] = {"status": "error", "message": data['error']['message']}
                 print(f"{mill:10} | ERROR: {data['error']['message']}")
                 continue
                 
             features = data.get("features", [])
             
             if not features:
+                query_log[mill] = {"status": "no_data"}
                 print(f"{mill:10} | No data found")
                 continue
             
-            # Process harvest data
-            suppliers = set()
-            harvest_statuses = {}
-            
-            for feature in features:
-                attrs = feature.get("attributes", {})
-                
-                if attrs.get("supplier"):
-                    suppliers.add(attrs["supplier"])
-                    all_suppliers.add(attrs["supplier"])
-                    
-                if attrs.get("harvest_status"):
-                    status = attrs["harvest_status"]
-                    harvest_statuses[status] = harvest_statuses.get(status, 0) + 1
-            
-            results.append({
-                "mill": mill,
-                "total_records": len(features),
-                "suppliers": list(suppliers),
-                "harvest_statuses": harvest_statuses
-            })
-            
-            total_records += len(features)
-            
-            # Console output
-            status_info = f"{len(harvest_statuses)} statuses" if harvest_statuses else "No statuses"
-            supplier_info = f"{len(suppliers)} suppliers" if suppliers else "No suppliers"
-            print(f"{mill:10} | {len(features):3d} records | {status_info} | {supplier_info}")
+            frames.append(features_frame(features, mill))
+            query_log[mill] = {"status": "success"}
             
         except Exception as e:
+            query_log[mill] = {"status": "connection_error", "message": str(e)}
             print(f'{mill:10} | ERROR: {str(e)}')
     
-    # Summary
-    print("\n" + "=" * 80)
-    print(f"HARVEST SUMMARY{month_info}")
-    print(f"Mills processed: {len([r for r in results if r['total_records'] > 0])}/{len(mills)}")
-    print(f"Total records: {total_records:,}")
-    print(f"Total suppliers: {len(all_suppliers)}")
+    # Status distributions and supplier counts for all mills in one aggregation
+    summary = aggregate(combine_frames(frames), value_fields=["harvest_status"], distinct_fields=["supplier"])
+    results = mill_results(summary, query_log)
+    print_mill_lines([r for r in results if r["status"] == "success"])
+    print_summary(summary, results, title=f"HARVEST SUMMARY{month_info}")
     
     # Export geometries if requested
     if export_geometries:
@@ -474,7 +369,7 @@ if __name__ == "__main__":
     export_geoms = export_choice in ['y', 'yes']
     
     if export_geoms:
-        print("Note: Geometry export will include up to 10 features per mill for the first 3 mills (AXI, CAM, CON)")
+        print(f"Note: Geometry export pulls every tract for all {len(MILLS)} mills into one shapefile")
     
     generate_harvest_report(
         username=username,
@@ -15,16 +15,17 @@ Requirements:
 ------------
 - Python 3.6+
 - requests library
+- pandas (harvest_aggregation.py)
 
 Author: brendan.hall@sewall.com
 """
 
 import requests
 import time
-import json
-import csv
 from datetime import datetime
 
+from harvest_aggregation import aggregate, combine_frames, features_frame, mill_results, print_mill_lines, save_csv, save_json
+
 def generate_mill_report(activity_field="harvest_status", output_format="console"):
     """
     Generate a report showing activity values for each mill location.
@@ -48,7 +49,8 @@ def generate_mill_report(activity_field="harvest_status", output_format="console
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("-" * 60)
     
-    results = []
+    frames = []
+    query_log = {}
     
     for mill in mills:
         try:
@@ -70,13 +72,7 @@ def generate_mill_report(activity_field="harvest_status", output_format="console
             
             # Check for API errors - same as analyzer script
             if "error" in resp_data:
-                result = {
-                    "mill": mill,
-                    "status": "error",
-                    "message": resp_data["error"]["message"],
-                    "query_time_ms": elapsed_ms
-                }
-                results.append(result)
+                query_log[mill] = {"status": "error", "message": resp_data["error"]["message"], "query_time_ms": elapsed_ms}
                 print(f'{mill:10} | ERROR: {resp_data["error"]["message"]}')
                 continue
             
@@ -84,61 +80,27 @@ def generate_mill_report(activity_field="harvest_status", output_format="console
             features = resp_data.get("features", [])
             
             if not features:
-                result = {
-                    "mill": mill,
-                    "status": "no_data",
-                    "count": 0,
-                    "query_time_ms": elapsed_ms
-                }
-                results.append(result)
+                query_log[mill] = {"status": "no_data", "query_time_ms": elapsed_ms}
                 print(f"{mill:10} | No data found")
                 continue
             
-            # Extract activity field values
-            activity_values = []
-            for feature in features:
-                attrs = feature.get("attributes", {})
-                value = attrs.get(activity_field)
-                if value is not None:
-                    activity_values.append(value)
-            
-            # Create summary
-            unique_values = list(set(activity_values))
-            value_counts = {val: activity_values.count(val) for val in unique_values}
-            
-            result = {
-                "mill": mill,
-                "status": "success",
-                "total_records": len(features),
-                "activity_values": value_counts,
-                "unique_values": unique_values,
-                "query_time_ms": elapsed_ms
-            }
-            
-            results.append(result)
-            
-            # Console output
-            if len(unique_values) == 1:
-                print(f"{mill:10} | {unique_values[0]} ({len(activity_values)} records)")
-            else:
-                values_str = ", ".join([f"{v}({c})" for v, c in value_counts.items()])
-                print(f"{mill:10} | {values_str}")
+            frames.append(features_frame(features, mill))
+            query_log[mill] = {"status": "success", "query_time_ms": elapsed_ms}
                 
         except Exception as e:
-            result = {
-                "mill": mill,
-                "status": "connection_error",
-                "message": str(e),
-                "query_time_ms": 0
-            }
-            results.append(result)
+            query_log[mill] = {"status": "connection_error", "message": str(e), "query_time_ms": 0}
             print(f'{mill:10} | ERROR: {str(e)}')
     
+    # Value counts for all mills in one grouped aggregation
+    summary = aggregate(combine_frames(frames), value_fields=[activity_field])
+    results = mill_results(summary, query_log)
+    print_mill_lines([r for r in results if r["status"] == "success"], show_values=True)
+    
     # Generate output based on format
     if output_format == "csv":
         save_to_csv(results, activity_field)
     elif output_format == "json":
-        save_to_json(results, activity_field)
+        save_to_json(summary, results, activity_field)
     
     # Print summary
     print("\n" + "-" * 60)
@@ -150,49 +112,12 @@ def generate_mill_report(activity_field="harvest_status", output_format="console
 def save_to_csv(results, activity_field):
     """Save results to CSV file"""
     filename = f"mill_report_{activity_field}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['Mill', 'Status', 'Total_Records', 'Activity_Values', 'Query_Time_MS'])
-        
-        for result in results:
-            if result['status'] == 'success':
-                values_str = "; ".join([f"{k}:{v}" for k, v in result['activity_values'].items()])
-                writer.writerow([
-                    result['mill'],
-                    result['status'], 
-                    result['total_records'],
-                    values_str,
-                    result['query_time_ms']
-                ])
-            else:
-                writer.writerow([
-                    result['mill'],
-                    result['status'],
-                    0,
-                    result.get('message', ''),
-                    result['query_time_ms']
-                ])
-    
-    print(f"Results saved to: {filename}")
+    return save_csv(results, filename)
 
-def save_to_json(results, activity_field):
+def save_to_json(summary, results, activity_field):
     """Save results to JSON file"""
     filename = f"mill_report_{activity_field}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    
-    output = {
-        "report_metadata": {
-            "activity_field": activity_field,
-            "generated_at": datetime.now().isoformat(),
-            "total_mills": len(results)
-        },
-        "results": results
-    }
-    
-    with open(filename, 'w') as jsonfile:
-        json.dump(output, jsonfile, indent=2)
-    
-    print(f"Results saved to: {filename}")
+    return save_json(summary, results, filename, {"activity_field": activity_field})
 
 if __name__ == "__main__":
     # Generate report for harvest_status field
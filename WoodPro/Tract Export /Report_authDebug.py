@@ -12,22 +12,50 @@ Usage:
 3. Set the activity field you want to report on
 4. Run the script to get values for each mill
 
+Batch mode (several months from one data pull, written to one CSV/JSON):
+    python Report_authDebug.py batch 2024-01 2024-12 [console|csv|json]
+
 Requirements:
 ------------
 - Python 3.6+
 - requests library
+- pandas (harvest_aggregation.py)
 
 Author: brendan.hall@sewall.com
 """
 
 import requests
 import time
-import json
-import csv
 import os
+import sys
 from datetime import datetime, date
 import calendar
 
+import pandas as pd
+
+from harvest_aggregation import (aggregate, aggregate_by, combine_frames, features_frame, mill_results,
+                                 print_mill_lines, print_summary, save_batch_csv, save_batch_json, save_csv,
+                                 save_json)
+from date_filter import month_days_window, month_filter
+from layer_schema import select_out_fields
+
+REPORT_URL = "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_CSP_Data/MapServer/3/query"
+
+# Mill locations
+MILLS = [
+    "AXI", "CAM", "CON", "CRO", "DAR", "DER", "EST-L", "EST-S",
+    "FUL", "GRA", "HER", "IRO", "JAC", "LAT", "MLT", "MOB",
+    "THM", "URB", "WDC"
+]
+
+# Harvest fields requested when the layer has them, and how they are summarized
+HARVEST_FIELDS = ["harvest_status", "tract_status_desc", "SaleType",
+                  "complete_status", "supplier", "procure_mgr", "Forester",
+                  "begin_month", "begin_year", "end_month", "end_year",
+                  "days_since_last_load", "PurchDate", "expiredate"]
+HARVEST_VALUE_FIELDS = ["harvest_status", "complete_status", "SaleType"]
+HARVEST_DISTINCT_FIELDS = ["supplier"]
+
 
 def get_arcgis_token(username, password, service_url):
     """
@@ -265,6 +293,211 @@ def get_month_input():
     return year, month, start_date_str, end_date_str
 
 
+def parse_month(value):
+    """'2024-03' (or a (year, month) tuple) -> (2024, 3)"""
+    if isinstance(value, (tuple, list)):
+        year, month = value
+    else:
+        year, month = str(value).split("-")
+    year, month = int(year), int(month)
+    if month < 1 or month > 12:
+        raise ValueError(f"Invalid month: {value}")
+    return year, month
+
+
+def month_range(start, end):
+    """Every (year, month) from start to end inclusive"""
+    year, month = parse_month(start)
+    end_year, end_month = parse_month(end)
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def add_report_month(frame, today=None, field="days_since_last_load"):
+    """report_month ('YYYY-MM' of the last load) for every row, from days_since_last_load"""
+    today = pd.Timestamp(today or date.today())
+    days = pd.to_numeric(frame[field], errors="coerce") if field in frame.columns else pd.Series(float("nan"), index=frame.index)
+    last_load = today - pd.to_timedelta(days.floordiv(1), unit="D")
+    frame["report_month"] = last_load.dt.strftime("%Y-%m")
+    return frame
+
+
+def generate_harvest_batch(start_month, end_month, username=None, password=None, output_format="console", today=None,
+                           token=None, session=None):
+    """
+    Harvest reports for every month from start_month to end_month ('YYYY-MM') from a
+    single data pull.
+
+    The rows of all mills are queried once, restricted to the days_since_last_load span
+    that covers the whole range, and each row is assigned the month of its last load.
+    Every month's report is then aggregated from that in-memory frame, and the outputs
+    are written together (one CSV / JSON for the whole range).
+
+    token / session: an existing Canfor login (e.g. from export_runner) instead of
+    authenticating here; token may be a provider called per request (export_runner
+    renews it before it expires). username/password are still used if the token expires.
+
+    Returns {month: results}.
+    """
+    today = today or date.today()
+    months = month_range(start_month, end_month)
+    if not months:
+        raise ValueError(f"Empty month range: {start_month} to {end_month}")
+    windows = {f"{y}-{m:02d}": month_days_window(y, m, today) for y, m in months}
+    min_days = max(0, min(w[0] for w in windows.values()))
+    max_days = max(w[1] for w in windows.values())
+    if max_days < 0:
+        raise ValueError(f"{start_month} to {end_month} is in the future")
+
+    # Get credentials
+    username = username or os.getenv('CANFOR_USERNAME')
+    password = password or os.getenv('CANFOR_PASSWORD')
+
+    if not username or not password:
+        raise ValueError(
+            "Username and password required. Set CANFOR_USERNAME and CANFOR_PASSWORD environment variables or pass them directly.")
+
+    url = REPORT_URL
+    if token is None:
+        try:
+            print("Authenticating with Canfor ArcGIS services...")
+            token, token_expires, session = get_arcgis_token(username, password, url)
+        except Exception as e:
+            print(f"Authentication failed: {e}")
+            return None
+    session = session or requests.Session()
+
+    # days_since_last_load is what the rows are split into months by
+    harvest_fields = select_out_fields(url, HARVEST_FIELDS, required=["report_location", "days_since_last_load"],
+                                       session=session, token=token() if callable(token) else token)
+    date_filter = f" AND days_since_last_load >= {min_days} AND days_since_last_load <= {max_days}"
+
+    print(f"\nGenerating Harvest Reports {months[0][0]}-{months[0][1]:02d} to {months[-1][0]}-{months[-1][1]:02d} "
+          f"({len(months)} months, one data pull)")
+    print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"days_since_last_load {min_days}..{max_days}")
+    print("-" * 80)
+
+    frame, query_log, token, session = query_mill_rows(url, MILLS, ",".join(harvest_fields), username, password,
+                                                       token, session, where_suffix=date_filter)
+    print(f"Pulled {len(frame):,} rows")
+    add_report_month(frame, today)
+
+    # One aggregation per month over the same frame
+    summaries = aggregate_by(frame, "report_month", list(windows), HARVEST_VALUE_FIELDS, HARVEST_DISTINCT_FIELDS)
+    batch = {month: mill_results(summary, query_log) for month, summary in summaries.items()}
+
+    for month, results in batch.items():
+        year, month_number = parse_month(month)
+        print(f"\n{calendar.month_name[month_number]} {year}")
+        print("-" * 80)
+        print_mill_lines([r for r in results if r["status"] == "success"])
+        print_summary(summaries[month], results, title=f"HARVEST SUMMARY - {calendar.month_name[month_number]} {year}")
+
+    # All months in one output file
+    if output_format in ("csv", "json"):
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"harvest_report_{months[0][0]}{months[0][1]:02d}_{months[-1][0]}{months[-1][1]:02d}_{stamp}.{output_format}"
+        if output_format == "csv":
+            save_batch_csv(batch, filename)
+        else:
+            save_batch_json(summaries, batch, filename, {
+                "report_type": "harvest_report_batch",
+                "months": list(batch),
+                "days_since_last_load": [min_days, max_days],
+            })
+
+    return batch
+
+
+def query_mill_rows(url, mills, out_fields, username, password, token, session, where_suffix=""):
+    """
+    Query each mill's rows and collect them into one frame for harvest_aggregation.
+
+    Returns (frame, query_log, token, session); query_log is {mill: {"status", "message",
+    "query_time_ms"}} for every mill. Results larger than the server's maxRecordCount are
+    paged with resultOffset. An expired token is refreshed once and the query retried.
+    """
+    frames = []
+    query_log = {}
+
+    for mill in mills:
+        try:
+            # Query parameters
+            params = {
+                "where": f"report_location='{mill}'{where_suffix}",
+                "outFields": out_fields,
+                "returnGeometry": "false",
+                "f": "json"
+            }
+
+            features = []
+            elapsed_ms = 0
+            error = None
+            while True:
+                # Make the request
+                start_time = time.time()
+                params["token"] = token() if callable(token) else token
+                response = session.get(url, params=params, timeout=30)
+                response.raise_for_status()
+                elapsed_ms += round((time.time() - start_time) * 1000)
+
+                resp_data = response.json()
+
+                # Check for API errors
+                if "error" in resp_data:
+                    error_code = resp_data["error"].get("code", "unknown")
+                    error_message = resp_data["error"]["message"]
+
+                    # Handle token expiration
+                    if error_code == 498 or "token" in error_message.lower():
+                        print(f"{mill:10} | Token expired, getting new token...")
+                        try:
+                            token, token_expires, session = get_arcgis_token(username, password, url)
+                            params["token"] = token
+
+                            # Retry the request
+                            response = session.get(url, params=params, timeout=30)
+                            resp_data = response.json()
+
+                            if "error" in resp_data:
+                                error = ("error", resp_data["error"]["message"])
+                        except Exception as auth_error:
+                            error = ("auth_error", str(auth_error))
+                    else:
+                        error = ("error", error_message)
+                    if error:
+                        break
+
+                page = resp_data.get("features", [])
+                features.extend(page)
+                if not page or not resp_data.get("exceededTransferLimit"):
+                    break
+                params["resultOffset"] = len(features)
+
+            if error:
+                query_log[mill] = {"status": error[0], "message": error[1], "query_time_ms": elapsed_ms}
+                print(f'{mill:10} | {error[0].upper().replace("_", " ")}: {error[1]}')
+                continue
+
+            if not features:
+                query_log[mill] = {"status": "no_data", "query_time_ms": elapsed_ms}
+                print(f"{mill:10} | No data found")
+                continue
+
+            frames.append(features_frame(features, mill))
+            query_log[mill] = {"status": "success", "query_time_ms": elapsed_ms}
+
+        except Exception as e:
+            query_log[mill] = {"status": "connection_error", "message": str(e), "query_time_ms": 0}
+            print(f'{mill:10} | ERROR: {str(e)}')
+
+    return combine_frames(frames), query_log, token, session
+
+
 def generate_harvest_report(username=None, password=None, query_month=True, output_format="console"):
     """
     Generate a comprehensive harvest report for all mills with optional month filtering.
@@ -276,16 +509,12 @@ def generate_harvest_report(username=None, password=None, query_month=True, outp
         output_format: "console", "csv", or "json"
     """
     
-    # Get month filter if requested - temporarily disabled until we know what date fields exist
+    # Get month selection if requested (the filter is built once we have a token)
     date_filter = ""
     month_info = ""
     if query_month:
         year, month, start_date, end_date = get_month_input()
         month_name = calendar.month_name[month]
-        month_info = f" - {month_name} {year} (Note: Date filtering disabled - showing all data)"
-        # Temporarily disable date filtering since we don't know the field names yet
-        # date_filter = f" AND (harvest_date >= date '{start_date}' AND harvest_date <= date '{end_date}')"
-        print("Note: Month filtering temporarily disabled until we identify available date fields.")
     
     # Get credentials
     username = username or os.getenv('CANFOR_USERNAME')
@@ -296,7 +525,7 @@ def generate_harvest_report(username=None, password=None, query_month=True, outp
             "Username and password required. Set CANFOR_USERNAME and CANFOR_PASSWORD environment variables or pass them directly.")
 
     # ArcGIS REST API endpoint
-    url = "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_CSP_Data/MapServer/3/query"
+    url = REPORT_URL
 
     # Get authentication token
     try:
@@ -306,54 +535,29 @@ def generate_harvest_report(username=None, password=None, query_month=True, outp
         print(f"Authentication failed: {e}")
         return None
 
-    # Mill locations
-    mills = [
-        "AXI", "CAM", "CON", "CRO", "DAR", "DER", "EST-L", "EST-S",
-        "FUL", "GRA", "HER", "IRO", "JAC", "LAT", "MLT", "MOB",
-        "THM", "URB", "WDC"
-    ]
+    mills = MILLS
+
+    # Server-side month filter from the layer's date fields, validated with a count query
+    if query_month:
+        try:
+            window = month_filter(url, year, month, session=session, token=token)
+            date_filter = window["suffix"]
+            month_info = f" - {month_name} {year}"
+            print(f"Month filter: {window['description']} - {window['count']:,} of {window['total']:,} rows")
+        except Exception as e:
+            month_info = f" - {month_name} {year} (Note: Date filtering unavailable - showing all data)"
+            print(f"Note: Month filtering unavailable ({e}), showing all data.")
     
-    # First, let's try with basic fields that we know work from the original script
-    # We'll query all fields first to see what's available
+    # Basic fields that we know work from the original script
     basic_fields = ["report_location", "harvest_status", "tract_status_desc", "SaleType"]
     
-    # Test one mill to see what fields are available
-    print("Testing available fields...")
-    test_params = {
-        "where": f"report_location='{mills[0]}'",
-        "outFields": "*",  # Get all fields
-        "returnGeometry": "false",
-        "f": "json",
-        "token": token,
-        "resultRecordCount": 1  # Just get one record to test
-    }
-    
+    # Pick the harvest fields that exist from the cached layer schema (no probe query)
     try:
-        test_response = session.get(url, params=test_params, timeout=30)
-        test_data = test_response.json()
-        
-        if "features" in test_data and test_data["features"]:
-            available_fields = list(test_data["features"][0].get("attributes", {}).keys())
-            print(f"Available fields: {', '.join(sorted(available_fields))}")
-            
-            # Use fields that exist - focus on available harvest-related fields
-            harvest_fields = ["report_location"]
-            potential_fields = ["harvest_status", "tract_status_desc", "SaleType", 
-                              "complete_status", "supplier", "procure_mgr", "Forester",
-                              "begin_month", "begin_year", "end_month", "end_year", 
-                              "days_since_last_load", "PurchDate", "expiredate"]
-            
-            for field in potential_fields:
-                if field in available_fields:
-                    harvest_fields.append(field)
-                    
-            print(f"Using fields: {', '.join(harvest_fields)}")
-        else:
-            print("No test data found, using basic fields")
-            harvest_fields = basic_fields
-            
+        harvest_fields = select_out_fields(url, HARVEST_FIELDS, required=["report_location"],
+                                           session=session, token=token)
+        print(f"Using fields: {', '.join(harvest_fields)}")
     except Exception as e:
-        print(f"Field test failed: {e}, using basic fields")
+        print(f"Layer schema lookup failed: {e}, using basic fields")
         harvest_fields = basic_fields
     
     outfields_str = ",".join(harvest_fields)
@@ -363,172 +567,21 @@ def generate_harvest_report(username=None, password=None, query_month=True, outp
     print(f"Fields: {', '.join(harvest_fields[1:])}")  # Skip report_location in display
     print("-" * 80)
 
-    results = []
-    total_suppliers = set()
-    total_harvest_statuses = set()
-    total_records = 0
-
-    for mill in mills:
-        try:
-            # Build where clause with mill filter and optional date filter
-            where_clause = f"report_location='{mill}'{date_filter}"
-            
-            # Query parameters
-            params = {
-                "where": where_clause,
-                "outFields": outfields_str,
-                "returnGeometry": "false",
-                "f": "json",
-                "token": token
-            }
-
-            # Make the request
-            start_time = time.time()
-            response = session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            elapsed_ms = round((time.time() - start_time) * 1000)
-
-            resp_data = response.json()
-
-            # Check for API errors
-            if "error" in resp_data:
-                error_code = resp_data["error"].get("code", "unknown")
-                error_message = resp_data["error"]["message"]
-
-                # Handle token expiration
-                if error_code == 498 or "token" in error_message.lower():
-                    print(f"{mill:10} | Token expired, getting new token...")
-                    try:
-                        token, token_expires, session = get_arcgis_token(username, password, url)
-                        params["token"] = token
-
-                        # Retry the request
-                        response = session.get(url, params=params, timeout=30)
-                        resp_data = response.json()
-
-                        if "error" in resp_data:
-                            result = {
-                                "mill": mill,
-                                "status": "error",
-                                "message": resp_data["error"]["message"],
-                                "query_time_ms": elapsed_ms
-                            }
-                            results.append(result)
-                            print(f'{mill:10} | ERROR: {resp_data["error"]["message"]}')
-                            continue
-                    except Exception as auth_error:
-                        result = {
-                            "mill": mill,
-                            "status": "auth_error",
-                            "message": str(auth_error),
-                            "query_time_ms": elapsed_ms
-                        }
-                        results.append(result)
-                        print(f'{mill:10} | AUTH ERROR: {str(auth_error)}')
-                        continue
-                else:
-                    result = {
-                        "mill": mill,
-                        "status": "error",
-                        "message": error_message,
-                        "query_time_ms": elapsed_ms
-                    }
-                    results.append(result)
-                    print(f'{mill:10} | ERROR: {error_message}')
-                    continue
-
-            # Process features
-            features = resp_data.get("features", [])
-
-            if not features:
-                result = {
-                    "mill": mill,
-                    "status": "no_data",
-                    "count": 0,
-                    "query_time_ms": elapsed_ms
-                }
-                results.append(result)
-                print(f"{mill:10} | No harvest data found")
-                continue
-
-            # Process harvest data using available fields
-            harvest_statuses = []
-            complete_statuses = []
-            suppliers = set()
-            sale_types = []
-            
-            for feature in features:
-                attrs = feature.get("attributes", {})
-                
-                # Collect available harvest information
-                if attrs.get("harvest_status"):
-                    harvest_statuses.append(attrs["harvest_status"])
-                if attrs.get("complete_status"):
-                    complete_statuses.append(attrs["complete_status"])
-                if attrs.get("supplier"):
-                    suppliers.add(attrs["supplier"])
-                if attrs.get("SaleType"):
-                    sale_types.append(attrs["SaleType"])
-
-            # Calculate summary statistics
-            harvest_status_counts = {}
-            for status in harvest_statuses:
-                harvest_status_counts[status] = harvest_status_counts.get(status, 0) + 1
-                
-            complete_status_counts = {}
-            for status in complete_statuses:
-                complete_status_counts[status] = complete_status_counts.get(status, 0) + 1
-            
-            sale_type_counts = {}
-            for sale_type in sale_types:
-                sale_type_counts[sale_type] = sale_type_counts.get(sale_type, 0) + 1
-
-            result = {
-                "mill": mill,
-                "status": "success",
-                "total_records": len(features),
-                "harvest_statuses": harvest_status_counts,
-                "complete_statuses": complete_status_counts,
-                "sale_types": sale_type_counts,
-                "suppliers": list(suppliers),
-                "supplier_count": len(suppliers),
-                "query_time_ms": elapsed_ms
-            }
-
-            results.append(result)
+    frame, query_log, token, session = query_mill_rows(url, mills, outfields_str, username, password,
+                                                       token, session, where_suffix=date_filter)
 
-            # Console output - show meaningful harvest info
-            status_summary = f"H:{len(harvest_status_counts)} C:{len(complete_status_counts)} S:{len(sale_type_counts)}" if harvest_status_counts or complete_status_counts or sale_type_counts else "No status data"
-            supplier_info = f"{len(suppliers)} suppliers" if suppliers else "No suppliers"
-            print(f"{mill:10} | {len(features):3d} records | {status_summary} | {supplier_info}")
-
-        except Exception as e:
-            result = {
-                "mill": mill,
-                "status": "connection_error",
-                "message": str(e),
-                "query_time_ms": 0
-            }
-            results.append(result)
-            print(f'{mill:10} | ERROR: {str(e)}')
+    # Every summary from one grouped aggregation over all mills' rows
+    summary = aggregate(frame, value_fields=HARVEST_VALUE_FIELDS, distinct_fields=HARVEST_DISTINCT_FIELDS)
+    results = mill_results(summary, query_log)
 
-    # Print summary statistics
-    print("\n" + "=" * 80)
-    successful = len([r for r in results if r["status"] == "success"])
-    total_suppliers = len(set().union(*[r.get("suppliers", []) for r in results if r["status"] == "success"]))
-    total_harvest_statuses = len(set().union(*[r.get("harvest_statuses", {}).keys() for r in results if r["status"] == "success"]))
-    total_records = sum(r.get("total_records", 0) for r in results if r["status"] == "success")
-    print(f"HARVEST SUMMARY{month_info}")
-    print(f"Mills processed: {successful}/{len(mills)}")
-    print(f"Total records: {total_records:,}")
-    print(f"Total suppliers: {total_suppliers}")
-    print(f"Unique harvest statuses: {total_harvest_statuses}")
+    print_mill_lines([r for r in results if r["status"] == "success"])
+    print_summary(summary, results, title=f"HARVEST SUMMARY{month_info}")
     
     # Generate output based on format
     if output_format == "csv":
         save_harvest_to_csv(results, month_info)
     elif output_format == "json":
-        save_harvest_to_json(results, month_info)
+        save_harvest_to_json(summary, results, month_info)
 
     return results
 
@@ -574,133 +627,17 @@ def generate_mill_report(username=None, password=None, activity_field="harvest_s
     print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("-" * 60)
 
-    results = []
-
-    for mill in mills:
-        try:
-            # Query parameters
-            params = {
-                "where": f"report_location='{mill}'",
-                "outFields": f"report_location,{activity_field}",
-                "returnGeometry": "false",
-                "f": "json",
-                "token": token
-            }
-
-            # Make the request
-            start_time = time.time()
-            response = session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            elapsed_ms = round((time.time() - start_time) * 1000)
-
-            resp_data = response.json()
-
-            # Check for API errors
-            if "error" in resp_data:
-                error_code = resp_data["error"].get("code", "unknown")
-                error_message = resp_data["error"]["message"]
-
-                # Handle token expiration
-                if error_code == 498 or "token" in error_message.lower():
-                    print(f"{mill:10} | Token expired, getting new token...")
-                    try:
-                        token, token_expires, session = get_arcgis_token(username, password, url)
-                        params["token"] = token
-
-                        # Retry the request
-                        response = session.get(url, params=params, timeout=30)
-                        resp_data = response.json()
-
-                        if "error" in resp_data:
-                            result = {
-                                "mill": mill,
-                                "status": "error",
-                                "message": resp_data["error"]["message"],
-                                "query_time_ms": elapsed_ms
-                            }
-                            results.append(result)
-                            print(f'{mill:10} | ERROR: {resp_data["error"]["message"]}')
-                            continue
-                    except Exception as auth_error:
-                        result = {
-                            "mill": mill,
-                            "status": "auth_error",
-                            "message": str(auth_error),
-                            "query_time_ms": elapsed_ms
-                        }
-                        results.append(result)
-                        print(f'{mill:10} | AUTH ERROR: {str(auth_error)}')
-                        continue
-                else:
-                    result = {
-                        "mill": mill,
-                        "status": "error",
-                        "message": error_message,
-                        "query_time_ms": elapsed_ms
-                    }
-                    results.append(result)
-                    print(f'{mill:10} | ERROR: {error_message}')
-                    continue
-
-            # Process features
-            features = resp_data.get("features", [])
-
-            if not features:
-                result = {
-                    "mill": mill,
-                    "status": "no_data",
-                    "count": 0,
-                    "query_time_ms": elapsed_ms
-                }
-                results.append(result)
-                print(f"{mill:10} | No data found")
-                continue
-
-            # Extract activity field values
-            activity_values = []
-            for feature in features:
-                attrs = feature.get("attributes", {})
-                value = attrs.get(activity_field)
-                if value is not None:
-                    activity_values.append(value)
-
-            # Create summary
-            unique_values = list(set(activity_values))
-            value_counts = {val: activity_values.count(val) for val in unique_values}
-
-            result = {
-                "mill": mill,
-                "status": "success",
-                "total_records": len(features),
-                "activity_values": value_counts,
-                "unique_values": unique_values,
-                "query_time_ms": elapsed_ms
-            }
-
-            results.append(result)
-
-            # Console output
-            if len(unique_values) == 1:
-                print(f"{mill:10} | {unique_values[0]} ({len(activity_values)} records)")
-            else:
-                values_str = ", ".join([f"{v}({c})" for v, c in value_counts.items()])
-                print(f"{mill:10} | {values_str}")
-
-        except Exception as e:
-            result = {
-                "mill": mill,
-                "status": "connection_error",
-                "message": str(e),
-                "query_time_ms": 0
-            }
-            results.append(result)
-            print(f'{mill:10} | ERROR: {str(e)}')
+    frame, query_log, token, session = query_mill_rows(url, mills, f"report_location,{activity_field}",
+                                                       username, password, token, session)
+    summary = aggregate(frame, value_fields=[activity_field])
+    results = mill_results(summary, query_log)
+    print_mill_lines([r for r in results if r["status"] == "success"], show_values=True)
 
     # Generate output based on format
     if output_format == "csv":
         save_to_csv(results, activity_field)
     elif output_format == "json":
-        save_to_json(results, activity_field)
+        save_to_json(summary, results, activity_field)
 
     # Print summary
     print("\n" + "-" * 60)
@@ -713,121 +650,30 @@ def generate_mill_report(username=None, password=None, activity_field="harvest_s
 def save_to_csv(results, activity_field):
     """Save results to CSV file"""
     filename = f"mill_report_{activity_field}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return save_csv(results, filename)
 
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(['Mill', 'Status', 'Total_Records', 'Activity_Values', 'Query_Time_MS'])
-
-        for result in results:
-            if result['status'] == 'success':
-                values_str = "; ".join([f"{k}:{v}" for k, v in result['activity_values'].items()])
-                writer.writerow([
-                    result['mill'],
-                    result['status'],
-                    result['total_records'],
-                    values_str,
-                    result['query_time_ms']
-                ])
-            else:
-                writer.writerow([
-                    result['mill'],
-                    result['status'],
-                    0,
-                    result.get('message', ''),
-                    result['query_time_ms']
-                ])
-
-    print(f"Results saved to: {filename}")
 
-
-def save_to_json(results, activity_field):
+def save_to_json(summary, results, activity_field):
     """Save results to JSON file"""
     filename = f"mill_report_{activity_field}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-
-    output = {
-        "report_metadata": {
-            "activity_field": activity_field,
-            "generated_at": datetime.now().isoformat(),
-            "total_mills": len(results)
-        },
-        "results": results
-    }
-
-    with open(filename, 'w') as jsonfile:
-        json.dump(output, jsonfile, indent=2)
-
-    print(f"Results saved to: {filename}")
+    return save_json(summary, results, filename, {"activity_field": activity_field})
 
 
 def save_harvest_to_csv(results, month_info):
     """Save harvest results to CSV file"""
     safe_month = month_info.replace(' ', '_').replace('-', '').strip('_') if month_info else "all_months"
     filename = f"harvest_report{safe_month}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    return save_csv(results, filename)
 
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            'Mill', 'Status', 'Total_Records', 'Volume_m3', 'Area_ha', 
-            'Contractors', 'Harvest_Statuses', 'Activity_Types', 'Query_Time_MS'
-        ])
-
-        for result in results:
-            if result['status'] == 'success':
-                statuses_str = "; ".join([f"{k}:{v}" for k, v in result.get('harvest_statuses', {}).items()])
-                activities_str = "; ".join([f"{k}:{v}" for k, v in result.get('activity_types', {}).items()])
-                contractors_str = "; ".join(result.get('contractors', []))
-                
-                writer.writerow([
-                    result['mill'],
-                    result['status'],
-                    result['total_records'],
-                    result.get('volume_m3', 0),
-                    result.get('area_ha', 0),
-                    contractors_str,
-                    statuses_str,
-                    activities_str,
-                    result['query_time_ms']
-                ])
-            else:
-                writer.writerow([
-                    result['mill'],
-                    result['status'],
-                    0, 0, 0, '',
-                    result.get('message', ''),
-                    '',
-                    result['query_time_ms']
-                ])
 
-    print(f"Harvest results saved to: {filename}")
-
-
-def save_harvest_to_json(results, month_info):
+def save_harvest_to_json(summary, results, month_info):
     """Save harvest results to JSON file"""
     safe_month = month_info.replace(' ', '_').replace('-', '').strip('_') if month_info else "all_months"
     filename = f"harvest_report{safe_month}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-
-    # Calculate totals for metadata
-    total_volume = sum(r.get('volume_m3', 0) for r in results if r['status'] == 'success')
-    total_area = sum(r.get('area_ha', 0) for r in results if r['status'] == 'success')
-    successful_mills = len([r for r in results if r['status'] == 'success'])
-
-    output = {
-        "report_metadata": {
-            "report_type": "harvest_report",
-            "month_filter": month_info.strip() if month_info else "all_months",
-            "generated_at": datetime.now().isoformat(),
-            "total_mills": len(results),
-            "successful_mills": successful_mills,
-            "total_volume_m3": total_volume,
-            "total_area_ha": total_area
-        },
-        "results": results
-    }
-
-    with open(filename, 'w') as jsonfile:
-        json.dump(output, jsonfile, indent=2)
-
-    print(f"Harvest results saved to: {filename}")
+    return save_json(summary, results, filename, {
+        "report_type": "harvest_report",
+        "month_filter": month_info.strip() if month_info else "all_months",
+    })
 
 
 if __name__ == "__main__":
@@ -837,6 +683,7 @@ if __name__ == "__main__":
     # This script provides two main reporting functions:
     # 1. generate_harvest_report() - Comprehensive harvest reports with month filtering and volume/area metrics
     # 2. generate_mill_report() - Simple activity field reports for backward compatibility
+    # 3. generate_harvest_batch() - A range of months from a single data pull (see "batch" below)
     
     # Option 1: Set credentials as environment variables (recommended)
     # export CANFOR_USERNAME="your_username"
@@ -846,6 +693,12 @@ if __name__ == "__main__":
     username = "woodpro.access"
     password = "lobloLLy_PL1"
 
+    # Batch mode: python Report_authDebug.py batch 2024-01 2024-12 [console|csv|json]
+    if len(sys.argv) > 3 and sys.argv[1] == "batch":
+        generate_harvest_batch(sys.argv[2], sys.argv[3], username=username, password=password,
+                               output_format=sys.argv[4] if len(sys.argv) > 4 else "console")
+        sys.exit(0)
+
     print("WoodPro Harvest Report Generator")
     print("===============================")
     print("This script will generate a comprehensive harvest report for all mills.")
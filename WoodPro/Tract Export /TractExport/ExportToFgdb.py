@@ -52,6 +52,10 @@ import arcpy
 from arcgis.gis import GIS
 from arcgis.features import FeatureLayerCollection, FeatureLayer, Feature
 
+# Wall/CPU time, peak memory and rows per stage, saved to Profiles\ at the end (see profiler.py)
+import profiler
+prof = profiler.Profiler("ExportToFgdb", meta={"month": "{0}-{1}".format(yyyy, mm)})
+
 # report_loc list
 report_locations = ['AXI', 'CAM', 'CON', 'CRO', 'DAR', 'DER', 'EST-L', 'EST-S', 'FUL', 'GRA', 'HER', 'IRO', 'JAC', 'MLT', 'MOB', 'THM', 'URB']
 
@@ -61,6 +65,7 @@ primary_locs = ['Axis', 'Camden', 'Conway', 'Crosby', 'Darlington', 'DeRidder',
 primary_loc_dict = dict(zip(report_locations, primary_locs))
 
 # gis
+prof.start("login")
 # print("Login WoodPro...")
 woodpro_username = 'canfor_app'
 woodpro_password = 'canfor$1234'
@@ -140,20 +145,28 @@ if arcpy.Exists(export_gdb):
 arcpy.CreateFileGDB_management(os.path.dirname(export_gdb), os.path.basename(export_gdb))
 
 print("Get All Tracts...")
-tracts_Layer = FeatureLayer(woodpro_all_tracts, gis=woodpro_gis)
-
-tracts_Layer.query().save(export_gdb, "All_Tracts_wm")
+prof.start("download")
+# was: FeatureLayer(woodpro_all_tracts, gis=woodpro_gis).query().save(export_gdb, "All_Tracts_wm")
+# Fetch the layer in envelope tiles concurrently instead of one query capped at maxRecordCount
+import tiled_fetch
+tracts_json = os.path.join(here, "All_Tracts_wm.json")
+woodpro_token = tiled_fetch.get_token(woodpro_username, woodpro_password, woodpro_portal)
+tiled_fetch.save_feature_set(tiled_fetch.fetch_tiled(woodpro_all_tracts, woodpro_token), tracts_json)
+arcpy.conversion.JSONToFeatures(tracts_json, os.path.join(export_gdb, "All_Tracts_wm"))
+os.remove(tracts_json)
 
 all_tracts_wm = os.path.join(export_gdb, "All_Tracts_wm")
 all_tracts = os.path.join(export_gdb, "All_Tracts")
 
 print("Project...")
+prof.start("project", rows=int(arcpy.GetCount_management(all_tracts_wm)[0]))
 arcpy.management.Project(all_tracts_wm, all_tracts, 'PROJCS["USA_Contiguous_Albers_Equal_Area_Conic",GEOGCS["GCS_North_American_1983",DATUM["D_North_American_1983",SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],PROJECTION["Albers"],PARAMETER["False_Easting",0.0],PARAMETER["False_Northing",0.0],PARAMETER["Central_Meridian",-96.0],PARAMETER["Standard_Parallel_1",29.5],PARAMETER["Standard_Parallel_2",45.5],PARAMETER["Latitude_Of_Origin",37.5],UNIT["Meter",1.0]]', "WGS_1984_(ITRF00)_To_NAD_1983", 'PROJCS["WGS_1984_Web_Mercator_Auxiliary_Sphere",GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],PROJECTION["Mercator_Auxiliary_Sphere"],PARAMETER["False_Easting",0.0],PARAMETER["False_Northing",0.0],PARAMETER["Central_Meridian",0.0],PARAMETER["Standard_Parallel_1",0.0],PARAMETER["Auxiliary_Sphere_Type",0.0],UNIT["Meter",1.0]]', "NO_PRESERVE_SHAPE", None, "NO_VERTICAL")
 
 if arcpy.Exists(all_tracts_wm):
 	arcpy.Delete_management(all_tracts_wm)
 
 # Add delivery month/year and supplier fields
+prof.start("fields")
 supplier = "'Canfor'"
 arcpy.management.AddField(all_tracts, "del_month", "LONG", "", "", "", "", "NULLABLE", "NON_REQUIRED", "")
 arcpy.management.AddField(all_tracts, "del_year", "LONG", "", "", "", "", "NULLABLE", "NON_REQUIRED", "")
@@ -164,6 +177,7 @@ arcpy.management.CalculateFields(all_tracts, "PYTHON3", [["del_month", int(mm)],
 where = f"days_since_last_load >= {start} and days_since_last_load <= {end} and report_location in ({str(report_locations).replace('[','').replace(']','')})"
 
 print("Get report_location list")
+prof.start("locations")
 fs = canfor_Layer.query(where=where, out_fields="report_location", return_count_only=False, return_geometry=False, return_distinct_values=True, f="json")
 
 results = str(fs)
@@ -183,6 +197,7 @@ if numLocations > 0:
 		print(loc)
 
 		# Create feature layer of the tract geometries for the given location
+		prof.start("layer:" + loc)
 		if arcpy.Exists(temp_Layer):
 			arcpy.Delete_management(temp_Layer)
 		arcpy.management.MakeFeatureLayer(in_features=all_tracts, out_layer=temp_Layer, where_clause=f"report_location='{loc}'", workspace="", field_info="")
@@ -203,7 +218,9 @@ if numLocations > 0:
 			if arcpy.Exists(outtbl):
 				arcpy.Delete_management(outtbl)
 
+			prof.start("attributes:" + loc)
 			results = canfor_Layer.query(where = where, out_fields = canfor_fields, return_geometry = False)
+			prof.rows(len(results.features))
 
 			for index, item in enumerate(results.fields):
 				# print(f"Index: {index}, Item: {item}")
@@ -220,17 +237,21 @@ if numLocations > 0:
 
 			arcpy.management.DeleteField(outtbl, ["OBJECTID_1", "OBJECTID_2"])
 
+			prof.start("join:" + loc)
 			arcpy.management.AddJoin(temp_Layer, "report_tract_no", outtbl, "report_tract_no", "KEEP_COMMON")
 			count = int(arcpy.GetCount_management(temp_Layer)[0])
+			prof.rows(count)
 			if count > 0:
 				print(".. {0} : {1}".format(loc, count))
 				fcname = primary_loc_dict[loc]
 				outfc = os.path.join(export_gdb, fcname)
 
+				prof.start("export:" + loc, rows=count)
 				arcpy.conversion.ExportFeatures(in_features=temp_Layer, out_features=outfc, field_mapping="")
 
 				arcpy.management.DeleteField(outfc, ["report_tract_no_1", "OBJECTID_1", "report_location", "tract_type_family", "tract_status_desc", "harvest_status", "forester", "tract_name"])
 
+				prof.start("shapefile:" + loc, rows=count)
 				outshp = os.path.join(shapefiles_fldr, fcname+".shp")
 
 				if arcpy.Exists(outshp):
@@ -247,11 +268,22 @@ if numLocations > 0:
 
 				arcpy.conversion.ExportFeatures(in_features=outfc, out_features=outshp, field_mapping="latitude \"latitude\" true true false 8 Double 0 0,First,#,{0},latitude_dd,-1,-1;longitude \"longitude\" true true false 8 Double 0 0,First,#,{0},longitude_dd,-1,-1;del_month \"del_month\" true true false 4 Long 0 0,First,#,{0},del_month,-1,-1;del_year \"del_year\" true true false 4 Long 0 0,First,#,{0},del_year,-1,-1;pri_mill \"pri_mill\" true true false 50 Text 0 0,First,#,{0},primary_loc,0,49;tract_name \"tract_name\" true true false 4 Long 0 0,First,#,{0},report_tract_no,-1,-1;supplier \"supplier\" true true false 16 Text 0 0,First,#,{0},supplier,0,15;startmonth \"startmonth\" true true false 4 Long 0 0,First,#,{0},begin_month,-1,-1;startyear \"startyear\" true true false 4 Long 0 0,First,#,{0},begin_year,-1,-1;endmonth \"endmonth\" true true false 4 Long 0 0,First,#,{0},end_month,-1,-1;endyear \"endyear\" true true false 4 Long 0 0,First,#,{0},end_year,-1,-1;Shape_Length \"Shape_Length\" false true true 8 Double 0 0,First,#,{0},Shape_Length,-1,-1;Shape_Area \"Shape_Area\" false true true 8 Double 0 0,First,#,{0},Shape_Area,-1,-1".format(outfc))
 
+			prof.stop()
 			if arcpy.Exists(outtbl):
 				arcpy.Delete_management(outtbl)
 
 			sys.stdout.flush()
 
+prof.start("cleanup")
 arcpy.Delete_management(all_tracts)
+prof.stop()
+
+profiles_fldr = os.path.join(here, "Profiles")
+earlier_runs = profiler.previous_reports(profiles_fldr, prof.name)
+print("Profile: {0}".format(prof.save(profiles_fldr)))
+profiler.print_report(prof.report())
+if earlier_runs:
+	print("\nCompared with the median of the last {0} run(s):".format(len(earlier_runs)))
+	profiler.print_comparison(profiler.compare(prof.report(), earlier_runs))
 
 print("Done")
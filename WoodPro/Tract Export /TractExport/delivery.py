@@ -0,0 +1,401 @@
+"""
+Streaming, size-aware packaging and email delivery for the tract export
+
+emailFilegdb.py read the whole export zip into a MIMEBase payload and built the message
+in memory, so memory grew with the export and a large month could exceed the SES
+message limit (40 MB after base64). This module keeps memory flat and messages bounded:
+
+	StreamingZipWriter    zip members are copied in CHUNK_SIZE chunks, as files are
+	                      written; a new part is started before a group of files is
+	                      expected to push the current part over max_part_bytes
+	split_zip()           repackage an existing zip (e.g. the 7-Zip one from the .cmd)
+	                      into size-bounded parts; a part that still ends up too big is
+	                      cut into .001/.002 volumes 7-Zip can join
+	write_message()       MIME message written to disk, attachment base64-encoded chunk by chunk
+	send_message()        SMTP DATA streamed from that file
+	LocalSMTPServer       minimal SMTP stand-in that saves each message to a folder,
+	                      for testing delivery without SES
+
+Usage:
+	python delivery.py smtpd [port] [folder]     run the local SMTP stand-in (default 8025, ./outbox)
+
+	then e.g. SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=0 python emailFilegdb.py Export.zip
+"""
+
+import base64
+import email.utils
+import os
+import smtplib
+import socketserver
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from email import policy
+from email.mime.text import MIMEText
+
+CHUNK_SIZE = 1024 * 1024
+# SES accepts 40 MB messages; base64 adds a third, leave room for headers and the body
+DEFAULT_PART_BYTES = 25 * 1024 * 1024
+COMPRESSION_MARGIN = 1.5  # headroom over the compression ratio seen so far when filling a part
+B64_CHUNK = 57 * 1024  # multiple of 57 bytes -> whole 76-character base64 lines
+
+
+class StreamingZipWriter:
+	"""
+	Writes files into one or more zip archives with bounded size and memory.
+
+	Files added together with add_group() (e.g. the .shp/.shx/.dbf/.prj of one mill)
+	always land in the same part. Parts are <base>.zip when everything fits in one,
+	otherwise <base>.part1.zip, <base>.part2.zip, ...
+	"""
+
+	def __init__(self, base_path, max_part_bytes=DEFAULT_PART_BYTES, compresslevel=9):
+		self.base_path = base_path[:-4] if base_path.lower().endswith(".zip") else base_path
+		self.max_part_bytes = max_part_bytes
+		self.compresslevel = compresslevel
+		self.parts = []
+		self._zip = None
+		self._fp = None
+		self._members = 0
+		self._raw_bytes = 0
+		self._packed_bytes = 0
+
+	def _open_part(self):
+		self._close_part()
+		path = f"{self.base_path}.part{len(self.parts) + 1}.zip"
+		self._fp = open(path, "wb")
+		self._zip = zipfile.ZipFile(self._fp, "w", zipfile.ZIP_DEFLATED, compresslevel=self.compresslevel)
+		self._members = 0
+		self.parts.append(path)
+
+	def _close_part(self):
+		if self._zip is not None:
+			self._zip.close()
+			self._fp.close()
+			self._zip = None
+			self._fp = None
+
+	def _expected_size(self, size):
+		"""
+		Compressed size estimate: the compression ratio seen so far plus COMPRESSION_MARGIN,
+		never more than size itself (deflate doesn't grow data by more than a few bytes)
+		"""
+		if not self._raw_bytes:
+			return size
+		return size * min(1.0, self._packed_bytes / self._raw_bytes * COMPRESSION_MARGIN)
+
+	def add_stream_group(self, members):
+		"""
+		members: [(arcname, size, open_func)] - open_func() returns a readable binary file.
+		size is the uncompressed size (used to pick the part and for zip64).
+		"""
+		expected = sum(self._expected_size(size) for _, size, _ in members)
+		if self._zip is None or (self._members and self._fp.tell() + expected + 1024 > self.max_part_bytes):
+			self._open_part()
+		for arcname, size, open_func in members:
+			with open_func() as src, self._zip.open(arcname, "w", force_zip64=size > 2 ** 31) as dst:
+				while True:
+					chunk = src.read(CHUNK_SIZE)
+					if not chunk:
+						break
+					dst.write(chunk)
+			info = self._zip.infolist()[-1]
+			self._raw_bytes += info.file_size
+			self._packed_bytes += info.compress_size
+			self._members += 1
+
+	def add_group(self, paths, arcnames=None):
+		"""Add files from disk as one group"""
+		arcnames = arcnames or [os.path.basename(p) for p in paths]
+		self.add_stream_group([(a, os.path.getsize(p), lambda p=p: open(p, "rb")) for p, a in zip(paths, arcnames)])
+
+	def add(self, path, arcname=None):
+		self.add_group([path], [arcname or os.path.basename(path)])
+
+	def close(self):
+		"""Finish the archive; returns the part paths (oversized parts cut into volumes)"""
+		self._close_part()
+		if len(self.parts) == 1:
+			os.replace(self.parts[0], self.base_path + ".zip")
+			self.parts = [self.base_path + ".zip"]
+
+		paths = []
+		for part in self.parts:
+			paths.extend(split_volumes(part, self.max_part_bytes) if os.path.getsize(part) > self.max_part_bytes else [part])
+		return paths
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		if exc_type is not None:
+			self._close_part()
+
+
+def split_volumes(path, max_part_bytes):
+	"""Cut a file into <path>.001, .002, ... of at most max_part_bytes (7-Zip opens .001)"""
+	volumes = []
+	with open(path, "rb") as src:
+		while True:
+			volume = f"{path}.{len(volumes) + 1:03d}"
+			written = 0
+			with open(volume, "wb") as dst:
+				while written < max_part_bytes:
+					chunk = src.read(min(CHUNK_SIZE, max_part_bytes - written))
+					if not chunk:
+						break
+					dst.write(chunk)
+					written += len(chunk)
+			if written == 0:
+				os.remove(volume)
+				break
+			volumes.append(volume)
+	os.remove(path)
+	return volumes
+
+
+def package_folder(folder, base_path, max_part_bytes=DEFAULT_PART_BYTES):
+	"""Zip a folder (e.g. Shapefiles), keeping files with the same stem in the same part"""
+	groups = {}
+	for root, _, files in os.walk(folder):
+		for name in sorted(files):
+			path = os.path.join(root, name)
+			arcname = os.path.relpath(path, os.path.dirname(folder))
+			groups.setdefault(os.path.splitext(arcname)[0], []).append((path, arcname))
+
+	with StreamingZipWriter(base_path, max_part_bytes) as writer:
+		for stem in sorted(groups):
+			writer.add_group([p for p, _ in groups[stem]], [a for _, a in groups[stem]])
+		return writer.close()
+
+
+def split_zip(zip_path, max_part_bytes=DEFAULT_PART_BYTES):
+	"""
+	[zip_path] when it is small enough to send, otherwise the members streamed into
+	size-bounded <name>.partN.zip archives next to it (files sharing a stem stay together).
+	"""
+	if os.path.getsize(zip_path) <= max_part_bytes:
+		return [zip_path]
+
+	with zipfile.ZipFile(zip_path) as src:
+		groups = {}
+		for info in src.infolist():
+			if not info.is_dir():
+				groups.setdefault(os.path.splitext(info.filename)[0], []).append(info)
+
+		writer = StreamingZipWriter(zip_path[:-4] + "_split", max_part_bytes)
+		with writer:
+			for stem in sorted(groups):
+				writer.add_stream_group([(i.filename, i.file_size, lambda i=i: src.open(i)) for i in groups[stem]])
+			return writer.close()
+
+
+def write_message(message_path, sender, recipient, subject, textbody, attachment=None, sender_name=None, reply_to=None):
+	"""
+	Write a multipart/mixed message to message_path without loading the attachment:
+	the zip is base64-encoded B64_CHUNK bytes at a time. Lines end in CRLF.
+	"""
+	boundary = "=_" + uuid.uuid4().hex
+	headers = [
+		("Subject", subject),
+		("From", email.utils.formataddr((sender_name, sender)) if sender_name else sender),
+		("To", recipient),
+		("Date", email.utils.formatdate(localtime=True)),
+		("Message-ID", email.utils.make_msgid()),
+		("MIME-Version", "1.0"),
+		("Content-Type", f'multipart/mixed; boundary="{boundary}"'),
+	]
+	if reply_to:
+		headers.insert(3, ("Reply-To", reply_to))
+
+	with open(message_path, "wb") as out:
+		for name, value in headers:
+			out.write(f"{name}: {value}\r\n".encode("utf-8"))
+		out.write(b"\r\n")
+
+		out.write(f"--{boundary}\r\n".encode())
+		out.write(MIMEText(textbody, "plain").as_bytes(policy=policy.SMTP))
+		out.write(b"\r\n")
+
+		if attachment:
+			filename = os.path.basename(attachment)
+			out.write(f"--{boundary}\r\n".encode())
+			out.write(f'Content-Type: application/zip; name="{filename}"\r\n'.encode())
+			out.write(b"Content-Transfer-Encoding: base64\r\n")
+			out.write(f'Content-Disposition: attachment; filename="{filename}"\r\n\r\n'.encode())
+			with open(attachment, "rb") as src:
+				while True:
+					chunk = src.read(B64_CHUNK)
+					if not chunk:
+						break
+					out.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+
+		out.write(f"--{boundary}--\r\n".encode())
+	return message_path
+
+
+def send_message(host, port, sender, recipients, message_path, username=None, password=None, starttls=True, timeout=120):
+	"""
+	Deliver a message file over SMTP, streaming the DATA section from disk.
+	Logs in only when credentials are given and the server offers AUTH.
+	"""
+	server = smtplib.SMTP(host, port, timeout=timeout)
+	try:
+		server.ehlo()
+		if starttls:
+			server.starttls()
+			# smtplib docs recommend calling ehlo() before & after starttls()
+			server.ehlo()
+		if username and server.has_extn("auth"):
+			server.login(username, password)
+
+		code, resp = server.mail(sender)
+		if code != 250:
+			raise smtplib.SMTPSenderRefused(code, resp, sender)
+		for recipient in recipients:
+			code, resp = server.rcpt(recipient)
+			if code not in (250, 251):
+				raise smtplib.SMTPRecipientsRefused({recipient: (code, resp)})
+
+		code, resp = server.docmd("DATA")
+		if code != 354:
+			raise smtplib.SMTPDataError(code, resp)
+		buffer = []
+		buffered = 0
+		with open(message_path, "rb") as f:
+			for line in f:
+				if line.startswith(b"."):
+					line = b"." + line  # dot-stuffing (RFC 5321 4.5.2)
+				buffer.append(line)
+				buffered += len(line)
+				if buffered >= CHUNK_SIZE:
+					server.send(b"".join(buffer))
+					buffer, buffered = [], 0
+		if buffer and not buffer[-1].endswith(b"\r\n"):
+			buffer.append(b"\r\n")
+		server.send(b"".join(buffer) + b".\r\n")
+		code, resp = server.getreply()
+		if code != 250:
+			raise smtplib.SMTPDataError(code, resp)
+	finally:
+		try:
+			server.quit()
+		except smtplib.SMTPException:
+			server.close()
+
+
+def deliver(parts, recipients, subject, textbody, smtp, work_dir=None):
+	"""
+	Send every part to every recipient, one message each (subject gets "part i of n"
+	when there is more than one). smtp: dict of send_message() keyword arguments plus
+	sender / sender_name / reply_to. Returns [(recipient, part, error or None)].
+	"""
+	smtp = dict(smtp)
+	sender = smtp.pop("sender")
+	sender_name = smtp.pop("sender_name", None)
+	reply_to = smtp.pop("reply_to", None)
+	work_dir = work_dir or os.path.dirname(os.path.abspath(parts[0]))
+
+	results = []
+	for recipient in recipients:
+		for i, part in enumerate(parts):
+			part_subject = subject if len(parts) == 1 else f"{subject} (part {i + 1} of {len(parts)})"
+			part_body = textbody if len(parts) == 1 else f"{textbody}\n\nAttachment {i + 1} of {len(parts)}: {os.path.basename(part)}"
+			message_path = os.path.join(work_dir, f".message_{uuid.uuid4().hex}.eml")
+			try:
+				write_message(message_path, sender, recipient, part_subject, part_body, part, sender_name, reply_to)
+				send_message(recipients=[recipient], sender=sender, message_path=message_path, **smtp)
+				results.append((recipient, part, None))
+			except Exception as e:
+				results.append((recipient, part, e))
+			finally:
+				if os.path.exists(message_path):
+					os.remove(message_path)
+	return results
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+	"""Just enough SMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT"""
+
+	def reply(self, line):
+		self.wfile.write(line.encode() + b"\r\n")
+
+	def handle(self):
+		self.reply("220 localhost tract export SMTP stand-in")
+		sender, recipients = None, []
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			command = line.decode("utf-8", "replace").strip()
+			verb = command[:4].upper()
+			if verb in ("EHLO", "HELO"):
+				self.reply("250-localhost" if verb == "EHLO" else "250 localhost")
+				if verb == "EHLO":
+					self.reply("250 SIZE 0")
+			elif verb == "MAIL":
+				sender, recipients = command.split(":", 1)[1].strip(" <>"), []
+				self.reply("250 OK")
+			elif verb == "RCPT":
+				recipients.append(command.split(":", 1)[1].strip(" <>"))
+				self.reply("250 OK")
+			elif verb == "DATA":
+				self.reply("354 End data with <CR><LF>.<CR><LF>")
+				path = self.server.save_message(self.rfile, sender, recipients)
+				self.reply(f"250 OK saved {os.path.basename(path)}")
+			elif verb == "RSET":
+				sender, recipients = None, []
+				self.reply("250 OK")
+			elif verb == "NOOP":
+				self.reply("250 OK")
+			elif verb == "QUIT":
+				self.reply("221 Bye")
+				return
+			else:
+				self.reply("502 Command not implemented")
+
+
+class LocalSMTPServer(socketserver.ThreadingTCPServer):
+	"""SMTP stand-in that streams every received message to <folder>/<n>.eml"""
+
+	allow_reuse_address = True
+	daemon_threads = True
+
+	def __init__(self, folder="outbox", host="localhost", port=8025):
+		super().__init__((host, port), _SMTPHandler)
+		self.folder = folder
+		self.messages = []
+		self._lock = threading.Lock()
+		os.makedirs(folder, exist_ok=True)
+
+	def save_message(self, rfile, sender, recipients):
+		with self._lock:
+			path = os.path.join(self.folder, f"{int(time.time())}_{len(self.messages) + 1}.eml")
+			self.messages.append({"path": path, "sender": sender, "recipients": recipients})
+		with open(path, "wb") as f:
+			for line in rfile:
+				if line == b".\r\n":
+					break
+				f.write(line[1:] if line.startswith(b"..") else line)
+		return path
+
+	def start(self):
+		"""Serve in a background thread (for tests); stop with shutdown()"""
+		thread = threading.Thread(target=self.serve_forever, daemon=True)
+		thread.start()
+		return self
+
+
+if __name__ == "__main__":
+	if len(sys.argv) > 1 and sys.argv[1] == "smtpd":
+		port = int(sys.argv[2]) if len(sys.argv) > 2 else 8025
+		folder = sys.argv[3] if len(sys.argv) > 3 else "outbox"
+		print(f"SMTP stand-in on localhost:{port}, saving to {os.path.abspath(folder)} (Ctrl+C to stop)")
+		try:
+			LocalSMTPServer(folder, port=port).serve_forever()
+		except KeyboardInterrupt:
+			pass
+	else:
+		print(__doc__)
@@ -2,12 +2,21 @@
 # ---------------------------------------------------------------------------
 # ---------------------------------------------------------------------------
 # emailFilegdb.py
+#
+# Sends the export zip (or a Shapefiles folder, zipped on the fly) to the users.
+# Archives bigger than max_part_bytes are repackaged into size-bounded parts
+# and sent as one message per part. Messages are written to disk and streamed
+# to the SMTP server (delivery.py), so memory use doesn't grow with the export.
+#
+# SMTP_HOST / SMTP_PORT / SMTP_STARTTLS=0 point delivery at a local stand-in:
+#   python delivery.py smtpd 8025
+#   set SMTP_HOST=localhost& set SMTP_PORT=8025& set SMTP_STARTTLS=0
 # ---------------------------------------------------------------------------
 import sys, os
 import datetime
 
 if len(sys.argv)<2:
-	print ('Usage: emailFilegdb.py [zip file]')
+	print ('Usage: emailFilegdb.py [zip file or folder]')
 	sys.exit()
 
 zipfile = sys.argv[1]
@@ -16,18 +25,7 @@ if not os.path.exists(zipfile):
 	print("ERROR: File not found: " + zipfile)
 	sys.exit(1)
 
-import smtplib
-# For guessing MIME type based on file name extension
-import mimetypes
-import email.utils
-from email import encoders
-from email.message import Message
-#from email.mime.audio import MIMEAudio
-from email.mime.base import MIMEBase
-#from email.mime.image import MIMEImage
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-import calendar
+import delivery
 
 currentDateTime = datetime.datetime.now().replace(microsecond=0)
 print(currentDateTime)
@@ -44,8 +42,10 @@ mmm = yesterday.strftime("%b")  # Month name, short version
 dd = yesterday.day
 yyyy = yesterday.year
 
-host = 'email-smtp.us-east-1.amazonaws.com'
-port = 587
+host = os.getenv("SMTP_HOST", 'email-smtp.us-east-1.amazonaws.com')
+port = int(os.getenv("SMTP_PORT", 587))
+starttls = os.getenv("SMTP_STARTTLS", "1") != "0"
+max_part_bytes = delivery.DEFAULT_PART_BYTES
 sender = 'support@hosting.jws.com'
 senderName = 'Sewall Support'
 replyto = 'support@jws.com'
@@ -65,53 +65,32 @@ textbody = f"The Tract Export for {mmm} {yyyy} has been completed."
 users = ['Joe.ClarkII@canfor.com', 'cammo@sewall.com']
 # users = ['cammo@sewall.com']
 
-for user in users:
-	# Email Person to be notified
-	print (user)
-	recipient = user
-
-	# Create message container
-	msg = MIMEMultipart('mixed')
-	msg['Subject'] = subject
-	msg['From'] = email.utils.formataddr((senderName, sender))
-	msg['To'] = recipient
-	msg['Reply-To'] = replyto
-	# Comment or delete the next line if you are not using a configuration set
-	# msg.add_header('X-SES-CONFIGURATION-SET',CONFIGURATION_SET)
-
-	# Record the MIME types of both parts - text/plain and text/html.
-	part1 = MIMEText(textbody, 'plain')
-	# part2 = MIMEText(htmlbody, 'html')
-
-	# Attach parts into message container.
-	# According to RFC 2046, the last part of a multipart message, in this case
-	# the HTML message, is best and preferred.
-	msg.attach(part1)
-	# msg.attach(part2)
-
-	efile = open(zipfile, 'rb')
-	ctype, encoding = mimetypes.guess_type(zipfile)
-	maintype, subtype = ctype.split('/', 1)
-	part3 = MIMEBase(maintype, subtype)
-	part3.set_payload(efile.read())
-	efile.close()
-	encoders.encode_base64(part3)
-	part3.add_header('Content-Disposition', 'attachment; filename="%s"' % os.path.basename(zipfile))
-	msg.attach(part3)
-
-	# Try to send the message.
-	try:  
-		server = smtplib.SMTP(host, port)
-		server.ehlo()
-		server.starttls()
-		# stmplib docs recommend calling ehlo() before & after starttls()
-		server.ehlo()
-		server.login(smtp_username, smtp_password)
-		server.sendmail(sender, recipient, msg.as_string())
-		server.close()
+# Size-bounded attachments: the zip itself when it fits, otherwise its parts
+if os.path.isdir(zipfile):
+	parts = delivery.package_folder(zipfile, zipfile.rstrip("\\/"), max_part_bytes)
+else:
+	parts = delivery.split_zip(zipfile, max_part_bytes)
+for part in parts:
+	print("{0} ({1:,} bytes)".format(os.path.basename(part), os.path.getsize(part)))
+
+smtp = {
+	'host': host,
+	'port': port,
+	'username': smtp_username,
+	'password': smtp_password,
+	'starttls': starttls,
+	'sender': sender,
+	'sender_name': senderName,
+	'reply_to': replyto
+}
+
+errors = 0
+for recipient, part, error in delivery.deliver(parts, users, subject, textbody, smtp):
 	# Display an error message if something goes wrong.
-	except Exception as e:
-		print ("Error: ", e)
+	if error:
+		errors += 1
+		print ("Error: ", recipient, os.path.basename(part), error)
 	else:
-		print ("Email sent")
+		print ("Email sent", recipient, os.path.basename(part))
 
+sys.exit(1 if errors else 0)
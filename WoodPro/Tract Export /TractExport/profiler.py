@@ -0,0 +1,388 @@
+"""
+Stage-level profiling for the monthly tract export
+
+ExportToFgdb.py / tract_export.py only print a few progress lines, which doesn't say
+whether the download, the projection, the per-mill joins or the shapefile writes
+dominate a run. A Profiler records for every named stage:
+
+	wall_s          elapsed time (perf_counter)
+	cpu_s           CPU time of this process (process_time - arcpy tools run in-process)
+	child_cpu_s     CPU time of finished worker processes (write_mills' process pool;
+	                not available on Windows)
+	peak_rss_mb     process memory high-water mark at the end of the stage, and
+	rss_growth_mb   how much the stage raised it (0 = stayed under an earlier peak)
+	peak_traced_mb  peak Python/NumPy allocations during the stage (trace_memory=True
+	                only - tracemalloc slows allocation-heavy code noticeably)
+	rows            row/feature count, set by the caller
+
+Stage names may carry a suffix after ":" (e.g. "export:Axis"); the report also totals
+the stages per group ("export"), which is what runs are compared on, since the set of
+mills changes from month to month.
+
+At the end of a run save() writes the report as JSON into a profiles folder and
+appends it to history.jsonl there; compare() sets a run against the median of earlier
+runs per group.
+
+Usage:
+	python profiler.py show <profile.json>
+	python profiler.py compare <profile.json> <previous.json | history.jsonl> [runs]
+	python profiler.py history <history.jsonl> [runs]
+
+	from profiler import Profiler
+	prof = Profiler("tract_export")
+	with prof.stage("download") as stage:
+		tracts = fetch_all_tracts(token, window)
+		stage["rows"] = len(tracts)
+	prof.save(profiles_fldr)
+"""
+
+import datetime
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+	import resource
+except ImportError:  # Windows
+	resource = None
+
+HISTORY_NAME = "history.jsonl"
+COMPARE_RUNS = 5  # earlier runs whose median a run is compared with
+MB = 1024 * 1024
+
+
+def peak_rss_bytes():
+	"""Process memory high-water mark in bytes (None if the platform doesn't report it)"""
+	if resource is not None:
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		return peak if sys.platform == "darwin" else peak * 1024  # Linux reports KB
+	if sys.platform == "win32":
+		import ctypes
+		from ctypes import wintypes
+
+		class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+			_fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+				("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+				("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+				("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+				("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+		counters = PROCESS_MEMORY_COUNTERS()
+		counters.cb = ctypes.sizeof(counters)
+		process = ctypes.windll.kernel32.GetCurrentProcess()
+		if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+			return counters.PeakWorkingSetSize
+	return None
+
+
+def child_cpu_seconds():
+	"""User + system CPU of terminated child processes (None on Windows)"""
+	if resource is None:
+		return None
+	usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+	return usage.ru_utime + usage.ru_stime
+
+
+def _mb(num_bytes):
+	return None if num_bytes is None else round(num_bytes / MB, 1)
+
+
+def _delta(end, start):
+	return None if end is None or start is None else round(end - start, 3)
+
+
+class Profiler:
+	"""Per-stage wall/CPU/memory/rows of one run"""
+
+	def __init__(self, name, trace_memory=False, meta=None):
+		self.name = name
+		self.meta = dict(meta or {})
+		self.trace_memory = trace_memory
+		self.started_at = datetime.datetime.now().replace(microsecond=0)
+		self.stages = []
+		self._opened = 0
+		self._stack = []
+		self._current = None  # stage opened with start()
+		self._wall = time.perf_counter()
+		self._cpu = time.process_time()
+		self._child_cpu = child_cpu_seconds()
+		self._report = None
+		if trace_memory and not tracemalloc.is_tracing():
+			tracemalloc.start()
+
+	def _record(self, name, parent):
+		self._opened += 1
+		return {
+			"name": name,
+			"group": name.split(":", 1)[0],
+			"parent": parent,
+			"seq": self._opened,
+			"offset_s": round(time.perf_counter() - self._wall, 3),
+			"rows": None,
+		}
+
+	def _open(self, name):
+		if self.trace_memory:
+			# the enclosing stage keeps the peak it reached so far, then the counter restarts
+			if self._stack:
+				self._stack[-1]["_traced"] = max(self._stack[-1]["_traced"], tracemalloc.get_traced_memory()[1])
+			tracemalloc.reset_peak()
+		record = self._record(name, self._stack[-1]["name"] if self._stack else None)
+		record.update({
+			"_wall": time.perf_counter(),
+			"_cpu": time.process_time(),
+			"_child_cpu": child_cpu_seconds(),
+			"_rss": peak_rss_bytes(),
+			"_traced": 0,
+		})
+		self._stack.append(record)
+		return record
+
+	def _close(self, record):
+		rss = peak_rss_bytes()
+		record["wall_s"] = round(time.perf_counter() - record.pop("_wall"), 3)
+		record["cpu_s"] = round(time.process_time() - record.pop("_cpu"), 3)
+		record["child_cpu_s"] = _delta(child_cpu_seconds(), record.pop("_child_cpu"))
+		record["peak_rss_mb"] = _mb(rss)
+		record["rss_growth_mb"] = _mb(_delta(rss, record.pop("_rss")))
+		traced = max(record.pop("_traced"), tracemalloc.get_traced_memory()[1]) if self.trace_memory else None
+		record["peak_traced_mb"] = _mb(traced)
+		if record in self._stack:
+			self._stack.remove(record)
+		if self.trace_memory and self._stack:
+			self._stack[-1]["_traced"] = max(self._stack[-1]["_traced"], traced)
+		self.stages.append(record)
+		return record
+
+	@contextmanager
+	def stage(self, name):
+		"""Profile the with-block as stage name; the yielded dict takes "rows" (and any extra keys)"""
+		record = self._open(name)
+		try:
+			yield record
+		finally:
+			self._close(record)
+
+	def start(self, name, rows=None):
+		"""
+		Start stage name, ending the one started before it - for scripts that run top to
+		bottom (ExportToFgdb.py) where wrapping every block in a with statement doesn't fit.
+		"""
+		self.stop()
+		self._current = self._open(name)
+		self._current["rows"] = rows
+		return self._current
+
+	def stop(self, rows=None):
+		"""End the stage opened with start() (no-op if there is none)"""
+		if self._current is None:
+			return None
+		record, self._current = self._current, None
+		if rows is not None:
+			record["rows"] = rows
+		return self._close(record)
+
+	def add(self, name, parent=None, **values):
+		"""
+		Record a stage measured elsewhere, e.g. in a worker process (see stage_list()),
+		nested under parent.
+		"""
+		record = self._record(name, parent)
+		record.update({"wall_s": 0.0, "cpu_s": 0.0, "child_cpu_s": None, "peak_rss_mb": None,
+			"rss_growth_mb": None, "peak_traced_mb": None})
+		record.update(values)
+		self.stages.append(record)
+		return record
+
+	def rows(self, count):
+		"""Set the row count of the innermost open stage"""
+		if self._stack:
+			self._stack[-1]["rows"] = int(count)
+
+	def report(self):
+		"""The run as a JSON-ready dict; ends any open stage and stops memory tracing"""
+		if self._report is not None:
+			return self._report
+		self.stop()
+		while self._stack:
+			self._close(self._stack[-1])
+		if self.trace_memory and tracemalloc.is_tracing():
+			tracemalloc.stop()
+		self._report = {
+			"name": self.name,
+			"started_at": self.started_at.isoformat(),
+			"wall_s": round(time.perf_counter() - self._wall, 3),
+			"cpu_s": round(time.process_time() - self._cpu, 3),
+			"child_cpu_s": _delta(child_cpu_seconds(), self._child_cpu),
+			"peak_rss_mb": _mb(peak_rss_bytes()),
+			"trace_memory": self.trace_memory,
+			"meta": self.meta,
+			"stages": sorted(self.stages, key=lambda s: s["seq"]),
+			"groups": group_totals(self.stages),
+		}
+		return self._report
+
+	def save(self, profiles_fldr):
+		"""Write the report to <name>_<yyyymmdd_hhmmss>.json and append it to history.jsonl"""
+		report = self.report()
+		os.makedirs(profiles_fldr, exist_ok=True)
+		base = os.path.join(profiles_fldr, "{0}_{1}".format(self.name, self.started_at.strftime("%Y%m%d_%H%M%S")))
+		path = base + ".json"
+		number = 1
+		while os.path.exists(path):
+			number += 1
+			path = f"{base}_{number}.json"
+		with open(path, "w") as f:
+			json.dump(report, f, indent=2)
+		with open(os.path.join(profiles_fldr, HISTORY_NAME), "a") as f:
+			f.write(json.dumps(report) + "\n")
+		return path
+
+
+def stage_list(prof):
+	"""A profiler's stages without the bookkeeping keys, to return from a worker and add() to the run's profiler"""
+	keep = ("name", "rows", "wall_s", "cpu_s", "child_cpu_s", "peak_rss_mb", "rss_growth_mb", "peak_traced_mb")
+	return [{k: s[k] for k in keep} for s in prof.report()["stages"]]
+
+
+def group_totals(stages):
+	"""
+	Stages summed per group: {group: {count, wall_s, cpu_s, child_cpu_s, rows, peak_rss_mb, parent}}.
+	Nested stages count in their own group (keep group names distinct from their parent's);
+	parent is the group of the stage they ran in, None for top-level groups.
+	"""
+	groups = {}
+	group_of = {s["name"]: s["group"] for s in stages}
+	for s in sorted(stages, key=lambda s: s["seq"]):
+		g = groups.setdefault(s["group"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "child_cpu_s": None,
+			"rows": None, "peak_rss_mb": None, "parent": group_of.get(s["parent"], s["parent"])})
+		g["count"] += 1
+		g["wall_s"] = round(g["wall_s"] + s["wall_s"], 3)
+		g["cpu_s"] = round(g["cpu_s"] + s["cpu_s"], 3)
+		if s["child_cpu_s"] is not None:
+			g["child_cpu_s"] = round((g["child_cpu_s"] or 0.0) + s["child_cpu_s"], 3)
+		if s["rows"] is not None:
+			g["rows"] = (g["rows"] or 0) + s["rows"]
+		if s["peak_rss_mb"] is not None:
+			g["peak_rss_mb"] = max(g["peak_rss_mb"] or 0.0, s["peak_rss_mb"])
+	return groups
+
+
+def load_reports(path, name=None):
+	"""Reports from a profile .json or a history.jsonl, oldest first (optionally only runs called name)"""
+	with open(path) as f:
+		if path.endswith(".jsonl"):
+			reports = [json.loads(line) for line in f if line.strip()]
+		else:
+			reports = [json.load(f)]
+	return [r for r in reports if name is None or r["name"] == name]
+
+
+def previous_reports(profiles_fldr, name, runs=COMPARE_RUNS):
+	"""The last runs reports called name from profiles_fldr/history.jsonl ([] if there is none)"""
+	path = os.path.join(profiles_fldr, HISTORY_NAME)
+	if not os.path.exists(path):
+		return []
+	return load_reports(path, name)[-runs:]
+
+
+def compare(current, previous):
+	"""
+	Per group of current: wall/CPU seconds and rows against the median of the previous
+	reports. Groups only in the earlier runs are listed with wall_s None.
+	"""
+	rows = []
+	groups = list(current["groups"]) + sorted({g for r in previous for g in r["groups"]} - set(current["groups"]))
+	for group in groups:
+		now = current["groups"].get(group)
+		before = [r["groups"][group] for r in previous if group in r["groups"]]
+
+		def median(key):
+			values = [b[key] for b in before if b.get(key) is not None]
+			return round(statistics.median(values), 3) if values else None
+
+		row = {"group": group, "wall_s": now["wall_s"] if now else None, "cpu_s": now["cpu_s"] if now else None,
+			"rows": now["rows"] if now else None, "previous_wall_s": median("wall_s"),
+			"previous_cpu_s": median("cpu_s"), "previous_rows": median("rows"), "previous_runs": len(before)}
+		if row["wall_s"] is not None and row["previous_wall_s"] is not None:
+			row["delta_s"] = round(row["wall_s"] - row["previous_wall_s"], 3)
+			row["ratio"] = round(row["wall_s"] / row["previous_wall_s"], 2) if row["previous_wall_s"] > 0 else None
+		else:
+			row["delta_s"] = row["ratio"] = None
+		rows.append(row)
+	return rows
+
+
+def _fmt(value, spec):
+	"""format(value, spec), or "-" in the same width for None"""
+	if value is None:
+		return "-".rjust(int(re.match(r"\D*(\d*)", spec).group(1) or 0))
+	return format(value, spec)
+
+
+def print_report(report):
+	"""Stage table (indented for nested stages) and per-group totals with their share of the run"""
+	total = report["wall_s"] or 1e-9
+	depth = {}
+	print(f"\nProfile: {report['name']} {report['started_at']}")
+	print(f"{'Stage':<32} {'Wall s':>9} {'CPU s':>9} {'Child s':>8} {'Rows':>10} {'Peak MB':>8} {'+RSS MB':>8} {'Traced':>8}")
+	print("-" * 100)
+	for s in report["stages"]:
+		depth[s["name"]] = depth.get(s["parent"], -1) + 1 if s["parent"] else 0
+		name = "  " * depth[s["name"]] + s["name"]
+		print(f"{name[:32]:<32} {s['wall_s']:>9.2f} {s['cpu_s']:>9.2f} {_fmt(s['child_cpu_s'], '>8.2f')} "
+			f"{_fmt(s['rows'], '>10,')} {_fmt(s['peak_rss_mb'], '>8.1f')} {_fmt(s['rss_growth_mb'], '>8.1f')} "
+			f"{_fmt(s['peak_traced_mb'], '>8.1f')}")
+	print("-" * 100)
+	print(f"{'Group':<32} {'Wall s':>9} {'CPU s':>9} {'Share':>8} {'Stages':>10}")
+	for group, g in sorted(report["groups"].items(), key=lambda item: -item[1]["wall_s"]):
+		# nested groups (worker stages) overlap their parent and each other, so no share of the run
+		share = f"{g['wall_s'] / total:>8.0%}" if not g.get("parent") else f"in {g['parent']}"[:8].rjust(8)
+		print(f"{group[:32]:<32} {g['wall_s']:>9.2f} {g['cpu_s']:>9.2f} {share} {g['count']:>10}")
+	print(f"{'total':<32} {report['wall_s']:>9.2f} {report['cpu_s']:>9.2f}   peak RSS {_fmt(report['peak_rss_mb'], '.1f')} MB")
+
+
+def print_comparison(rows):
+	"""compare() output as a table"""
+	if not rows:
+		return
+	print(f"\n{'Group':<24} {'Wall s':>9} {'Before s':>9} {'Delta s':>9} {'Ratio':>7} {'Rows':>10} {'Before':>10}  Runs")
+	print("-" * 92)
+	for r in rows:
+		print(f"{r['group'][:24]:<24} {_fmt(r['wall_s'], '>9.2f')} {_fmt(r['previous_wall_s'], '>9.2f')} "
+			f"{_fmt(r['delta_s'], '>+9.2f')} {_fmt(r['ratio'], '>6.2f') + ('x' if r['ratio'] is not None else ' ')} "
+			f"{_fmt(r['rows'], '>10,')} "
+			f"{_fmt(r['previous_rows'], '>10,.0f')}  {r['previous_runs']}")
+
+
+def print_history(reports):
+	"""One line per run: total and per-group wall seconds"""
+	groups = []
+	for r in reports:
+		groups += [g for g in r["groups"] if g not in groups]
+	print("\n" + f"{'Run':<20} {'Total':>8} " + " ".join(f"{g[:10]:>10}" for g in groups))
+	for r in reports:
+		cells = " ".join(_fmt(r["groups"].get(g, {}).get("wall_s"), ">10.1f") for g in groups)
+		print(f"{r['started_at'][:19]:<20} {r['wall_s']:>8.1f} {cells}")
+
+
+if __name__ == "__main__":
+	command = sys.argv[1] if len(sys.argv) > 1 else ""
+	if command == "show" and len(sys.argv) > 2:
+		for report in load_reports(sys.argv[2]):
+			print_report(report)
+	elif command == "compare" and len(sys.argv) > 3:
+		current = load_reports(sys.argv[2])[-1]
+		previous = [r for r in load_reports(sys.argv[3], current["name"]) if r["started_at"] != current["started_at"]]
+		runs = int(sys.argv[4]) if len(sys.argv) > 4 else COMPARE_RUNS
+		print_comparison(compare(current, previous[-runs:]))
+	elif command == "history" and len(sys.argv) > 2:
+		runs = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+		print_history(load_reports(sys.argv[2])[-runs:])
+	else:
+		print(__doc__)
@@ -0,0 +1,245 @@
+"""
+Shared coordinate reprojection for the tract export and the ATFS scripts
+
+ExportToFgdb.py, 5_calc_latlong_BPH.py and the shapefile conversion scripts each embed
+the Albers / Web Mercator WKT strings and reproject on their own, one geometry (or one
+vertex) at a time. This module keeps the WKT in one place, builds each pyproj
+Transformer once per (source CRS, target CRS, transformation) and reprojects whole
+coordinate arrays in a single call:
+
+	transform_xy(x, y, src, dst)               NumPy x/y arrays
+	transform_coords(coords, src, dst)         (N, 2) array
+	transform_rings(coords, offsets, src, dst) flat ring buffer + ring offsets (Esri rings)
+	transform_geometries(geoms, src, dst)      shapely 2 geometry array (GeoSeries.values)
+
+Named datum transformations are applied as an explicit PROJ pipeline, so the result
+matches ArcGIS's geographicTransformations setting instead of whatever PROJ would pick.
+WGS_1984_(ITRF00)_To_NAD_1983 is used by default whenever one side is WGS84-based and
+the other NAD83-based (Web Mercator -> Albers in the tract export).
+
+Usage:
+	python projection.py benchmark [vertices]     vertices/s: per-vertex, per-geometry, vectorized
+"""
+
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+
+WGS84 = "EPSG:4326"
+NAD83 = "EPSG:4269"
+WEB_MERCATOR = "EPSG:3857"
+ALBERS = "ESRI:102003"  # USA_Contiguous_Albers_Equal_Area_Conic
+
+# The WKT strings from ExportToFgdb.py / 5_calc_latlong_BPH.py (same CRS as ALBERS / WEB_MERCATOR)
+ALBERS_WKT = 'PROJCS["USA_Contiguous_Albers_Equal_Area_Conic",GEOGCS["GCS_North_American_1983",DATUM["D_North_American_1983",SPHEROID["GRS_1980",6378137.0,298.257222101]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],PROJECTION["Albers"],PARAMETER["False_Easting",0.0],PARAMETER["False_Northing",0.0],PARAMETER["Central_Meridian",-96.0],PARAMETER["Standard_Parallel_1",29.5],PARAMETER["Standard_Parallel_2",45.5],PARAMETER["Latitude_Of_Origin",37.5],UNIT["Meter",1.0]]'
+WEB_MERCATOR_WKT = 'PROJCS["WGS_1984_Web_Mercator_Auxiliary_Sphere",GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],PROJECTION["Mercator_Auxiliary_Sphere"],PARAMETER["False_Easting",0.0],PARAMETER["False_Northing",0.0],PARAMETER["Central_Meridian",0.0],PARAMETER["Standard_Parallel_1",0.0],PARAMETER["Auxiliary_Sphere_Type",0.0],UNIT["Meter",1.0]]'
+
+ITRF00_TO_NAD83 = "WGS_1984_(ITRF00)_To_NAD_1983"
+
+# ArcGIS transformation name -> (PROJ operation code, source datum, target datum)
+TRANSFORMATIONS = {
+	ITRF00_TO_NAD83: ("ESRI:108190", "WGS84", "NAD83"),
+}
+
+# Datum names as PROJ reports them (EPSG codes and ESRI WKT) -> TRANSFORMATIONS datum
+DATUM_NAMES = {
+	"World Geodetic System 1984": "WGS84",
+	"North American Datum 1983": "NAD83",
+}
+DEFAULT_TRANSFORMATION = ITRF00_TO_NAD83
+
+
+def _steps(definition):
+	"""Steps of a PROJ pipeline definition (a single operation is one step)"""
+	definition = definition.strip()
+	if not definition.startswith("proj=pipeline"):
+		return [definition]
+	return [step.strip() for step in definition.split(" step ")[1:]]
+
+
+def _inverse_steps(steps):
+	"""The steps of the inverse pipeline: reversed order, each step inverted"""
+	return [step[4:] if step.startswith("inv ") else "inv " + step for step in reversed(steps)]
+
+
+def _datum(crs):
+	"""WGS84/NAD83 (see DATUM_NAMES) or the datum's own name - ESRI WKT has no EPSG code to compare"""
+	name = crs.datum.name if crs.datum is not None else ""
+	for prefix, datum in DATUM_NAMES.items():
+		# "World Geodetic System 1984 ensemble" for EPSG:4326 based CRSs
+		if name == prefix or name.startswith(prefix + " ensemble"):
+			return datum
+	return name
+
+
+@lru_cache(maxsize=None)
+def _crs(crs):
+	return CRS.from_user_input(crs)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(src, dst, transformation=DEFAULT_TRANSFORMATION):
+	"""
+	always_xy Transformer for src -> dst, built once and reused.
+
+	src/dst are anything CRS.from_user_input accepts as a hashable value (EPSG/ESRI code,
+	WKT, PROJ string). transformation is a TRANSFORMATIONS name; it is only applied when
+	the two datums are the ones it converts between (in either direction). Pass None to
+	let PROJ choose.
+	"""
+	src_crs, dst_crs = _crs(src), _crs(dst)
+	if transformation:
+		code, from_datum, to_datum = TRANSFORMATIONS[transformation]
+		datums = (_datum(src_crs), _datum(dst_crs))
+		if datums in ((from_datum, to_datum), (to_datum, from_datum)):
+			# projected -> lon/lat degrees, datum shift (lat/lon order), lon/lat degrees -> projected
+			datum_steps = ["proj=axisswap order=2,1"] + _steps(Transformer.from_pipeline(code).definition) + ["proj=axisswap order=2,1"]
+			if datums == (to_datum, from_datum):
+				datum_steps = _inverse_steps(datum_steps)
+			steps = (_steps(Transformer.from_crs(src_crs, src_crs.geodetic_crs, always_xy=True).definition)
+				+ datum_steps
+				+ _steps(Transformer.from_crs(dst_crs.geodetic_crs, dst_crs, always_xy=True).definition))
+			return Transformer.from_pipeline("proj=pipeline " + " ".join("step " + s for s in steps))
+	return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+def transform_xy(x, y, src, dst, transformation=DEFAULT_TRANSFORMATION):
+	"""Reproject x/y arrays in one call. Returns new float64 arrays."""
+	x = np.array(x, dtype="float64")
+	y = np.array(y, dtype="float64")
+	get_transformer(src, dst, transformation).transform(x, y, inplace=True)
+	return x, y
+
+
+def transform_coords(coords, src, dst, transformation=DEFAULT_TRANSFORMATION):
+	"""Reproject an (N, 2) (or (N, 3), z untouched) coordinate array. Returns a new array."""
+	coords = np.array(coords, dtype="float64")
+	if len(coords) == 0:
+		return coords.reshape(0, 2)
+	x, y = transform_xy(coords[:, 0], coords[:, 1], src, dst, transformation)
+	coords[:, 0] = x
+	coords[:, 1] = y
+	return coords
+
+
+def flatten_rings(rings_per_geometry):
+	"""
+	Esri JSON rings of many geometries -> (coords, ring_offsets, geometry_offsets).
+
+	coords is one (N, 2) buffer; ring i is coords[ring_offsets[i]:ring_offsets[i + 1]] and
+	geometry j owns rings ring_offsets index geometry_offsets[j]:geometry_offsets[j + 1].
+	"""
+	ring_lengths = []
+	geometry_offsets = [0]
+	for rings in rings_per_geometry:
+		ring_lengths.extend(len(ring) for ring in rings)
+		geometry_offsets.append(geometry_offsets[-1] + len(rings))
+	ring_offsets = np.zeros(len(ring_lengths) + 1, dtype="int64")
+	np.cumsum(ring_lengths, out=ring_offsets[1:])
+
+	coords = np.empty((int(ring_offsets[-1]), 2), dtype="float64")
+	i = 0
+	for rings in rings_per_geometry:
+		for ring in rings:
+			coords[i:i + len(ring)] = [pt[:2] for pt in ring]
+			i += len(ring)
+	return coords, ring_offsets, np.array(geometry_offsets, dtype="int64")
+
+
+def unflatten_rings(coords, ring_offsets, geometry_offsets):
+	"""Inverse of flatten_rings: back to a list of Esri ring lists"""
+	rings = [coords[start:end].tolist() for start, end in zip(ring_offsets[:-1], ring_offsets[1:])]
+	return [rings[start:end] for start, end in zip(geometry_offsets[:-1], geometry_offsets[1:])]
+
+
+def transform_rings(coords, ring_offsets, src, dst, transformation=DEFAULT_TRANSFORMATION):
+	"""Reproject a flat ring buffer in one call; offsets are unchanged and returned for chaining"""
+	return transform_coords(coords, src, dst, transformation), ring_offsets
+
+
+def transform_geometries(geometries, src, dst, transformation=DEFAULT_TRANSFORMATION, include_z=False):
+	"""
+	Reproject an array of shapely 2 geometries (e.g. GeoSeries.values) with one
+	transformer call over all of their vertices.
+
+	include_z: keep the z values of 3D geometries (passed through untouched, like
+	transform_coords); by default the results are 2D.
+	"""
+	transformer = get_transformer(src, dst, transformation)
+
+	def _transform(coords):
+		x, y = transformer.transform(coords[:, 0], coords[:, 1])
+		return np.column_stack([x, y] + ([coords[:, 2]] if coords.shape[1] > 2 else []))
+
+	return shapely.transform(np.asarray(geometries, dtype=object), _transform, include_z=include_z)
+
+
+def reproject_geodataframe(gdf, dst, transformation=DEFAULT_TRANSFORMATION):
+	"""GeoDataFrame.to_crs() through the cached transformer / named transformation"""
+	src = gdf.crs.to_wkt()
+	out = gdf.copy()
+	out[gdf.geometry.name] = transform_geometries(gdf.geometry.values, src, dst, transformation)
+	return out.set_crs(_crs(dst), allow_override=True)
+
+
+def _sample_polygons(num_polygons, vertices_per_ring):
+	"""Web Mercator polygons scattered over the south-eastern US"""
+	rng = np.random.default_rng(0)
+	centers = np.column_stack([rng.uniform(-10500000, -8500000, num_polygons), rng.uniform(3500000, 4500000, num_polygons)])
+	angles = np.linspace(0, -2 * np.pi, vertices_per_ring)  # clockwise, closed
+	ring = np.column_stack([np.cos(angles), np.sin(angles)]) * 500
+	return [[(center + ring).tolist()] for center in centers]
+
+
+def benchmark(num_vertices=1000000, vertices_per_ring=100):
+	"""
+	Vertices/second for Web Mercator -> Albers (ITRF00 transformation):
+	per-vertex calls, one call per geometry with a new Transformer each time (the
+	per-feature pattern), one call per geometry with the cached Transformer, and one
+	vectorized call over the whole ring buffer.
+	"""
+	polygons = _sample_polygons(max(1, num_vertices // vertices_per_ring), vertices_per_ring)
+	coords, ring_offsets, geometry_offsets = flatten_rings(polygons)
+	total = len(coords)
+	transformer = get_transformer(WEB_MERCATOR, ALBERS)
+	results = []
+
+	def timed(name, func, vertices):
+		start = time.perf_counter()
+		func()
+		elapsed = time.perf_counter() - start
+		results.append((name, vertices, elapsed, vertices / elapsed if elapsed > 0 else float("inf")))
+
+	# Per-vertex and uncached runs are slow - time a sample and report the rate
+	sample = coords[:min(total, 20000)]
+	timed("per vertex", lambda: [transformer.transform(x, y) for x, y in sample], len(sample))
+
+	sample_geometries = polygons[:max(1, min(len(polygons), 200))]
+	timed("per geometry, new transformer", lambda: [
+		get_transformer.__wrapped__(WEB_MERCATOR, ALBERS).transform(*np.asarray(g[0]).T) for g in sample_geometries
+	], sum(len(g[0]) for g in sample_geometries))
+
+	timed("per geometry, cached", lambda: [transformer.transform(*np.asarray(g[0]).T) for g in polygons], total)
+	timed("vectorized ring buffer", lambda: transform_rings(coords, ring_offsets, WEB_MERCATOR, ALBERS), total)
+
+	shapes = shapely.polygons(shapely.linearrings(coords, indices=np.repeat(np.arange(len(ring_offsets) - 1), np.diff(ring_offsets))))
+	timed("vectorized shapely", lambda: transform_geometries(shapes, WEB_MERCATOR, ALBERS), total)
+
+	base = results[0][3]
+	print(f"\n{total:,} vertices in {len(polygons):,} polygons, {WEB_MERCATOR} -> {ALBERS} ({DEFAULT_TRANSFORMATION})")
+	print(f"{'method':<32} {'vertices':>10} {'seconds':>9} {'vertices/s':>14} {'speedup':>9}")
+	print("-" * 78)
+	for name, vertices, elapsed, rate in results:
+		print(f"{name:<32} {vertices:>10,} {elapsed:>9.3f} {rate:>14,.0f} {rate / base:>8.1f}x")
+	return results
+
+
+if __name__ == "__main__":
+	if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+		benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
+	else:
+		print(__doc__)
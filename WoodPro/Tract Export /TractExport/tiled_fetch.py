@@ -0,0 +1,363 @@
+"""
+Envelope-tiled fetching of the Sewall "All Tracts" layer
+
+ExportToFgdb.py pulls the whole layer with a single tracts_Layer.query(), which gets
+slower as the layer grows and is capped by the server's maxRecordCount. This module
+splits the layer extent into a grid of envelopes, fetches the tiles concurrently with
+spatial-filter queries (paging inside a tile when it still exceeds maxRecordCount),
+drops the duplicates of features that straddle tile edges by objectid and merges the
+result into one Esri JSON feature set on disk.
+
+Spatial-filter queries never return features without geometry (null or empty), which
+the single query() included. The merged set is checked against the layer's
+returnCountOnly total; missing objectids are looked up with returnIdsOnly and fetched
+by objectid without a spatial filter, and any remaining difference is reported (or
+raised, with on_mismatch="raise").
+
+Usage:
+    python tiled_fetch.py                 # fetch All Tracts to All_Tracts_wm.json
+    python tiled_fetch.py benchmark       # compare throughput at 1/2/4/8 workers
+
+Credentials come from SEWALL_USERNAME / SEWALL_PASSWORD.
+"""
+
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+sewall_portal = "https://maps.sewall.com/portal2"
+sewall_server_url = "https://maps.sewall.com/server2/rest/services/canfor/SalesService/FeatureServer"
+all_tracts_name = "All Tracts"
+
+GRID_ROWS = 4
+GRID_COLS = 4
+MAX_WORKERS = 8
+PAGE_SIZE = 1000  # used when maxRecordCount is not reported
+REQUEST_TIMEOUT = 120
+IDS_PER_REQUEST = 200  # objectIds per request when fetching features the tiles missed
+
+_thread_local = threading.local()
+
+
+def generate_token(username, password, portal=sewall_portal, session=None):
+	"""generateToken response ({"token", "expires" (epoch ms), ...}) for a portal"""
+	referer = portal.split("/portal")[0]
+	auth_data = {
+		'username': username,
+		'password': password,
+		'f': 'json',
+		'referer': referer,
+		'client': 'referer'
+	}
+	response = (session or requests).post(f"{portal}/sharing/rest/generateToken", data=auth_data, timeout=30)
+	token_data = response.json()
+	if 'token' not in token_data:
+		raise Exception(f"Authentication failed: {token_data.get('error', {}).get('message', 'Unknown error')}")
+	return token_data
+
+
+def get_token(username, password, portal=sewall_portal):
+	"""Generate a portal token (same request as Report_2.get_sewall_auth_token)"""
+	return generate_token(username, password, portal)['token']
+
+
+def _session(pool_size=MAX_WORKERS):
+	"""One requests.Session per worker thread, with a connection pool sized for the workers"""
+	session = getattr(_thread_local, "session", None)
+	if session is None:
+		session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		_thread_local.session = session
+	return session
+
+
+def current_token(token):
+	"""token is a token string or a provider returning the current one (export_runner renews it before it expires)"""
+	return token() if callable(token) else token
+
+
+def _get_json(url, params, timeout=REQUEST_TIMEOUT, session=None):
+	response = (session or _session()).get(url, params=params, timeout=timeout)
+	response.raise_for_status()
+	data = response.json()
+	if "error" in data:
+		raise Exception(f"{url}: {data['error'].get('message', 'Unknown error')}")
+	return data
+
+
+def find_layer_url(service_url, layer_name, token, session=None):
+	"""Locate a layer by name in a feature service (ExportToFgdb.py looks up All Tracts the same way)"""
+	service = _get_json(service_url, {"f": "json", "token": current_token(token)}, session=session)
+	for lyr in service.get("layers", []):
+		if lyr.get("name") == layer_name:
+			return f"{service_url}/{lyr['id']}"
+	raise Exception(f"Unable to locate layer {layer_name}")
+
+
+def get_layer_info(layer_url, token, where="1=1", session=None):
+	"""Layer metadata needed for tiling: extent, spatial reference, objectid field, maxRecordCount"""
+	info = _get_json(layer_url, {"f": "json", "token": current_token(token)}, session=session)
+
+	# The data extent is tighter than the layer's published extent
+	extent = info.get("extent")
+	try:
+		extent = _get_json(f"{layer_url}/query", {"where": where, "returnExtentOnly": "true", "f": "json", "token": current_token(token)},
+			session=session).get("extent") or extent
+	except Exception as e:
+		print(f"returnExtentOnly failed ({e}), using layer extent")
+
+	oid_field = info.get("objectIdField")
+	if not oid_field:
+		for field in info.get("fields", []):
+			if field.get("type") == "esriFieldTypeOID":
+				oid_field = field["name"]
+				break
+
+	return {
+		"extent": extent,
+		"spatialReference": extent.get("spatialReference") or info.get("extent", {}).get("spatialReference"),
+		"objectIdField": oid_field or "OBJECTID",
+		"maxRecordCount": info.get("maxRecordCount") or PAGE_SIZE,
+		"geometryType": info.get("geometryType"),
+		"fields": info.get("fields", [])
+	}
+
+
+def make_tiles(extent, rows=GRID_ROWS, cols=GRID_COLS):
+	"""Split an extent into rows x cols envelopes"""
+	width = (extent["xmax"] - extent["xmin"]) / cols
+	height = (extent["ymax"] - extent["ymin"]) / rows
+	tiles = []
+	for r in range(rows):
+		for c in range(cols):
+			tiles.append({
+				"xmin": extent["xmin"] + c * width,
+				"ymin": extent["ymin"] + r * height,
+				"xmax": extent["xmin"] + (c + 1) * width if c < cols - 1 else extent["xmax"],
+				"ymax": extent["ymin"] + (r + 1) * height if r < rows - 1 else extent["ymax"]
+			})
+	return tiles
+
+
+def grid_for_count(total_count, max_record_count, min_tiles=GRID_ROWS * GRID_COLS):
+	"""Square grid big enough that an evenly spread layer needs about one request per tile"""
+	tiles = max(min_tiles, math.ceil(total_count / max(1, max_record_count)))
+	side = math.ceil(math.sqrt(tiles))
+	return side, side
+
+
+def _with_oid(out_fields, oid_field):
+	"""out_fields with the objectid field added when it's an explicit list without it"""
+	if out_fields != "*" and oid_field.lower() not in [f.strip().lower() for f in out_fields.split(",")]:
+		return f"{out_fields},{oid_field}"
+	return out_fields
+
+
+def fetch_tile(query_url, token, envelope, layer, out_fields="*", where="1=1", session=None):
+	"""
+	Fetch every feature intersecting one envelope, paging with resultOffset while
+	the server reports exceededTransferLimit.
+	session: a shared requests.Session (default: this worker thread's own session)
+	Returns (features, fields, stats)
+	"""
+	envelope = dict(envelope, spatialReference=layer["spatialReference"])
+	page_size = layer["maxRecordCount"]
+	# objectid is needed to dedupe features that straddle tiles
+	out_fields = _with_oid(out_fields, layer["objectIdField"])
+	params = {
+		"where": where,
+		"geometry": json.dumps(envelope),
+		"geometryType": "esriGeometryEnvelope",
+		"spatialRel": "esriSpatialRelIntersects",
+		"outFields": out_fields,
+		"returnGeometry": "true",
+		"orderByFields": layer["objectIdField"],
+		"resultRecordCount": page_size,
+		"f": "json"
+	}
+
+	features = []
+	fields = None
+	stats = {"requests": 0, "bytes": 0}
+	offset = 0
+	while True:
+		params["resultOffset"] = offset
+		params["token"] = current_token(token)
+		response = (session or _session()).get(query_url, params=params, timeout=REQUEST_TIMEOUT)
+		response.raise_for_status()
+		stats["requests"] += 1
+		stats["bytes"] += len(response.content)
+		data = response.json()
+		if "error" in data:
+			raise Exception(data["error"].get("message", "Unknown error"))
+
+		page = data.get("features", [])
+		fields = fields or data.get("fields")
+		features.extend(page)
+		offset += len(page)
+		if not page or not data.get("exceededTransferLimit"):
+			break
+
+	return features, fields, stats
+
+
+def fetch_by_ids(query_url, token, object_ids, out_fields="*", where="1=1", session=None):
+	"""Features by objectid (no spatial filter, so null/empty geometries are included)"""
+	features = []
+	for i in range(0, len(object_ids), IDS_PER_REQUEST):
+		data = _get_json(query_url, {
+			"where": where,
+			"objectIds": ",".join(str(oid) for oid in object_ids[i:i + IDS_PER_REQUEST]),
+			"outFields": out_fields,
+			"returnGeometry": "true",
+			"f": "json",
+			"token": current_token(token)
+		}, session=session)
+		features.extend(data.get("features", []))
+	return features
+
+
+def fetch_tiled(layer_url, token, rows=None, cols=None, max_workers=MAX_WORKERS, out_fields="*", where="1=1",
+	session=None, on_mismatch="warn"):
+	"""
+	Fetch a layer tile by tile in parallel and merge the tiles, deduplicated by objectid.
+	Features the tiles miss (no geometry) are fetched by objectid afterwards.
+	token: a token string or a provider called for every request (current_token).
+	session: one thread-safe session shared by all workers (e.g. export_runner's
+	per-host limited session) instead of a session per worker thread.
+	on_mismatch: "warn" or "raise" when the merged count still differs from the
+	layer's count (e.g. edits during the fetch).
+
+	Returns a dict shaped like an Esri JSON FeatureSet plus a "stats" entry.
+	"""
+	start_time = time.time()
+	query_url = f"{layer_url}/query"
+	layer = get_layer_info(layer_url, token, where, session)
+	oid_field = layer["objectIdField"]
+
+	total = _get_json(query_url, {"where": where, "returnCountOnly": "true", "f": "json", "token": current_token(token)},
+		session=session).get("count", 0)
+	if rows is None or cols is None:
+		rows, cols = grid_for_count(total, layer["maxRecordCount"])
+
+	tiles = make_tiles(layer["extent"], rows, cols)
+	print(f"Fetching {len(tiles)} tiles ({rows}x{cols}) with {max_workers} workers...")
+
+	merged = {}
+	fields = None
+	raw_count = 0
+	requests_made = 0
+	bytes_downloaded = 0
+	failed_tiles = []
+
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		futures = {executor.submit(fetch_tile, query_url, token, tile, layer, out_fields, where, session): i for i, tile in enumerate(tiles)}
+		for future in as_completed(futures):
+			i = futures[future]
+			try:
+				features, tile_fields, tile_stats = future.result()
+			except Exception as e:
+				failed_tiles.append(i)
+				print(f".. tile {i}: ERROR {e}")
+				continue
+
+			fields = fields or tile_fields
+			raw_count += len(features)
+			requests_made += tile_stats["requests"]
+			bytes_downloaded += tile_stats["bytes"]
+			for feature in features:
+				merged[feature["attributes"][oid_field]] = feature
+
+	if failed_tiles:
+		raise Exception(f"{len(failed_tiles)} tile(s) failed: {sorted(failed_tiles)}")
+
+	recovered = 0
+	if len(merged) < total:
+		object_ids = _get_json(query_url, {"where": where, "returnIdsOnly": "true", "f": "json", "token": current_token(token)},
+			session=session).get("objectIds") or []
+		missing = sorted(set(object_ids) - set(merged))
+		if missing:
+			print(f".. {len(missing)} features outside every tile (no geometry), fetching by objectid...")
+			for feature in fetch_by_ids(query_url, token, missing, _with_oid(out_fields, oid_field), where, session):
+				merged[feature["attributes"][oid_field]] = feature
+				recovered += 1
+			requests_made += math.ceil(len(missing) / IDS_PER_REQUEST)
+
+	elapsed = time.time() - start_time
+	stats = {
+		"tiles": len(tiles),
+		"workers": max_workers,
+		"requests": requests_made,
+		"bytes": bytes_downloaded,
+		"raw_features": raw_count,
+		"expected_features": total,
+		"features": len(merged),
+		"recovered_features": recovered,
+		"duplicates_removed": raw_count + recovered - len(merged),
+		"seconds": round(elapsed, 2),
+		"features_per_second": round(len(merged) / elapsed, 1) if elapsed > 0 else 0
+	}
+	print(".. {features} features ({duplicates_removed} tile duplicates removed) in {seconds}s, "
+		"{features_per_second} features/s".format(**stats))
+	if len(merged) != total:
+		message = f"fetched {len(merged)} features but the layer count is {total}"
+		if on_mismatch == "raise":
+			raise Exception(message)
+		print(f".. WARNING: {message}")
+
+	return {
+		"objectIdFieldName": oid_field,
+		"geometryType": layer["geometryType"],
+		"spatialReference": layer["spatialReference"],
+		"fields": fields or layer["fields"],
+		"features": [merged[oid] for oid in sorted(merged)],
+		"stats": stats
+	}
+
+
+def save_feature_set(feature_set, out_json):
+	"""Write the merged tiles as one Esri JSON feature set"""
+	with open(out_json, "w") as f:
+		json.dump({k: v for k, v in feature_set.items() if k != "stats"}, f)
+	print(f"Saved {len(feature_set['features'])} features to {out_json}")
+
+
+def benchmark(layer_url, token, worker_counts=(1, 2, 4, 8), rows=None, cols=None):
+	"""Run the same tiled fetch at several concurrency levels and report throughput"""
+	results = []
+	for workers in worker_counts:
+		stats = fetch_tiled(layer_url, token, rows, cols, max_workers=workers)["stats"]
+		results.append(stats)
+
+	base = results[0]["features_per_second"] or 1
+	print("\nworkers  seconds  features/s  speedup")
+	for stats in results:
+		print("{0:>7}  {1:>7}  {2:>10}  {3:>6.2f}x".format(stats["workers"], stats["seconds"], stats["features_per_second"], stats["features_per_second"] / base))
+	return results
+
+
+if __name__ == "__main__":
+	username = os.getenv("SEWALL_USERNAME")
+	password = os.getenv("SEWALL_PASSWORD")
+	if not username or not password:
+		print("ERROR: set SEWALL_USERNAME and SEWALL_PASSWORD")
+		sys.exit(1)
+
+	token = get_token(username, password)
+	layer_url = find_layer_url(sewall_server_url, all_tracts_name, token)
+	print(f"{all_tracts_name}: {layer_url}")
+
+	if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+		benchmark(layer_url, token)
+	else:
+		here = os.path.dirname(os.path.abspath(__file__))
+		save_feature_set(fetch_tiled(layer_url, token), os.path.join(here, "All_Tracts_wm.json"))
@@ -0,0 +1,661 @@
+"""
+Pure-Python monthly tract export (no arcpy)
+
+Same output as ExportToFgdb.py - one shapefile per primary_loc with the tracts whose
+days_since_last_load falls in last month's window - built with requests, GeoPandas,
+pyogrio and shapely so it runs on any Linux worker without ArcGIS Pro.
+
+Pipeline:
+	1. export_window()        same start/end days_since_last_load logic as ExportToFgdb.py
+	2. fetch_all_tracts()     All Tracts via tiled_fetch, decoded with esri_geometry, projected to Albers
+	3. fetch_attributes()     canfor_fields for every mill in the window, one paginated query
+	4. join_tracts()          one hash join on (report_location, report_tract_no) for all mills
+	                          (first match, like AddJoin KEEP_COMMON)
+	5. partition_by_mill()    split the joined rows into one frame per primary_loc
+	6. to_output_schema()     the ExportFeatures field mapping from ExportToFgdb.py
+	7. write_mills()          Shapefiles/<primary_loc>.shp, one worker process per mill,
+	                          plus export_manifest.json
+
+ExportToFgdb.py queries and joins the attributes one mill at a time; here the
+attribute rows of all mills come back in one query and are joined in a single
+vectorized pass. The per-mill shapefiles are written in parallel by a bounded process
+pool; a mill that fails to write is recorded in the manifest and the others still go out.
+
+Incremental mode keeps the Shapefiles folder between runs. Every mill's output rows and
+geometries are hashed and compared with the hashes in the previous export_manifest.json;
+only mills whose hash changed (or whose files are missing) are rewritten and repackaged
+into Packages/<primary_loc>.zip, and mills that dropped out of the window are removed.
+A same-month re-run only pays for the downloads and the hashing.
+
+Instead of shapefiles the export can write one GeoPackage (a layer per mill) or one
+FlatGeobuf (all mills, pri_mill column, packed Hilbert R-tree). Both have a spatial
+index, keep full field names (Shape_Length rather than Shape_Leng) and typed fields,
+and have no .dbf 10-character or 2 GB limits.
+
+With package=True the outputs are also zipped while they are written: each mill's files
+are streamed into Shapefiles_<yyyymmdd>.zip as soon as its worker finishes, split into
+size-bounded parts for email (see delivery.py / emailFilegdb.py).
+
+Credentials come from SEWALL_USERNAME / SEWALL_PASSWORD and CANFOR_USERNAME / CANFOR_PASSWORD.
+
+Usage:
+	python tract_export.py [output folder]                 (default .\\Shapefiles, same as the .cmd)
+	python tract_export.py [output folder] incremental     rewrite/repackage changed mills only
+	python tract_export.py [output folder] gpkg            Tracts_Export.gpkg, one layer per mill
+	python tract_export.py [output folder] fgb             Tracts_Export.fgb
+	python tract_export.py [output folder] package         also write the size-bounded zip parts
+	python tract_export.py [output folder] tracemem        also trace peak Python/NumPy memory per stage
+
+Every run saves its stage profile (wall/CPU time, peak memory and rows of the download,
+decode, projection, join and per-mill write stages) to Profiles/ next to the output
+folder and compares it with the previous runs; see profiler.py.
+"""
+
+import calendar
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import geopandas as gpd
+import pandas as pd
+import shapely
+import requests
+
+import delivery
+import esri_geometry
+import profiler
+import projection
+import tiled_fetch
+
+# report_loc list
+report_locations = ['AXI', 'CAM', 'CON', 'CRO', 'DAR', 'DER', 'EST-L', 'EST-S', 'FUL', 'GRA', 'HER', 'IRO', 'JAC', 'MLT', 'MOB', 'THM', 'URB']
+
+# primary_loc list
+primary_locs = ['Axis', 'Camden', 'Conway', 'Crosby', 'Darlington', 'DeRidder', 'Estill_Large_Mill', 'Estill_Small_Mill', 'Fulton', 'Graham', 'Hermanville', 'Iron_Mountain', 'Jackson', 'Moultrie', 'Mobile', 'Thomasville', 'Urbana']
+
+primary_loc_dict = dict(zip(report_locations, primary_locs))
+
+woodpro_portal = "https://maps.sewall.com/portal2"
+woodpro_gis_server_url = "https://maps.sewall.com/server2/rest/services/canfor/SalesService/FeatureServer"
+canfor_portal = "https://maps.canfor.com/portal"
+canfor_gis_server_url = "https://maps.canfor.com/arcgis/rest/services/CSPWoodpro/WoodPro_CSP_Data/MapServer"
+canfor_view_name = "woodpro.csp_10_woodpro_tract_lookup_vw"
+
+canfor_fields = "latitude_dd,longitude_dd,primary_loc,report_tract_no,begin_month,begin_year,end_month,end_year"
+tract_fields = "report_location,report_tract_no"
+supplier = "Canfor"
+
+ALBERS = projection.ALBERS
+
+# ExportFeatures field mapping from ExportToFgdb.py: output name -> (source field, dtype)
+# Shapefile field names are limited to 10 characters, so Shape_Length is written as Shape_Leng
+# exactly as ArcGIS does.
+field_mapping = [
+	("latitude", "latitude_dd", "float64"),
+	("longitude", "longitude_dd", "float64"),
+	("del_month", "del_month", "Int32"),
+	("del_year", "del_year", "Int32"),
+	("pri_mill", "primary_loc", "str50"),
+	("tract_name", "report_tract_no", "Int32"),
+	("supplier", "supplier", "str16"),
+	("startmonth", "begin_month", "Int32"),
+	("startyear", "begin_year", "Int32"),
+	("endmonth", "end_month", "Int32"),
+	("endyear", "end_year", "Int32"),
+	("Shape_Leng", "Shape_Length", "float64"),
+	("Shape_Area", "Shape_Area", "float64"),
+]
+
+REQUEST_TIMEOUT = 120
+WRITE_WORKERS = min(8, os.cpu_count() or 1)
+MANIFEST_NAME = "export_manifest.json"
+SHAPEFILE_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+# output_format -> (GDAL driver, file extension)
+OUTPUT_FORMATS = {
+	"shapefile": ("ESRI Shapefile", ".shp"),
+	"gpkg": ("GPKG", ".gpkg"),
+	"fgb": ("FlatGeobuf", ".fgb"),
+}
+SINGLE_FILE_NAME = "Tracts_Export"
+# Shapefile names cut to 10 characters, restored in formats without the .dbf limit
+FULL_FIELD_NAMES = {"Shape_Leng": "Shape_Length"}
+HASH_VERSION = 1  # bump when content_hash() changes, so every mill is regenerated once
+
+
+def export_window(now=None):
+	"""
+	days_since_last_load window for last month, relative to today (ExportToFgdb.py logic).
+	e.g. run on June 9: May has 31 days, window is 9..39 (0 == today)
+	"""
+	currentDateTime = (now or datetime.datetime.now()).replace(microsecond=0)
+	cd_dd = currentDateTime.day
+
+	# get tracts for last month
+	yesterday = currentDateTime - datetime.timedelta(days=cd_dd)
+	mm = int(yesterday.strftime("%m"))
+	yyyy = yesterday.year
+	numdays = calendar.monthrange(yyyy, mm)[1]
+
+	return {
+		"start": cd_dd,
+		"end": numdays + cd_dd - 1,
+		"mm": mm,
+		"mmm": yesterday.strftime("%b"),
+		"yyyy": yyyy,
+		"numdays": numdays
+	}
+
+
+def window_where(window, loc=None):
+	"""Where clause for the window, for one location or all report_locations"""
+	where = f"days_since_last_load >= {window['start']} and days_since_last_load <= {window['end']}"
+	if loc:
+		return f"report_location='{loc}' and {where}"
+	return f"{where} and report_location in ({str(report_locations).replace('[','').replace(']','')})"
+
+
+def query_all(query_url, params, token, session=None):
+	"""Run a table query, paging with resultOffset until exceededTransferLimit clears"""
+	http = session or requests
+	params = dict(params, f="json")
+	features = []
+	offset = 0
+	while True:
+		params["resultOffset"] = offset
+		params["token"] = tiled_fetch.current_token(token)
+		response = http.get(query_url, params=params, timeout=REQUEST_TIMEOUT)
+		response.raise_for_status()
+		data = response.json()
+		if "error" in data:
+			raise Exception(data["error"].get("message", "Unknown error"))
+		page = data.get("features", [])
+		features.extend(page)
+		offset += len(page)
+		if not page or not data.get("exceededTransferLimit"):
+			return features
+
+
+def find_table_url(service_url, table_name, token, session=None):
+	"""Locate a table by name in a map service (same lookup as ExportToFgdb.py)"""
+	response = (session or requests).get(service_url, params={"f": "json", "token": tiled_fetch.current_token(token)}, timeout=REQUEST_TIMEOUT)
+	response.raise_for_status()
+	for tbl in response.json().get("tables", []):
+		if tbl.get("name") == table_name:
+			return f"{service_url}/{tbl['id']}"
+	raise Exception(f"Unable to locate view {table_name}")
+
+
+def fetch_all_tracts(token, window, max_workers=tiled_fetch.MAX_WORKERS, prof=None, session=None):
+	"""
+	All Tracts as a GeoDataFrame in Albers, with the del_month/del_year/supplier fields added.
+	prof: profiler.Profiler to record the download / decode / project stages in
+	session: shared session for the tile workers (default: one per worker thread)
+	"""
+	prof = prof or profiler.Profiler("fetch_all_tracts")
+	with prof.stage("download") as stage:
+		layer_url = tiled_fetch.find_layer_url(woodpro_gis_server_url, tiled_fetch.all_tracts_name, token, session)
+		feature_set = tiled_fetch.fetch_tiled(layer_url, token, max_workers=max_workers, out_fields=tract_fields,
+			session=session)
+		stage["rows"] = len(feature_set["features"])
+
+	with prof.stage("decode") as stage:
+		records = [f["attributes"] for f in feature_set["features"]]
+		geometries = esri_geometry.decode_polygons([f.get("geometry") for f in feature_set["features"]])
+		sr = feature_set.get("spatialReference") or {}
+		in_crs = f"EPSG:{sr.get('latestWkid', sr.get('wkid', 3857))}"
+
+		tracts = gpd.GeoDataFrame(pd.DataFrame.from_records(records), geometry=geometries, crs=in_crs)
+		# tracts without geometry are kept and written with null shapes
+		stage["rows"] = len(tracts)
+		stage["null_geometries"] = int(tracts.geometry.isna().sum())
+		if stage["null_geometries"]:
+			print(f"{stage['null_geometries']} tracts have no geometry (written with null shapes)")
+
+	# WGS_1984_(ITRF00)_To_NAD_1983, as in the arcpy Project call
+	print("Project...")
+	with prof.stage("project") as stage:
+		tracts = projection.reproject_geodataframe(tracts, ALBERS)
+		stage["rows"] = len(tracts)
+
+	tracts["del_month"] = window["mm"]
+	tracts["del_year"] = window["yyyy"]
+	tracts["supplier"] = supplier
+	tracts["Shape_Length"] = tracts.geometry.length
+	tracts["Shape_Area"] = tracts.geometry.area
+	return tracts
+
+
+def fetch_attributes(canfor_query_url, token, window, session=None):
+	"""canfor_fields (plus report_location) for every report_location in the window"""
+	fields = ["report_location"] + canfor_fields.split(",")
+	features = query_all(canfor_query_url, {
+		"where": window_where(window),
+		"outFields": ",".join(fields),
+		"returnGeometry": "false"
+	}, token, session)
+	attributes = pd.DataFrame.from_records([f["attributes"] for f in features], columns=fields)
+	# same normalisation ExportToFgdb.py applies to the distinct report_location list
+	attributes["report_location"] = attributes["report_location"].str.replace(" ", "_")
+	return attributes
+
+
+def join_key(values):
+	"""report_tract_no as text, so integer and string/double copies of the same number match"""
+	return values.astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+def join_tracts(tracts, attributes):
+	"""
+	Tract geometries joined to their attribute rows for all mills at once.
+
+	pandas builds a hash table on the (report_location, report_tract_no) key of the
+	attribute rows and probes it with every tract. Only matches are kept and only the
+	first attribute row per key, like AddJoin KEEP_COMMON per location.
+	"""
+	if tracts.empty or attributes.empty:
+		return tracts.iloc[0:0]
+	tracts = tracts.assign(_join_key=join_key(tracts["report_tract_no"]))
+	attributes = attributes.assign(_join_key=join_key(attributes["report_tract_no"]))
+	attributes = attributes.drop_duplicates(["report_location", "_join_key"], keep="first")
+	joined = tracts.merge(attributes, on=["report_location", "_join_key"], how="inner", suffixes=("", "_1"))
+	return joined.drop(columns=["_join_key", "report_tract_no_1"])
+
+
+def partition_by_mill(joined):
+	"""{primary_loc name: joined rows} for the report_locations in primary_loc_dict"""
+	partitions = {}
+	for loc, rows in joined.groupby("report_location", sort=True):
+		if loc not in primary_loc_dict:
+			print(f".. {loc}: no primary_loc mapping, skipped")
+			continue
+		partitions[primary_loc_dict[loc]] = rows
+	return partitions
+
+
+def to_output_schema(joined, full_names=False):
+	"""Apply the ExportToFgdb.py shapefile field mapping (full_names: untruncated names)"""
+	out = gpd.GeoDataFrame(geometry=joined.geometry.values, crs=joined.crs)
+	for name, source, dtype in field_mapping:
+		values = joined[source].values
+		if dtype.startswith("str"):
+			width = int(dtype[3:])
+			out[name] = pd.Series(values, dtype="object").map(lambda v: None if pd.isna(v) else str(v)[:width])
+		elif dtype == "Int32":
+			out[name] = pd.to_numeric(pd.Series(values), errors="coerce").round().astype("Int32")
+		else:
+			out[name] = pd.to_numeric(pd.Series(values), errors="coerce").astype(dtype)
+	out = out[[name for name, _, _ in field_mapping] + ["geometry"]]
+	return out.rename(columns=FULL_FIELD_NAMES) if full_names else out
+
+
+def write_shapefile(gdf, outshp):
+	"""Replace a shapefile (all sidecar files) with gdf"""
+	base = os.path.splitext(outshp)[0]
+	for ext in SHAPEFILE_EXTENSIONS:
+		if os.path.exists(base + ext):
+			os.remove(base + ext)
+	gdf.to_file(outshp, driver="ESRI Shapefile", engine="pyogrio")
+
+
+def content_hash(out):
+	"""
+	sha256 of a mill's output rows (attributes + WKB geometry), independent of row order.
+	Identical exports hash the same across runs and processes.
+	"""
+	attributes = out.drop(columns=[out.geometry.name])
+	row_hashes = pd.util.hash_pandas_object(attributes, index=False).values
+	wkb = shapely.to_wkb(out.geometry.values)
+	rows = sorted(hashlib.sha256(h.tobytes() + (g if g is not None else b"")).digest() for h, g in zip(row_hashes, wkb))
+	digest = hashlib.sha256(",".join(attributes.columns).encode())
+	for row in rows:
+		digest.update(row)
+	return digest.hexdigest()
+
+
+def package_mill(outshp, packages_fldr):
+	"""Zip one mill's shapefile sidecars into Packages/<primary_loc>.zip"""
+	os.makedirs(packages_fldr, exist_ok=True)
+	base = os.path.splitext(outshp)[0]
+	package = os.path.join(packages_fldr, os.path.basename(base) + ".zip")
+	tmp_package = package + ".tmp"
+	with zipfile.ZipFile(tmp_package, "w", zipfile.ZIP_DEFLATED, compresslevel=9) as zf:
+		for ext in SHAPEFILE_EXTENSIONS:
+			if os.path.exists(base + ext):
+				zf.write(base + ext, os.path.basename(base + ext))
+	os.replace(tmp_package, package)
+	return package
+
+
+def _outputs_exist(outshp, packages_fldr):
+	base = os.path.splitext(outshp)[0]
+	if not all(os.path.exists(base + ext) for ext in (".shp", ".shx", ".dbf")):
+		return False
+	return packages_fldr is None or os.path.exists(os.path.join(packages_fldr, os.path.basename(base) + ".zip"))
+
+
+def write_mill(fcname, rows, shapefiles_fldr, packages_fldr=None, previous_hash=None):
+	"""
+	Worker: apply the output schema to one mill's rows and write <primary_loc>.shp
+	(and its package when packages_fldr is given), unless the content hash matches
+	previous_hash and the outputs are still on disk.
+	Never raises - failures are returned so one bad mill can't abort the others.
+	The worker's own schema/hash/shapefile/package stages are returned in result["profile"].
+	"""
+	start_time = time.time()
+	prof = profiler.Profiler("write_mill")
+	outshp = os.path.join(shapefiles_fldr, fcname + ".shp")
+	result = {"mill": fcname, "path": outshp, "features": len(rows), "pid": os.getpid()}
+	try:
+		with prof.stage("schema"):
+			out = to_output_schema(rows)
+		with prof.stage("hash"):
+			result["hash"] = content_hash(out)
+		if previous_hash == result["hash"] and _outputs_exist(outshp, packages_fldr):
+			result["status"] = "unchanged"
+		else:
+			with prof.stage("shapefile") as stage:
+				write_shapefile(out, outshp)
+				stage["rows"] = len(out)
+			if packages_fldr:
+				with prof.stage("package"):
+					result["package"] = package_mill(outshp, packages_fldr)
+			result["status"] = "ok"
+	except Exception as e:
+		result["status"] = "error"
+		result["error"] = f"{type(e).__name__}: {e}"
+	result["seconds"] = round(time.time() - start_time, 3)
+	result["profile"] = profiler.stage_list(prof)
+	return result
+
+
+def write_mills(partitions, shapefiles_fldr, max_workers=WRITE_WORKERS, packages_fldr=None, previous_hashes=None,
+	on_written=None):
+	"""
+	Write every mill's shapefile in a pool of at most max_workers processes.
+	previous_hashes ({primary_loc: hash}) lets unchanged mills skip the write.
+	on_written(result) is called in this process as each mill's files are ready.
+	Returns the per-mill results in primary_loc order.
+	"""
+	previous_hashes = previous_hashes or {}
+	results = {}
+	workers = max(1, min(max_workers, len(partitions)))
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		futures = {
+			executor.submit(write_mill, fcname, rows, shapefiles_fldr, packages_fldr, previous_hashes.get(fcname)): fcname
+			for fcname, rows in partitions.items()
+		}
+		for future in as_completed(futures):
+			fcname = futures[future]
+			try:
+				result = future.result()
+			except Exception as e:
+				# the worker process itself died (e.g. out of memory)
+				result = {"mill": fcname, "path": os.path.join(shapefiles_fldr, fcname + ".shp"),
+					"features": len(partitions[fcname]), "status": "error", "error": f"{type(e).__name__}: {e}"}
+			if result["status"] == "ok":
+				print(".. {0} : {1} ({2}s)".format(fcname, result["features"], result["seconds"]))
+			elif result["status"] == "unchanged":
+				print(".. {0} : {1} unchanged".format(fcname, result["features"]))
+			else:
+				print(".. {0} : FAILED {1}".format(fcname, result["error"]))
+			sys.stdout.flush()
+			results[fcname] = result
+			if on_written and result["status"] != "error":
+				on_written(result)
+	return [results[fcname] for fcname in sorted(results)]
+
+
+def write_single_file(partitions, out_fldr, output_format):
+	"""
+	All mills in one indexed file: a GeoPackage layer per mill, or one FlatGeobuf
+	sorted by pri_mill. Returns per-mill results like write_mills().
+	"""
+	driver, ext = OUTPUT_FORMATS[output_format]
+	path = os.path.join(out_fldr, SINGLE_FILE_NAME + ext)
+	if os.path.exists(path):
+		os.remove(path)
+
+	results = []
+	frames = []
+	for fcname in sorted(partitions):
+		start_time = time.time()
+		prof = profiler.Profiler("write_single_file")
+		result = {"mill": fcname, "path": path, "features": len(partitions[fcname])}
+		try:
+			with prof.stage("schema"):
+				out = to_output_schema(partitions[fcname], full_names=True)
+			with prof.stage("hash"):
+				result["hash"] = content_hash(out)
+			if output_format == "gpkg":
+				with prof.stage(output_format) as stage:
+					out.to_file(path, layer=fcname, driver=driver, engine="pyogrio", layer_options={"SPATIAL_INDEX": "YES"})
+					stage["rows"] = len(out)
+				result["layer"] = fcname
+			else:
+				frames.append(out)
+			result["status"] = "ok"
+		except Exception as e:
+			result["status"] = "error"
+			result["error"] = f"{type(e).__name__}: {e}"
+		result["seconds"] = round(time.time() - start_time, 3)
+		result["profile"] = profiler.stage_list(prof)
+		print(".. {0} : {1}".format(fcname, result["features"] if result["status"] == "ok" else "FAILED " + result["error"]))
+		results.append(result)
+
+	if frames:
+		# FlatGeobuf is a single layer; the R-tree is built over every mill's features
+		try:
+			gdf = gpd.GeoDataFrame(pd.concat(frames, ignore_index=True), crs=frames[0].crs)
+			gdf.to_file(path, driver=driver, engine="pyogrio", layer=SINGLE_FILE_NAME, layer_options={"SPATIAL_INDEX": "YES"})
+		except Exception as e:
+			# none of the mills in the file were written
+			error = f"{type(e).__name__}: {e}"
+			print(".. {0} : FAILED {1}".format(os.path.basename(path), error))
+			for result in results:
+				if result["status"] == "ok":
+					result["status"] = "error"
+					result["error"] = error
+			if os.path.exists(path):
+				os.remove(path)
+	return results
+
+
+def package_outputs(writer, path, arc_folder):
+	"""Stream one output (all its sidecar files) into the zip writer"""
+	base, ext = os.path.splitext(path)
+	paths = [base + e for e in SHAPEFILE_EXTENSIONS if os.path.exists(base + e)] if ext == ".shp" else [path]
+	writer.add_group(paths, [os.path.join(arc_folder, os.path.basename(p)) for p in paths])
+
+
+def read_manifest(shapefiles_fldr):
+	"""Previous export_manifest.json, or None"""
+	try:
+		with open(os.path.join(shapefiles_fldr, MANIFEST_NAME)) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return None
+
+
+def previous_hashes(manifest):
+	"""{primary_loc: content hash} of the mills written successfully by a previous export"""
+	if not manifest or manifest.get("hash_version") != HASH_VERSION or manifest.get("output_format", "shapefile") != "shapefile":
+		return {}
+	return {r["mill"]: r["hash"] for r in manifest.get("mills", []) if r.get("hash") and r.get("status") in ("ok", "unchanged")}
+
+
+def remove_mill(fcname, shapefiles_fldr, packages_fldr=None):
+	"""Delete the outputs of a mill that has no tracts in this export"""
+	base = os.path.join(shapefiles_fldr, fcname)
+	paths = [base + ext for ext in SHAPEFILE_EXTENSIONS]
+	if packages_fldr:
+		paths.append(os.path.join(packages_fldr, fcname + ".zip"))
+	for path in paths:
+		if os.path.exists(path):
+			os.remove(path)
+
+
+def write_manifest(shapefiles_fldr, window, results, seconds, removed=(), output_format="shapefile", packages=None):
+	"""Aggregate manifest of the export next to the shapefiles"""
+	manifest = {
+		"hash_version": HASH_VERSION,
+		"output_format": output_format,
+		"generated_at": datetime.datetime.now().replace(microsecond=0).isoformat(),
+		"supplier": supplier,
+		"del_month": window["mm"],
+		"del_year": window["yyyy"],
+		"days_since_last_load": [window["start"], window["end"]],
+		"seconds": round(seconds, 1),
+		"mills": results,
+		"features": sum(r["features"] for r in results if r["status"] != "error"),
+		"changed": [r["mill"] for r in results if r["status"] == "ok"],
+		"unchanged": [r["mill"] for r in results if r["status"] == "unchanged"],
+		"removed": sorted(removed),
+		"failed": [r["mill"] for r in results if r["status"] == "error"]
+	}
+	if packages is not None:
+		manifest["packages"] = packages
+	with open(os.path.join(shapefiles_fldr, MANIFEST_NAME), "w") as f:
+		json.dump(manifest, f, indent=2)
+	return manifest
+
+
+def login():
+	"""Tokens for both portals"""
+	woodpro_token = tiled_fetch.get_token(os.environ["SEWALL_USERNAME"], os.environ["SEWALL_PASSWORD"], woodpro_portal)
+	canfor_token = tiled_fetch.get_token(os.environ["CANFOR_USERNAME"], os.environ["CANFOR_PASSWORD"], canfor_portal)
+	return woodpro_token, canfor_token
+
+
+def add_write_profile(prof, results):
+	"""Move each mill's worker stages (result["profile"]) into the run's profile, under the write stage"""
+	for result in results:
+		for stage in result.pop("profile", []):
+			values = {k: v for k, v in stage.items() if k != "name"}
+			prof.add("{0}:{1}".format(stage["name"], result["mill"]), parent="write", **values)
+
+
+def run_export(shapefiles_fldr, now=None, max_workers=WRITE_WORKERS, incremental=False, packages_fldr=None,
+	output_format="shapefile", package=False, max_part_bytes=delivery.DEFAULT_PART_BYTES, profiles_fldr=None,
+	trace_memory=False, tokens=None, session=None):
+	"""
+	Monthly export. Returns the manifest.
+	incremental: only rewrite and repackage mills whose content hash changed since the
+	previous manifest in shapefiles_fldr (packages_fldr defaults to ../Packages).
+	output_format: "shapefile" (one per mill), "gpkg" or "fgb" (one file, see OUTPUT_FORMATS).
+	package: also stream the outputs into <shapefiles_fldr>_<yyyymmdd>.zip (parts of at most
+	max_part_bytes), as the .cmd does with 7-Zip after the export.
+	profiles_fldr: where the stage profile of the run is saved and compared with earlier
+	runs (default ../Profiles, next to Shapefiles so the .cmd's cleanup doesn't remove it).
+	trace_memory: also record peak Python/NumPy allocations per stage (slower).
+	tokens: (woodpro_token, canfor_token) from a caller that already logged in (export_runner),
+	either strings or providers called for every request so a renewed token reaches a running export;
+	session: a shared requests.Session for all REST calls (default: a session per thread).
+	"""
+	if output_format not in OUTPUT_FORMATS:
+		raise ValueError(f"output_format must be one of {', '.join(OUTPUT_FORMATS)}")
+	if incremental and output_format != "shapefile":
+		print(f"Incremental mode applies to shapefiles only - {output_format} is rewritten in full")
+		incremental = False
+
+	print("===============================================")
+	start_time = time.time()
+	profiles_fldr = profiles_fldr or os.path.join(os.path.dirname(os.path.abspath(shapefiles_fldr)), "Profiles")
+	prof = profiler.Profiler("tract_export", trace_memory, {"output_format": output_format, "incremental": incremental})
+	window = export_window(now)
+	prof.meta["month"] = "{0}-{1:02d}".format(window["yyyy"], int(window["mm"]))
+	print("{0} {1} {2} {3} {4} days".format(window["start"], window["end"], window["mmm"], window["yyyy"], window["numdays"]))
+	sys.stdout.flush()
+
+	os.makedirs(shapefiles_fldr, exist_ok=True)
+	with prof.stage("login"):
+		woodpro_token, canfor_token = tokens or login()
+		canfor_query_url = find_table_url(canfor_gis_server_url, canfor_view_name, canfor_token, session) + "/query"
+
+	print("Get All Tracts...")
+	tracts = fetch_all_tracts(woodpro_token, window, prof=prof, session=session)
+
+	print("Get tract attributes for all mills")
+	with prof.stage("attributes") as stage:
+		attributes = fetch_attributes(canfor_query_url, canfor_token, window, session)
+		stage["rows"] = len(attributes)
+	print(f".. {len(attributes)} rows, {attributes['report_location'].nunique()} report_locations")
+
+	print("Join...")
+	with prof.stage("join") as stage:
+		joined = join_tracts(tracts, attributes)
+		stage["rows"] = len(joined)
+	with prof.stage("partition") as stage:
+		partitions = partition_by_mill(joined)
+		stage["rows"] = len(partitions)
+
+	hashes = {}
+	removed = []
+	if incremental:
+		packages_fldr = packages_fldr or os.path.join(os.path.dirname(os.path.abspath(shapefiles_fldr)), "Packages")
+		previous = read_manifest(shapefiles_fldr)
+		hashes = previous_hashes(previous)
+		print(f"Incremental: {len(hashes)} mill hashes from the previous export")
+		for r in (previous or {}).get("mills", []):
+			if r["mill"] not in partitions:
+				remove_mill(r["mill"], shapefiles_fldr, packages_fldr)
+				removed.append(r["mill"])
+
+	writer = None
+	on_written = None
+	if package:
+		package_base = "{0}_{1}".format(os.path.abspath(shapefiles_fldr).rstrip("\\/"), datetime.date.today().strftime("%Y%m%d"))
+		arc_folder = os.path.basename(package_base)
+		writer = delivery.StreamingZipWriter(package_base, max_part_bytes)
+		on_written = lambda result: package_outputs(writer, result["path"], arc_folder)
+
+	write_start = time.time()
+	with prof.stage("write") as stage:
+		if output_format == "shapefile":
+			print(f"Write {len(partitions)} shapefiles...")
+			results = write_mills(partitions, shapefiles_fldr, max_workers, packages_fldr, hashes, on_written)
+		else:
+			print(f"Write {len(partitions)} mills to {SINGLE_FILE_NAME}{OUTPUT_FORMATS[output_format][1]}...")
+			results = write_single_file(partitions, shapefiles_fldr, output_format)
+			written = [r for r in results if r["status"] == "ok"]
+			if on_written and written:
+				on_written(written[0])
+		stage["rows"] = sum(r["features"] for r in results if r["status"] == "ok")
+	add_write_profile(prof, results)
+	print(f".. written in {time.time() - write_start:.1f}s")
+
+	packages = None
+	if writer:
+		with prof.stage("package"):
+			packages = writer.close()
+		print("Packaged: {0}".format(", ".join(os.path.basename(p) for p in packages)))
+
+	with prof.stage("manifest"):
+		manifest = write_manifest(shapefiles_fldr, window, results, time.time() - start_time, removed, output_format, packages)
+
+	earlier_runs = profiler.previous_reports(profiles_fldr, prof.name)
+	print("Profile: {0}".format(prof.save(profiles_fldr)))
+	profiler.print_report(prof.report())
+	if earlier_runs:
+		print(f"\nCompared with the median of the last {len(earlier_runs)} run(s):")
+		profiler.print_comparison(profiler.compare(prof.report(), earlier_runs))
+	if incremental:
+		print(f"changed: {len(manifest['changed'])}, unchanged: {len(manifest['unchanged'])}, removed: {len(removed)}")
+	if manifest["failed"]:
+		print(f"FAILED: {', '.join(manifest['failed'])}")
+	print(f"Done in {manifest['seconds']}s")
+	return manifest
+
+
+if __name__ == "__main__":
+	options = [a for a in sys.argv[1:] if a in ("incremental", "package", "tracemem") or a in OUTPUT_FORMATS]
+	args = [a for a in sys.argv[1:] if a not in options]
+	out_dir = args[0] if args else os.path.join(os.path.abspath("."), "Shapefiles")
+	output_format = next((a for a in options if a in OUTPUT_FORMATS), "shapefile")
+	manifest = run_export(out_dir, incremental="incremental" in options, output_format=output_format,
+		package="package" in options, trace_memory="tracemem" in options)
+	sys.exit(1 if manifest["failed"] else 0)
@@ -0,0 +1,180 @@
+"""
+Month Date Filters
+==================
+
+Server-side month filtering for the harvest reports. The Canfor WoodPro view has no
+single "harvest_date" field; depending on the view it carries some of:
+
+- days_since_last_load            days between the tract's last load and today
+- begin_month/begin_year,
+  end_month/end_year              the harvest's start and end month
+- PurchDate (esriFieldTypeDate)   purchase date
+
+This module detects which of them exist from the cached layer schema (layer_schema.py,
+no probe query), builds the where clause that selects one calendar month with each of
+them, validates the clauses with returnCountOnly queries and returns the first one
+the server accepts, so a monthly report transfers only that month's rows.
+
+Strategies, in order of preference (MONTH_STRATEGIES):
+- days_since_last_load   last load in the month - the window the tract export uses
+                         (run on June 9, May is days_since_last_load 9..39)
+- begin_end              harvest active in the month: began on/before it and ended
+                         on/after it (or has no end yet)
+- date                   PurchDate (or another DATE_FIELDS field) within the month
+
+Usage:
+------
+    from date_filter import month_filter
+
+    month = month_filter(url, 2024, 5, session=session, token=token)
+    params["where"] = f"report_location='{mill}'{month['suffix']}"
+    print(month["description"], month["count"])
+
+Requirements:
+------------
+- Python 3.6+
+- requests library
+"""
+
+import calendar
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from layer_schema import LayerSchema, get_layer_schema
+
+MONTH_STRATEGIES = ("days_since_last_load", "begin_end", "date")
+
+DAYS_SINCE_FIELD = "days_since_last_load"
+BEGIN_END_FIELDS = ("begin_month", "begin_year", "end_month", "end_year")
+DATE_FIELDS = ("PurchDate",)  # date-typed fields usable as the month's date, in order of preference
+DATE_FIELD_TYPES = ("esriFieldTypeDate", "esriFieldTypeDateOnly", "esriFieldTypeTimestampOffset")
+
+
+def detect_date_fields(schema: LayerSchema) -> Dict:
+    """
+    Date-like fields of a layer, in the layer's casing:
+
+        {"days_since_last_load": name or None,
+         "begin_end": (begin_month, begin_year, end_month, end_year) or None,
+         "date": [all date-typed fields]}
+    """
+    begin_end = tuple(schema.resolve(name) for name in BEGIN_END_FIELDS)
+    return {
+        "days_since_last_load": schema.resolve(DAYS_SINCE_FIELD),
+        "begin_end": begin_end if all(begin_end) else None,
+        "date": schema.fields_of_type(*DATE_FIELD_TYPES),
+    }
+
+
+def month_bounds(year: int, month: int) -> Tuple[date, date]:
+    """First and last day of a calendar month"""
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def month_days_window(year: int, month: int, today: Optional[date] = None) -> Tuple[int, int]:
+    """(min, max) days_since_last_load of loads in a calendar month, as of today"""
+    today = today or date.today()
+    first_day, last_day = month_bounds(year, month)
+    return (today - last_day).days, (today - first_day).days
+
+
+def days_since_where(field: str, year: int, month: int, today: Optional[date] = None) -> str:
+    """Last load within the month"""
+    low, high = month_days_window(year, month, today)
+    return f"{field} >= {low} AND {field} <= {high}"
+
+
+def begin_end_where(fields: Tuple[str, str, str, str], year: int, month: int) -> str:
+    """Harvest active in the month: began on/before it, ended on/after it or not ended"""
+    begin_month, begin_year, end_month, end_year = fields
+    began = f"({begin_year} < {year} OR ({begin_year} = {year} AND {begin_month} <= {month}))"
+    not_ended = f"({end_year} IS NULL OR {end_year} > {year} OR ({end_year} = {year} AND {end_month} >= {month}))"
+    return f"{began} AND {not_ended}"
+
+
+def date_field_where(field: str, year: int, month: int) -> str:
+    """Date field within the month (half-open, so times on the last day are included)"""
+    first_day, last_day = month_bounds(year, month)
+    next_month = last_day + timedelta(days=1)
+    return f"{field} >= DATE '{first_day:%Y-%m-%d}' AND {field} < DATE '{next_month:%Y-%m-%d}'"
+
+
+def candidate_filters(detected: Dict, year: int, month: int, today: Optional[date] = None,
+                      strategies: Iterable[str] = MONTH_STRATEGIES) -> List[Dict]:
+    """Month where clauses for every strategy the detected fields allow, in strategy order"""
+    candidates = []
+    for strategy in strategies:
+        if strategy == "days_since_last_load" and detected["days_since_last_load"]:
+            field = detected["days_since_last_load"]
+            low, high = month_days_window(year, month, today)
+            candidates.append({"strategy": strategy, "fields": [field],
+                               "where": days_since_where(field, year, month, today),
+                               "description": f"last load in month ({field} {low}..{high})"})
+        elif strategy == "begin_end" and detected["begin_end"]:
+            candidates.append({"strategy": strategy, "fields": list(detected["begin_end"]),
+                               "where": begin_end_where(detected["begin_end"], year, month),
+                               "description": "harvest active in month (begin/end month and year)"})
+        elif strategy == "date":
+            by_name = {name.lower(): name for name in detected["date"]}
+            for preferred in DATE_FIELDS:
+                field = by_name.get(preferred.lower())
+                if field:
+                    candidates.append({"strategy": strategy, "fields": [field],
+                                       "where": date_field_where(field, year, month),
+                                       "description": f"{field} in month"})
+    return candidates
+
+
+def count_where(url: str, where: str, session=None, token: Optional[str] = None, timeout: int = 30) -> int:
+    """
+    Row count for a where clause (returnCountOnly).
+
+    Raises:
+        ValueError: if the server rejects the where clause
+    """
+    http = session or requests
+    params = {"where": where, "returnCountOnly": "true", "f": "json"}
+    if token:
+        params["token"] = token
+    response = http.get(url, params=params, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data or "count" not in data:
+        message = data.get("error", {}).get("message", "no count returned")
+        details = "; ".join(data.get("error", {}).get("details", []) or [])
+        raise ValueError(f"{message}{f' ({details})' if details else ''}")
+    return int(data["count"])
+
+
+def month_filter(url: str, year: int, month: int, session=None, token: Optional[str] = None,
+                 today: Optional[date] = None, strategies: Iterable[str] = MONTH_STRATEGIES,
+                 base_where: str = "1=1") -> Dict:
+    """
+    The first month filter (in strategy order) that the server accepts.
+
+    Returns {"strategy", "fields", "where", "suffix" (" AND (where)", to append to an
+    existing clause), "description", "count" (rows in the month), "total" (rows overall)}.
+
+    Raises:
+        ValueError: if the layer has no usable date field or every candidate is rejected
+    """
+    schema = get_layer_schema(url, session, token)
+    detected = detect_date_fields(schema)
+    candidates = candidate_filters(detected, year, month, today, strategies)
+    if not candidates:
+        raise ValueError(f"No date fields for month filtering in {schema.layer_url} "
+                         f"(looked for {DAYS_SINCE_FIELD}, {', '.join(BEGIN_END_FIELDS)}, {', '.join(DATE_FIELDS)})")
+
+    total = count_where(url, base_where, session, token)
+    errors = []
+    for candidate in candidates:
+        try:
+            count = count_where(url, f"({base_where}) AND ({candidate['where']})", session, token)
+        except (ValueError, requests.RequestException) as e:
+            errors.append(f"{candidate['strategy']}: {e}")
+            continue
+        return dict(candidate, suffix=f" AND ({candidate['where']})", count=count, total=total)
+
+    raise ValueError(f"Every month filter was rejected: {' | '.join(errors)}")
@@ -0,0 +1,335 @@
+"""
+Concurrent Export Runner
+========================
+
+Runs several supplier / portal export jobs at once, so a monthly multi-supplier
+delivery takes about as long as its slowest job instead of the sum of all of them.
+ExportToFgdb.py / tract_export.py log into the Sewall and the Canfor portal one after
+the other and the report scripts log in again on their own; here:
+
+- every portal the selected jobs need is logged into once, all portals in parallel;
+  the tokens are cached per portal and renewed shortly before they expire, and every
+  job gets them from the same PortalTokens - as a provider called per request, so a
+  job running past the expiry picks up the renewed token
+- all jobs share one requests.Session, i.e. one pooled keep-alive connection set per
+  host, instead of each job (and each tile worker) opening its own
+- a per-host limit (MAX_PER_HOST, HOST_LIMITS) caps the requests in flight against
+  each server across all jobs, so running jobs side by side doesn't multiply the load
+  on maps.sewall.com / maps.canfor.com; the time requests waited for a slot is
+  reported per host
+
+Jobs are registered in JOBS: the portals they need and a function taking a JobContext
+(tokens, shared session, options). Output of concurrently running jobs is interleaved;
+the runner prints a per-job summary at the end. The stage profiles of tract_export
+still measure wall time per stage correctly, but their CPU times include the other
+jobs' threads.
+
+Usage:
+------
+    python export_runner.py                                   all jobs
+    python export_runner.py canfor_tract_export canfor_harvest_report
+    python export_runner.py --per-host 6 [jobs]
+
+    from export_runner import run_jobs, print_run_report
+    print_run_report(run_jobs(["canfor_tract_export", "canfor_harvest_report"]))
+
+Credentials come from SEWALL_USERNAME / SEWALL_PASSWORD and CANFOR_USERNAME / CANFOR_PASSWORD.
+
+Requirements:
+------------
+- Python 3.7+
+- requests (plus the requirements of the jobs: geopandas/pyogrio for the tract export,
+  pandas for the harvest report)
+"""
+
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# tract_export / tiled_fetch live in the TractExport folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "TractExport"))
+import tiled_fetch  # noqa: E402
+
+MAX_PER_HOST = 4                   # requests in flight per host, across all jobs
+HOST_LIMITS = {}                   # per-host overrides, e.g. {"maps.canfor.com": 2}
+TOKEN_MARGIN_SECONDS = 5 * 60      # renew a token this long before it expires
+DEFAULT_TOKEN_SECONDS = 60 * 60    # when the portal doesn't report an expiry
+
+PORTALS = {
+    "sewall": {"url": "https://maps.sewall.com/portal2",
+               "username_env": "SEWALL_USERNAME", "password_env": "SEWALL_PASSWORD"},
+    "canfor": {"url": "https://maps.canfor.com/portal",
+               "username_env": "CANFOR_USERNAME", "password_env": "CANFOR_PASSWORD"},
+}
+
+
+class HostLimiter:
+    """A semaphore per host, with request counts and the time spent waiting for a slot"""
+
+    def __init__(self, limit: int = MAX_PER_HOST, limits: Optional[Dict[str, int]] = None):
+        self.limit = limit
+        self.limits = dict(HOST_LIMITS, **(limits or {}))
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.stats = {}
+
+    def _slot(self, host: str):
+        with self.lock:
+            if host not in self.slots:
+                self.slots[host] = threading.BoundedSemaphore(self.limits.get(host, self.limit))
+                self.stats[host] = {"limit": self.limits.get(host, self.limit), "requests": 0, "in_flight": 0,
+                                    "max_in_flight": 0, "wait_seconds": 0.0}
+            return self.slots[host], self.stats[host]
+
+    @contextmanager
+    def slot(self, host: str):
+        """Hold one of host's request slots (blocks while they are all taken)"""
+        semaphore, stats = self._slot(host)
+        start = time.perf_counter()
+        semaphore.acquire()
+        with self.lock:
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            stats["wait_seconds"] += time.perf_counter() - start
+        try:
+            yield
+        finally:
+            with self.lock:
+                stats["in_flight"] -= 1
+            semaphore.release()
+
+    def report(self) -> Dict[str, Dict]:
+        with self.lock:
+            return {host: dict(stats, wait_seconds=round(stats["wait_seconds"], 2)) for host, stats in self.stats.items()}
+
+
+class HostLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that sends (and, unless streaming, downloads) each request inside a host slot"""
+
+    def __init__(self, limiter: HostLimiter, **kwargs):
+        self.limiter = limiter
+        kwargs.setdefault("pool_maxsize", max([limiter.limit] + list(limiter.limits.values())))
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        with self.limiter.slot(urlparse(request.url).hostname or ""):
+            response = super().send(request, stream=stream, **kwargs)
+            if not stream:
+                response.content  # read the body while the slot is held
+            return response
+
+
+def shared_session(limiter: HostLimiter) -> requests.Session:
+    """One session for every job: pooled keep-alive connections per host, per-host limited"""
+    session = requests.Session()
+    adapter = HostLimitedAdapter(limiter, pool_connections=len(PORTALS) * 2)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class PortalTokens:
+    """Cached portal tokens, renewed TOKEN_MARGIN_SECONDS before they expire; one login at a time per portal"""
+
+    def __init__(self, portals: Dict[str, Dict] = PORTALS, session: Optional[requests.Session] = None,
+                 authenticate: Callable = tiled_fetch.generate_token):
+        self.portals = portals
+        self.session = session
+        self.authenticate = authenticate
+        self.lock = threading.Lock()
+        self.locks = {name: threading.Lock() for name in portals}
+        self.tokens = {}
+        self.logins = {name: 0 for name in portals}
+
+    def _credentials(self, name: str):
+        portal = self.portals[name]
+        username, password = os.getenv(portal["username_env"]), os.getenv(portal["password_env"])
+        if not username or not password:
+            raise ValueError(f"Set {portal['username_env']} and {portal['password_env']} for the {name} portal")
+        return username, password
+
+    def token(self, name: str) -> str:
+        """The portal's token, logging in when there is none or it is about to expire"""
+        with self.locks[name]:
+            cached = self.tokens.get(name)
+            if cached and time.time() < cached["expires"] - TOKEN_MARGIN_SECONDS:
+                return cached["token"]
+            username, password = self._credentials(name)
+            token_data = self.authenticate(username, password, self.portals[name]["url"], session=self.session)
+            expires = token_data.get("expires")
+            cached = {"token": token_data["token"],
+                      "expires": expires / 1000.0 if expires else time.time() + DEFAULT_TOKEN_SECONDS}
+            with self.lock:
+                self.tokens[name] = cached
+                self.logins[name] += 1
+            return cached["token"]
+
+    def login_all(self, names: Iterable[str]) -> Dict[str, Dict]:
+        """Log into every named portal in parallel: {name: {"status", "seconds", "error"}}"""
+        names = list(dict.fromkeys(names))
+
+        def login(name):
+            start = time.perf_counter()
+            try:
+                self.token(name)
+                return {"status": "ok", "seconds": round(time.perf_counter() - start, 2)}
+            except Exception as e:
+                return {"status": "error", "seconds": round(time.perf_counter() - start, 2), "error": str(e)}
+
+        if not names:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            return dict(zip(names, executor.map(login, names)))
+
+
+class JobContext:
+    """What a job gets from the runner: the shared tokens and session, and its options"""
+
+    def __init__(self, name: str, tokens: PortalTokens, session: requests.Session, options: Optional[Dict] = None):
+        self.name = name
+        self.tokens = tokens
+        self.session = session
+        self.options = dict(options or {})
+
+    def token(self, portal: str) -> str:
+        return self.tokens.token(portal)
+
+    def token_provider(self, portal: str) -> Callable[[], str]:
+        """For long-running jobs: called per request, so the job picks up renewed tokens"""
+        return lambda: self.tokens.token(portal)
+
+
+def run_canfor_tract_export(context: JobContext) -> Dict:
+    """tract_export.run_export with the runner's Sewall/Canfor tokens and session"""
+    import tract_export
+    out_dir = context.options.get("shapefiles_fldr") or os.path.join(os.path.abspath("."), "Shapefiles")
+    manifest = tract_export.run_export(
+        out_dir, output_format=context.options.get("output_format", "shapefile"),
+        incremental=context.options.get("incremental", False), package=context.options.get("package", False),
+        tokens=(context.token_provider("sewall"), context.token_provider("canfor")), session=context.session)
+    if manifest["failed"]:
+        raise RuntimeError(f"Mills failed: {', '.join(manifest['failed'])}")
+    return {"output": out_dir, "mills": len(manifest["mills"]), "seconds": manifest["seconds"]}
+
+
+def run_canfor_harvest_report(context: JobContext) -> Dict:
+    """Report_authDebug.generate_harvest_batch for last month, with the runner's Canfor token and session"""
+    import tract_export
+    from Report_authDebug import generate_harvest_batch
+    window = tract_export.export_window()
+    month = context.options.get("month") or "{0}-{1}".format(window["yyyy"], window["mm"])
+    batch = generate_harvest_batch(month, month, output_format=context.options.get("report_format", "csv"),
+                                   token=context.token_provider("canfor"), session=context.session)
+    if batch is None:
+        raise RuntimeError("Harvest report failed")
+    return {"month": month, "mills": sum(1 for r in batch[month] if r["status"] == "success")}
+
+
+JOBS = {
+    "canfor_tract_export": {"portals": ("sewall", "canfor"), "run": run_canfor_tract_export},
+    "canfor_harvest_report": {"portals": ("canfor",), "run": run_canfor_harvest_report},
+}
+
+
+def run_jobs(names: Optional[List[str]] = None, jobs: Dict[str, Dict] = JOBS, per_host: int = MAX_PER_HOST,
+             host_limits: Optional[Dict[str, int]] = None, max_jobs: Optional[int] = None,
+             options: Optional[Dict] = None, portals: Dict[str, Dict] = PORTALS,
+             authenticate: Callable = tiled_fetch.generate_token) -> Dict:
+    """
+    Log into the portals the jobs need (in parallel), then run the jobs concurrently
+    with shared tokens and session. A job whose portal login failed is not started; a
+    job that raises is reported as failed and doesn't stop the others. options are
+    passed to every job (JobContext.options).
+
+    Returns {"jobs": {name: {"status", "seconds", "result" | "error"}}, "logins",
+    "hosts" (per-host request stats), "seconds", "job_seconds"}.
+    """
+    names = list(names or jobs)
+    unknown = [n for n in names if n not in jobs]
+    if unknown:
+        raise ValueError(f"Unknown job(s): {', '.join(unknown)} (known: {', '.join(jobs)})")
+
+    start = time.perf_counter()
+    limiter = HostLimiter(per_host, host_limits)
+    session = shared_session(limiter)
+    tokens = PortalTokens(portals, session, authenticate)
+
+    needed = [p for name in names for p in jobs[name]["portals"]]
+    print(f"Logging into {len(set(needed))} portal(s): {', '.join(dict.fromkeys(needed))}")
+    logins = tokens.login_all(needed)
+    for portal, login in logins.items():
+        print(f".. {portal}: {login['status']} ({login['seconds']}s){' ' + login['error'] if 'error' in login else ''}")
+
+    results = {}
+    runnable = []
+    for name in names:
+        failed = [p for p in jobs[name]["portals"] if logins[p]["status"] != "ok"]
+        if failed:
+            results[name] = {"status": "skipped", "seconds": 0.0, "error": f"login failed: {', '.join(failed)}"}
+        else:
+            runnable.append(name)
+
+    def run(name):
+        job_start = time.perf_counter()
+        print(f"[{name}] started")
+        try:
+            result = jobs[name]["run"](JobContext(name, tokens, session, options))
+            outcome = {"status": "ok", "result": result}
+        except Exception as e:
+            traceback.print_exc()
+            outcome = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        outcome["seconds"] = round(time.perf_counter() - job_start, 2)
+        print(f"[{name}] {outcome['status']} in {outcome['seconds']}s")
+        return name, outcome
+
+    if runnable:
+        with ThreadPoolExecutor(max_workers=max_jobs or len(runnable)) as executor:
+            for name, outcome in executor.map(run, runnable):
+                results[name] = outcome
+
+    session.close()
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "jobs": {name: results[name] for name in names},
+        "logins": logins,
+        "hosts": limiter.report(),
+        "seconds": round(time.perf_counter() - start, 2),
+        "job_seconds": round(sum(r["seconds"] for r in results.values()), 2),
+    }
+
+
+def print_run_report(report: Dict) -> None:
+    """Per-job status and time, per-host request stats, and the wall time against the serial sum"""
+    print(f"\n{'Job':<28} {'Status':<8} {'Seconds':>9}  Result")
+    print("-" * 80)
+    for name, job in report["jobs"].items():
+        detail = job.get("error") or ", ".join(f"{k}={v}" for k, v in (job.get("result") or {}).items())
+        print(f"{name:<28} {job['status']:<8} {job['seconds']:>9.1f}  {detail}")
+    print(f"\n{'Host':<28} {'Limit':>6} {'Requests':>9} {'Max busy':>9} {'Waited s':>9}")
+    print("-" * 80)
+    for host, stats in report["hosts"].items():
+        print(f"{host:<28} {stats['limit']:>6} {stats['requests']:>9} {stats['max_in_flight']:>9} {stats['wait_seconds']:>9.1f}")
+    print(f"\nDone in {report['seconds']}s (jobs one after the other: {report['job_seconds']}s)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    per_host = MAX_PER_HOST
+    if "--per-host" in args:
+        i = args.index("--per-host")
+        per_host = int(args[i + 1])
+        del args[i:i + 2]
+    run_report = run_jobs(args or None, per_host=per_host)
+    print_run_report(run_report)
+    sys.exit(0 if all(j["status"] == "ok" for j in run_report["jobs"].values()) else 1)
@@ -0,0 +1,255 @@
+"""
+Streaming Geometry Export
+=========================
+
+Production geometry export for the harvest report: every mill's tract geometries,
+fully paginated, written straight into one shapefile (or GeoPackage).
+
+- Mills are fetched concurrently (PAGE_WORKERS threads); each worker pages through
+  its mill with resultOffset/resultRecordCount, ordered by objectid, until the
+  server stops reporting exceededTransferLimit.
+- Workers decode each page to a GeoDataFrame and hand it to the writer through a
+  bounded queue (QUEUE_PAGES). The writer appends the page to the output file and
+  drops it, so memory stays at a few pages no matter how many features the export
+  has; when the writer falls behind the workers block instead of piling up pages.
+- Field types come from the layer's field list, so every appended page has the same
+  schema (nullable integers stay integers, dates become dates).
+- A progress line is printed every PROGRESS_SECONDS and a per-mill throughput report
+  at the end.
+
+Usage:
+------
+    from geometry_export import stream_export, print_export_report
+
+    report = stream_export(query_url, mills, "harvest_tracts.shp", session=session, token=token)
+    print_export_report(report)
+
+Requirements:
+------------
+- Python 3.6+
+- requests, pandas, geopandas, pyogrio, shapely 2
+"""
+
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import geopandas as gpd
+import pandas as pd
+import pyogrio
+
+from geometry_fetch import fetch_geometry_page, geometry_params, layer_crs, profile_crs
+from layer_schema import get_layer_schema
+
+# esri_geometry.py (TractExport folder) holds the vectorized Esri JSON polygon decoder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "TractExport"))
+from esri_geometry import decode_polygons  # noqa: E402
+
+PAGE_WORKERS = 4
+QUEUE_PAGES = 8          # decoded pages buffered between the fetch workers and the writer
+PAGE_SIZE = 1000         # used when the layer doesn't report maxRecordCount
+PROGRESS_SECONDS = 5
+REQUEST_TIMEOUT = 120
+
+# esriFieldType -> pandas dtype for the output columns
+ESRI_DTYPES = {
+    "esriFieldTypeOID": "Int64",
+    "esriFieldTypeInteger": "Int64",
+    "esriFieldTypeSmallInteger": "Int32",
+    "esriFieldTypeDouble": "float64",
+    "esriFieldTypeSingle": "float64",
+    "esriFieldTypeString": "object",
+    "esriFieldTypeGUID": "object",
+    "esriFieldTypeGlobalID": "object",
+    "esriFieldTypeDate": "datetime64[ms]",
+}
+
+_DONE = object()
+
+
+class ExportProgress:
+    """Thread-safe per-mill page/feature/byte counters"""
+
+    def __init__(self, mills: List[str]):
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.mills = {m: {"pages": 0, "features": 0, "bytes": 0, "status": "pending", "seconds": 0.0}
+                      for m in mills}
+        self.written = 0
+
+    def page(self, mill: str, features: int, num_bytes: int) -> None:
+        with self.lock:
+            stats = self.mills[mill]
+            stats["pages"] += 1
+            stats["features"] += features
+            stats["bytes"] += num_bytes
+            stats["status"] = "running"
+
+    def finish(self, mill: str, error: Optional[Exception] = None) -> None:
+        with self.lock:
+            stats = self.mills[mill]
+            stats["status"] = "error" if error else "done"
+            stats["seconds"] = round(time.time() - self.start, 1)
+            if error:
+                stats["error"] = str(error)
+
+    def line(self) -> str:
+        with self.lock:
+            elapsed = max(time.time() - self.start, 1e-9)
+            fetched = sum(s["features"] for s in self.mills.values())
+            mb = sum(s["bytes"] for s in self.mills.values()) / 1e6
+            done = sum(1 for s in self.mills.values() if s["status"] in ("done", "error"))
+            return (f"  {fetched:>9,} fetched | {self.written:>9,} written | {done}/{len(self.mills)} mills | "
+                    f"{fetched / elapsed:>8,.0f} features/s | {mb / elapsed:>6.2f} MB/s")
+
+
+def esri_field_dtypes(fields: List[Dict]) -> Dict[str, str]:
+    """{field name: pandas dtype} for the fields of a query response"""
+    return {f["name"]: ESRI_DTYPES.get(f.get("type"), "object") for f in fields or []}
+
+
+def page_to_geodataframe(features: List[Dict], dtypes: Dict[str, str], crs: Optional[str],
+                         extra: Optional[Dict] = None) -> gpd.GeoDataFrame:
+    """One page of Esri JSON polygon features -> GeoDataFrame with a fixed schema"""
+    geometries = decode_polygons([f.get("geometry") for f in features])
+    frame = pd.DataFrame.from_records([f.get("attributes", {}) for f in features], columns=list(dtypes))
+    for name, dtype in dtypes.items():
+        if dtype.startswith("datetime"):
+            frame[name] = pd.to_datetime(frame[name], unit="ms", errors="coerce")
+        elif dtype == "object":
+            frame[name] = frame[name].astype("object")
+        else:
+            frame[name] = pd.to_numeric(frame[name], errors="coerce").astype(dtype)
+    for name, value in (extra or {}).items():
+        frame[name] = value
+    gdf = gpd.GeoDataFrame(frame, geometry=geometries, crs=crs)
+    return gdf[gdf.geometry.notna()]
+
+
+def fetch_mill_pages(query_url: str, mill: str, profile: str, out_fields, token: Optional[str], session,
+                     page_size: int, order_by: Optional[str], crs: Optional[str], page_queue: queue.Queue,
+                     progress: ExportProgress, stop: threading.Event, where: Optional[str] = None) -> None:
+    """Worker: page through one mill, putting decoded pages on the queue"""
+    error = None
+    try:
+        offset = 0
+        dtypes = None
+        mill_where = f"report_location='{mill}'" + (f" and ({where})" if where else "")
+        while not stop.is_set():
+            params = geometry_params(profile, out_fields, where=mill_where, token=token,
+                                     resultOffset=offset, resultRecordCount=page_size, orderByFields=order_by)
+            data, stats = fetch_geometry_page(query_url, params, session, REQUEST_TIMEOUT)
+            features = data.get("features", [])
+            progress.page(mill, len(features), stats["bytes"])
+            if features:
+                dtypes = dtypes or esri_field_dtypes(data.get("fields"))
+                page_queue.put(page_to_geodataframe(features, dtypes, crs, {"source_mill": mill}))
+            offset += len(features)
+            if not features or not data.get("exceededTransferLimit"):
+                break
+    except Exception as e:
+        error = e
+    finally:
+        progress.finish(mill, error)
+        page_queue.put(_DONE)
+
+
+def _remove_output(output_path: str) -> None:
+    """Delete a previous output (all shapefile sidecars)"""
+    base, ext = os.path.splitext(output_path)
+    for sidecar in ([".shp", ".shx", ".dbf", ".prj", ".cpg"] if ext.lower() == ".shp" else [ext]):
+        if os.path.exists(base + sidecar):
+            os.remove(base + sidecar)
+
+
+def stream_export(query_url: str, mills: List[str], output_path: str, profile: str = "full",
+                  out_fields=None, session=None, token: Optional[str] = None, workers: int = PAGE_WORKERS,
+                  where: Optional[str] = None) -> Dict:
+    """
+    Fetch every mill's geometries concurrently and stream the pages into output_path
+    (.shp or .gpkg). Returns the export report (per-mill stats and throughput).
+    The default "full" profile writes every field at full precision in the layer's
+    spatial reference; pass profile="export" for the reduced Albers pull.
+    """
+    schema = get_layer_schema(query_url, session, token)
+    page_size = schema.max_record_count or PAGE_SIZE
+    order_by = schema.info.get("objectIdField")
+    crs = profile_crs(profile) or layer_crs(schema.info)
+    if not crs:
+        crs = "EPSG:4326"
+        print(f"WARNING: {query_url} reports no spatial reference, assuming {crs}")
+
+    driver = "GPKG" if output_path.lower().endswith(".gpkg") else "ESRI Shapefile"
+    _remove_output(output_path)
+
+    progress = ExportProgress(mills)
+    page_queue = queue.Queue(maxsize=QUEUE_PAGES)
+    stop = threading.Event()
+    columns = None
+    last_progress = time.time()
+    write_error = None
+
+    print(f"Streaming {len(mills)} mills to {output_path} ({workers} workers, {page_size} features/page)")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for mill in mills:
+            executor.submit(fetch_mill_pages, query_url, mill, profile, out_fields, token, session,
+                            page_size, order_by, crs, page_queue, progress, stop, where)
+
+        remaining = len(mills)
+        while remaining:
+            try:
+                item = page_queue.get(timeout=PROGRESS_SECONDS)
+            except queue.Empty:
+                item = None
+            if item is _DONE:
+                remaining -= 1
+            elif item is not None and write_error is None:
+                try:
+                    # First page fixes the column order; later pages are appended in the same layout
+                    columns = columns or list(item.columns)
+                    pyogrio.write_dataframe(item[columns], output_path, driver=driver,
+                                            append=progress.written > 0)
+                    progress.written += len(item)
+                except Exception as e:
+                    # keep draining the queue so the workers can exit
+                    write_error = e
+                    stop.set()
+            if time.time() - last_progress >= PROGRESS_SECONDS:
+                print(progress.line())
+                last_progress = time.time()
+
+    elapsed = time.time() - progress.start
+    fetched = sum(s["features"] for s in progress.mills.values())
+    total_bytes = sum(s["bytes"] for s in progress.mills.values())
+    print(progress.line())
+    return {
+        "output": output_path if progress.written else None,
+        "mills": progress.mills,
+        "features_fetched": fetched,
+        "features_written": progress.written,
+        "bytes": total_bytes,
+        "seconds": round(elapsed, 1),
+        "features_per_second": round(fetched / elapsed, 1) if elapsed > 0 else 0.0,
+        "mb_per_second": round(total_bytes / 1e6 / elapsed, 2) if elapsed > 0 else 0.0,
+        "failed": [m for m, s in progress.mills.items() if s["status"] == "error"],
+        "write_error": str(write_error) if write_error else None,
+    }
+
+
+def print_export_report(report: Dict) -> None:
+    """Per-mill table and totals of a stream_export() result"""
+    print(f"\n{'Mill':<8} {'Pages':>6} {'Features':>10} {'MB':>8} {'Done at s':>10}  Status")
+    print("-" * 60)
+    for mill, s in report["mills"].items():
+        status = s["status"] if s["status"] != "error" else f"ERROR {s.get('error', '')}"
+        print(f"{mill:<8} {s['pages']:>6} {s['features']:>10,} {s['bytes'] / 1e6:>8.2f} {s['seconds']:>10.1f}  {status}")
+    print("-" * 60)
+    print(f"Fetched {report['features_fetched']:,} features ({report['bytes'] / 1e6:,.1f} MB) in {report['seconds']}s - "
+          f"{report['features_per_second']:,.0f} features/s, {report['mb_per_second']} MB/s")
+    print(f"Written: {report['features_written']:,} to {report['output']}")
+    if report["write_error"]:
+        print(f"WRITE ERROR: {report['write_error']}")
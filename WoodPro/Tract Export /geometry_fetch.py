@@ -0,0 +1,218 @@
+"""
+Geometry Fetch Options for Tract Geometry Pulls
+===============================================
+
+Helpers for trimming ArcGIS REST geometry payloads. The report and POC scripts
+request full-precision geometry with outFields=*, which is far more detail than
+a web map or the monthly export needs. A geometry profile bundles the options
+that cut the payload on the server side:
+
+- maxAllowableOffset : generalizes geometries (units of outSR)
+- geometryPrecision  : number of decimal places kept in coordinates
+- outSR              : server-side projection, so clients skip a reprojection step
+- outFields          : explicit field list instead of *
+
+payload_report() fetches the same where clause with the "full" profile and a
+reduced profile and reports bytes, download time and JSON parse time saved.
+
+Usage:
+------
+    from geometry_fetch import geometry_params, payload_report, print_payload_report
+
+    params = geometry_params("export", where="report_location='AXI'")
+    report = payload_report(query_url, "report_location='AXI'", profile="export")
+    print_payload_report(report)
+
+Requirements:
+------------
+- Python 3.6+
+- requests library
+"""
+
+import json
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import requests
+
+WEB_MERCATOR_WKID = 3857
+ALBERS_WKID = 102003  # USA_Contiguous_Albers_Equal_Area_Conic, same as ExportToFgdb.py
+
+# Offsets are in outSR units (meters for both 3857 and 102003)
+GEOMETRY_PROFILES = {
+    # What the scripts request today - full precision, native SR, every field
+    "full": {
+        "outFields": "*"
+    },
+    # Web map display - a couple of meters of generalization is invisible at tract scale
+    "webmap": {
+        "outSR": WEB_MERCATOR_WKID,
+        "maxAllowableOffset": 2,
+        "geometryPrecision": 1,
+        "outFields": "report_location,report_tract_no,tract_name,harvest_status"
+    },
+    # Opt-in reduced export - centimeter precision in Albers, only the join fields
+    # (the geometry export defaults to "full", which keeps every attribute)
+    "export": {
+        "outSR": ALBERS_WKID,
+        "maxAllowableOffset": 0.5,
+        "geometryPrecision": 2,
+        "outFields": "report_location,report_tract_no"
+    },
+}
+
+# CRS strings for GeoPandas, keyed by outSR
+WKID_CRS = {
+    WEB_MERCATOR_WKID: "EPSG:3857",
+    102100: "EPSG:3857",  # Esri's older Web Mercator wkid
+    ALBERS_WKID: "ESRI:102003",
+    4326: "EPSG:4326",
+}
+
+
+def geometry_params(profile: str = "export", out_fields: Optional[Union[str, List[str]]] = None,
+                    **overrides) -> Dict:
+    """
+    Build query parameters for a geometry pull
+
+    Args:
+        profile (str): Key of GEOMETRY_PROFILES
+        out_fields (str or list): Explicit field list, replaces the profile's fields
+        **overrides: Any other query parameters (where, token, resultRecordCount, ...).
+            A value of None removes the parameter.
+
+    Returns:
+        Dict: Query parameters ready for requests
+    """
+    if profile not in GEOMETRY_PROFILES:
+        raise ValueError(f"Unknown geometry profile '{profile}'. Choose from: {', '.join(GEOMETRY_PROFILES)}")
+
+    params = {"returnGeometry": "true", "f": "json"}
+    params.update(GEOMETRY_PROFILES[profile])
+
+    if out_fields:
+        params["outFields"] = out_fields if isinstance(out_fields, str) else ",".join(out_fields)
+
+    for key, value in overrides.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = value
+
+    return params
+
+
+def profile_crs(profile: str) -> Optional[str]:
+    """CRS string of the geometries a profile returns (None when the layer SR is kept)"""
+    wkid = GEOMETRY_PROFILES[profile].get("outSR")
+    return WKID_CRS.get(wkid, f"EPSG:{wkid}") if wkid else None
+
+
+def layer_crs(layer_info: Dict) -> Optional[str]:
+    """CRS string of a layer's native spatial reference (from its extent), None if it has none"""
+    sr = (layer_info.get("extent") or {}).get("spatialReference") or layer_info.get("spatialReference") or {}
+    wkid = sr.get("latestWkid") or sr.get("wkid")
+    if not wkid:
+        return None
+    return WKID_CRS.get(wkid, f"EPSG:{wkid}")
+
+
+def count_vertices(features: List[Dict]) -> int:
+    """Total vertex count of Esri JSON polygon/polyline/point features"""
+    total = 0
+    for feature in features:
+        geom = feature.get("geometry") or {}
+        for key in ("rings", "paths"):
+            for part in geom.get(key, []):
+                total += len(part)
+        if "x" in geom:
+            total += 1
+        total += len(geom.get("points", []))
+    return total
+
+
+def fetch_geometry_page(query_url: str, params: Dict, session=None, timeout: int = 60) -> Tuple[Dict, Dict]:
+    """
+    Run one geometry query and measure its payload
+
+    Returns:
+        Tuple[Dict, Dict]: (response JSON, stats) where stats holds bytes, wire_bytes,
+        download_ms, parse_ms, features and vertices
+    """
+    http = session or requests
+
+    start_time = time.perf_counter()
+    response = http.get(query_url, params=params, timeout=timeout)
+    response.raise_for_status()
+    raw = response.content
+    download_ms = (time.perf_counter() - start_time) * 1000
+
+    parse_start = time.perf_counter()
+    data = json.loads(raw)
+    parse_ms = (time.perf_counter() - parse_start) * 1000
+
+    if "error" in data:
+        raise RuntimeError(data["error"].get("message", "Unknown error"))
+
+    features = data.get("features", [])
+    stats = {
+        "bytes": len(raw),
+        "wire_bytes": int(response.headers.get("Content-Length", len(raw))),
+        "download_ms": round(download_ms, 1),
+        "parse_ms": round(parse_ms, 1),
+        "features": len(features),
+        "vertices": count_vertices(features)
+    }
+    return data, stats
+
+
+def payload_report(query_url: str, where: str, profile: str = "export",
+                   out_fields: Optional[Union[str, List[str]]] = None, session=None,
+                   token: Optional[str] = None, sample_size: Optional[int] = None,
+                   timeout: int = 60) -> Dict:
+    """
+    Compare the payload of a full-precision pull against a reduced profile
+
+    Args:
+        query_url (str): Layer query URL
+        where (str): Where clause used for both requests
+        profile (str): Reduced profile to compare against "full"
+        out_fields: Explicit field list for the reduced request
+        session: requests.Session to reuse (optional)
+        token (str): ArcGIS token (optional)
+        sample_size (int): resultRecordCount for both requests (optional)
+
+    Returns:
+        Dict: full and reduced stats plus bytes/time saved
+    """
+    common = {"where": where, "token": token, "resultRecordCount": sample_size}
+    _, full_stats = fetch_geometry_page(query_url, geometry_params("full", **common), session, timeout)
+    _, reduced_stats = fetch_geometry_page(query_url, geometry_params(profile, out_fields, **common),
+                                           session, timeout)
+
+    bytes_saved = full_stats["bytes"] - reduced_stats["bytes"]
+    return {
+        "where": where,
+        "profile": profile,
+        "full": full_stats,
+        "reduced": reduced_stats,
+        "bytes_saved": bytes_saved,
+        "bytes_saved_pct": round(100 * bytes_saved / full_stats["bytes"], 1) if full_stats["bytes"] else 0.0,
+        "vertices_saved": full_stats["vertices"] - reduced_stats["vertices"],
+        "parse_ms_saved": round(full_stats["parse_ms"] - reduced_stats["parse_ms"], 1),
+        "download_ms_saved": round(full_stats["download_ms"] - reduced_stats["download_ms"], 1)
+    }
+
+
+def print_payload_report(report: Dict) -> None:
+    """Print a payload_report() result"""
+    full, reduced = report["full"], report["reduced"]
+    print(f"\nPayload report ({report['profile']} vs full) - {report['where']}")
+    print("-" * 60)
+    print(f"{'':<14} {'Full':>14} {'Reduced':>14}")
+    print(f"{'Features':<14} {full['features']:>14,} {reduced['features']:>14,}")
+    print(f"{'Vertices':<14} {full['vertices']:>14,} {reduced['vertices']:>14,}")
+    print(f"{'Bytes':<14} {full['bytes']:>14,} {reduced['bytes']:>14,}")
+    print(f"{'Download ms':<14} {full['download_ms']:>14,.1f} {reduced['download_ms']:>14,.1f}")
+    print(f"{'Parse ms':<14} {full['parse_ms']:>14,.1f} {reduced['parse_ms']:>14,.1f}")
+    print(f"Bytes saved: {report['bytes_saved']:,} ({report['bytes_saved_pct']}%)")
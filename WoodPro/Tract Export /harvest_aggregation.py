@@ -0,0 +1,277 @@
+"""
+Harvest Report Aggregation
+==========================
+
+One aggregation engine for the harvest / mill activity reports. The report scripts
+used to build per-mill Python dicts feature by feature (harvest_status,
+complete_status and SaleType counts, supplier sets unioned across mills); here the
+attribute rows of all mills go into one columnar DataFrame and every summary comes
+out of a single grouped aggregation:
+
+- value counts per (mill, field, value) for any number of fields, from one
+  melt + groupby over all of them
+- distinct counts per (mill, field) (e.g. suppliers per mill) and across all mills
+- record counts per mill
+
+aggregate_by() runs the same aggregation for every value of a key column (the report
+month in the multi-month batch) and save_batch_csv() / save_batch_json() write all of
+them into one file.
+
+Null and empty-string values are not counted, as before. Formatting sits on top of
+the aggregate: mill_results() gives per-mill dicts (the reports' return value and
+JSON output), mill_table() one row per mill for CSV, print_mill_lines() /
+print_summary() the console output. Mills whose query failed or returned nothing are
+carried through from the query log, so every format still lists every mill.
+
+Usage:
+------
+    from harvest_aggregation import aggregate, features_frame, combine_frames, mill_results
+
+    frame = combine_frames([features_frame(features, mill) for mill, features in pages])
+    summary = aggregate(frame, value_fields=["harvest_status", "SaleType"], distinct_fields=["supplier"])
+    results = mill_results(summary, query_log)
+
+Requirements:
+------------
+- Python 3.6+
+- pandas
+"""
+
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+MILL_FIELD = "mill"
+
+
+def features_frame(features: List[Dict], mill: str) -> pd.DataFrame:
+    """Attributes of one query's features as a DataFrame with a mill column"""
+    frame = pd.DataFrame.from_records([f.get("attributes", {}) for f in features])
+    frame[MILL_FIELD] = mill
+    return frame
+
+
+def combine_frames(frames: Iterable[pd.DataFrame]) -> pd.DataFrame:
+    """All mills' rows in one frame (an empty frame with just the mill column if there are none)"""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame({MILL_FIELD: pd.Series(dtype="object")})
+    return pd.concat(frames, ignore_index=True, sort=False)
+
+
+def aggregate(frame: pd.DataFrame, value_fields: Iterable[str], distinct_fields: Iterable[str] = (),
+              mill_field: str = MILL_FIELD) -> Dict:
+    """
+    Every summary of the report in one pass over the frame.
+
+    value_fields get full value counts, distinct_fields (e.g. supplier) are reported as
+    their distinct values and counts. Fields missing from the frame are reported as
+    empty. Returns a dict of DataFrames/Series plus the all-mill totals:
+
+        records   Series  mill -> row count
+        counts    frame   mill, field, value, count (most frequent first per mill/field)
+        distinct  frame   mill x field distinct value counts
+        totals    dict    records, mills, distinct values per field across all mills
+    """
+    value_fields = list(value_fields)
+    distinct_fields = [f for f in distinct_fields if f not in value_fields]
+    fields = value_fields + distinct_fields
+    present = [f for f in fields if f in frame.columns]
+
+    records = frame.groupby(mill_field, sort=False).size()
+
+    # Long form: one row per (mill, field, value) cell, then one groupby for every field
+    cells = frame.melt(id_vars=[mill_field], value_vars=present, var_name="field", value_name="value")
+    cells = cells[cells["value"].notna() & (cells["value"] != "")]
+    counts = cells.groupby([mill_field, "field", "value"], sort=False).size().rename("count").reset_index()
+    counts = counts.sort_values([mill_field, "field", "count"], ascending=[True, True, False], kind="stable")
+
+    distinct = (counts.groupby([mill_field, "field"]).size().unstack("field", fill_value=0)
+                .reindex(index=records.index, columns=fields, fill_value=0).astype("int64"))
+    totals = {
+        "records": int(len(frame)),
+        "mills": int(len(records)),
+        "distinct": {f: int(n) for f, n in counts.groupby("field")["value"].nunique().reindex(fields, fill_value=0).items()},
+    }
+    return {
+        "mill_field": mill_field,
+        "value_fields": value_fields,
+        "distinct_fields": distinct_fields,
+        "records": records,
+        "counts": counts,
+        "distinct": distinct,
+        "totals": totals,
+    }
+
+
+def aggregate_by(frame: pd.DataFrame, key_field: str, keys: Iterable, value_fields: Iterable[str],
+                 distinct_fields: Iterable[str] = (), mill_field: str = MILL_FIELD) -> Dict:
+    """
+    aggregate() for each value of key_field (e.g. report month) from one frame:
+    {key: summary}. Keys without rows get an empty summary, so every requested key
+    is reported.
+    """
+    value_fields = list(value_fields)
+    distinct_fields = list(distinct_fields)
+    groups = dict(iter(frame.groupby(key_field, sort=False))) if key_field in frame.columns else {}
+    empty = frame.iloc[0:0]
+    return {key: aggregate(groups.get(key, empty), value_fields, distinct_fields, mill_field) for key in keys}
+
+
+def _nested_counts(summary: Dict) -> Dict[str, Dict[str, Dict]]:
+    """counts frame -> {mill: {field: {value: count}}}"""
+    nested = {}
+    counts = summary["counts"]
+    columns = [counts[c].tolist() for c in (summary["mill_field"], "field", "value", "count")]
+    for mill, field, value, count in zip(*columns):
+        nested.setdefault(mill, {}).setdefault(field, {})[value] = count
+    return nested
+
+
+def mill_results(summary: Dict, query_log: Optional[Dict[str, Dict]] = None) -> List[Dict]:
+    """
+    Per-mill result dicts. query_log is {mill: {"status", "message", "query_time_ms", ...}}
+    in report order; mills with rows but no log entry are appended as "success".
+
+        {"mill", "status", "total_records", "value_counts": {field: {value: count}},
+         "distinct_values": {field: [values]}, "distinct_counts": {field: n}, "query_time_ms"}
+    """
+    nested = _nested_counts(summary)
+    records = summary["records"]
+    distinct = summary["distinct"]
+    query_log = dict(query_log or {})
+    for mill in records.index:
+        query_log.setdefault(mill, {"status": "success"})
+
+    results = []
+    for mill, entry in query_log.items():
+        result = {"mill": mill}
+        result.update(entry)
+        if mill in records.index:
+            mill_counts = nested.get(mill, {})
+            result["status"] = "success"
+            result["total_records"] = int(records[mill])
+            result["value_counts"] = {f: mill_counts.get(f, {}) for f in summary["value_fields"]}
+            result["distinct_values"] = {f: list(mill_counts.get(f, {})) for f in summary["distinct_fields"]}
+            result["distinct_counts"] = {f: int(n) for f, n in distinct.loc[mill].items()}
+        else:
+            if result["status"] == "success":
+                # queried fine, but none of its rows are in this summary (e.g. another month)
+                result["status"] = "no_data"
+            result.setdefault("total_records", 0)
+        results.append(result)
+    return results
+
+
+def mill_table(results: List[Dict]) -> pd.DataFrame:
+    """
+    One row per mill for CSV output: status, record count, "value:count; ..." per value
+    field, distinct count per field, query time and any error message.
+    """
+    rows = []
+    for result in results:
+        row = {"Mill": result["mill"], "Status": result["status"], "Total_Records": result.get("total_records", 0)}
+        for field, values in result.get("value_counts", {}).items():
+            row[field] = "; ".join(f"{k}:{v}" for k, v in values.items())
+        for field, n in result.get("distinct_counts", {}).items():
+            row[f"{field}_count"] = n
+        row["Query_Time_MS"] = result.get("query_time_ms", 0)
+        row["Message"] = result.get("message", "")
+        rows.append(row)
+    table = pd.DataFrame(rows)
+    count_columns = [c for c in table.columns if c.endswith("_count")]
+    table[count_columns] = table[count_columns].fillna(0).astype("int64")
+    return table
+
+
+def print_mill_lines(results: List[Dict], show_values: bool = False) -> None:
+    """
+    Console line per mill: record count and distinct counts per field, or with
+    show_values the value counts themselves ("value(count), ...").
+    """
+    for result in results:
+        mill = result["mill"]
+        if result["status"] == "no_data":
+            print(f"{mill:10} | No data found")
+        elif result["status"] != "success":
+            print(f"{mill:10} | {result['status'].upper().replace('_', ' ')}: {result.get('message', '')}")
+        elif show_values:
+            values = ", ".join(f"{v}({c})" for counts in result["value_counts"].values() for v, c in counts.items())
+            print(f"{mill:10} | {result['total_records']:5,} records | {values or 'No values'}")
+        else:
+            fields = " | ".join(f"{n} {f}" for f, n in result["distinct_counts"].items())
+            print(f"{mill:10} | {result['total_records']:5,} records | {fields}")
+
+
+def print_summary(summary: Dict, results: List[Dict], title: str = "SUMMARY") -> None:
+    """All-mill totals: mills processed, records, distinct values per field"""
+    successful = sum(1 for r in results if r["status"] == "success")
+    print("\n" + "=" * 80)
+    print(title)
+    print(f"Mills processed: {successful}/{len(results)}")
+    print(f"Total records: {summary['totals']['records']:,}")
+    for field, n in summary["totals"]["distinct"].items():
+        print(f"Unique {field}: {n}")
+
+
+def save_csv(results: List[Dict], filename: str) -> str:
+    """Write mill_table(results) to filename"""
+    mill_table(results).to_csv(filename, index=False)
+    print(f"Results saved to: {filename}")
+    return filename
+
+
+def report_document(summary: Dict, results: List[Dict], metadata: Optional[Dict] = None) -> Dict:
+    """The per-mill results plus the all-mill totals (and any extra metadata) as one JSON-ready dict"""
+    return {
+        "report_metadata": dict({
+            "generated_at": datetime.now().isoformat(),
+            "total_mills": len(results),
+            "successful_mills": sum(1 for r in results if r["status"] == "success"),
+            "total_records": summary["totals"]["records"],
+            "distinct_totals": summary["totals"]["distinct"],
+        }, **(metadata or {})),
+        "results": results,
+    }
+
+
+def batch_table(batch: Dict[str, List[Dict]], key_name: str = "Month") -> pd.DataFrame:
+    """mill_table() of every key's results in one frame, with the key as first column"""
+    tables = [mill_table(results).assign(**{key_name: key}) for key, results in batch.items()]
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    return table[[key_name] + [c for c in table.columns if c != key_name]] if len(table) else table
+
+
+def batch_document(summaries: Dict[str, Dict], batch: Dict[str, List[Dict]], metadata: Optional[Dict] = None) -> Dict:
+    """Per key its totals and per-mill results as one JSON-ready dict"""
+    return {
+        "report_metadata": dict({"generated_at": datetime.now().isoformat(), "keys": list(batch)}, **(metadata or {})),
+        "reports": {key: {"totals": summaries[key]["totals"], "results": results} for key, results in batch.items()},
+    }
+
+
+def _write_json(document: Dict, filename: str) -> str:
+    with open(filename, "w") as jsonfile:
+        json.dump(document, jsonfile, indent=2, default=str)
+    print(f"Results saved to: {filename}")
+    return filename
+
+
+def save_json(summary: Dict, results: List[Dict], filename: str, metadata: Optional[Dict] = None) -> str:
+    """Write report_document() to filename"""
+    return _write_json(report_document(summary, results, metadata), filename)
+
+
+def save_batch_csv(batch: Dict[str, List[Dict]], filename: str, key_name: str = "Month") -> str:
+    """One CSV for a batch (batch_table())"""
+    batch_table(batch, key_name).to_csv(filename, index=False)
+    print(f"Results saved to: {filename}")
+    return filename
+
+
+def save_batch_json(summaries: Dict[str, Dict], batch: Dict[str, List[Dict]], filename: str,
+                    metadata: Optional[Dict] = None) -> str:
+    """One JSON for a batch (batch_document())"""
+    return _write_json(batch_document(summaries, batch, metadata), filename)
@@ -0,0 +1,252 @@
+"""
+Layer Schema Cache
+==================
+
+Caches ArcGIS layer metadata (the layer's ?f=json resource: fields, field types,
+maxRecordCount, capabilities, spatial reference) so report scripts no longer need a
+resultRecordCount=1, outFields=* probe on every run just to learn which fields
+exist.
+
+The cache is a JSON file keyed by layer URL. An entry is refetched when:
+- the cache file was written by a different CACHE_VERSION of this module
+- the entry is older than the TTL (default 7 days) or refresh=True is passed
+  (a change in the server's currentVersion is reported when this happens)
+- a field selection asks for a required field the cached schema doesn't have
+  (the schema is refetched once before failing, in case the view changed)
+
+Usage:
+------
+    from layer_schema import get_layer_schema
+
+    schema = get_layer_schema(url, session=session, token=token)
+    fields = schema.select_fields(["report_location", "harvest_status", "PurchDate"],
+                                  required=["report_location"])
+    params["outFields"] = ",".join(fields)
+
+    python layer_schema.py check     offline check that a cached schema keeps the layer's CRS
+
+Requirements:
+------------
+- Python 3.6+
+- requests library
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+CACHE_VERSION = 2  # 2: spatialReference / extent added
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layer_schema_cache.json")
+DEFAULT_TTL_HOURS = 24 * 7
+
+
+class LayerSchema:
+    """Field metadata for one layer with a validated field-selection API"""
+
+    def __init__(self, layer_url: str, info: Dict):
+        self.layer_url = layer_url
+        self.info = info
+        self.fields = {f["name"].lower(): f for f in info.get("fields", [])}
+
+    @property
+    def name(self) -> str:
+        return self.info.get("name", "")
+
+    @property
+    def max_record_count(self) -> Optional[int]:
+        return self.info.get("maxRecordCount")
+
+    @property
+    def capabilities(self) -> List[str]:
+        return [c.strip() for c in self.info.get("capabilities", "").split(",") if c.strip()]
+
+    @property
+    def field_names(self) -> List[str]:
+        return [f["name"] for f in self.fields.values()]
+
+    def has_field(self, name: str) -> bool:
+        return name.lower() in self.fields
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Field name with the layer's own casing (None when the field doesn't exist)"""
+        field = self.fields.get(name.lower())
+        return field["name"] if field else None
+
+    def field_type(self, name: str) -> Optional[str]:
+        field = self.fields.get(name.lower())
+        return field["type"] if field else None
+
+    def fields_of_type(self, *field_types: str) -> List[str]:
+        """Names of all fields with one of the given esriFieldType* types"""
+        return [f["name"] for f in self.fields.values() if f["type"] in field_types]
+
+    def supports(self, capability: str) -> bool:
+        return capability.lower() in (c.lower() for c in self.capabilities)
+
+    def missing(self, names: Iterable[str]) -> List[str]:
+        return [n for n in names if not self.has_field(n)]
+
+    def select_fields(self, wanted: Iterable[str], required: Iterable[str] = ()) -> List[str]:
+        """
+        Minimal outFields list: every wanted/required field that exists, in the
+        layer's casing, without duplicates. Missing optional fields are dropped.
+
+        Raises:
+            ValueError: if a required field is not in the layer
+        """
+        required = list(required)
+        missing_required = self.missing(required)
+        if missing_required:
+            raise ValueError(f"{self.layer_url} is missing required field(s): {', '.join(missing_required)}")
+
+        selected = []
+        for name in required + [n for n in wanted if n not in required]:
+            resolved = self.resolve(name)
+            if resolved and resolved not in selected:
+                selected.append(resolved)
+        return selected
+
+
+def _layer_url(url: str) -> str:
+    """Accept either a layer URL or its /query endpoint"""
+    url = url.rstrip("/")
+    return url[:-len("/query")] if url.endswith("/query") else url
+
+
+def _load_cache(cache_path: str) -> Dict:
+    if not os.path.exists(cache_path):
+        return {"cache_version": CACHE_VERSION, "layers": {}}
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (ValueError, OSError):
+        return {"cache_version": CACHE_VERSION, "layers": {}}
+    if cache.get("cache_version") != CACHE_VERSION:
+        return {"cache_version": CACHE_VERSION, "layers": {}}
+    return cache
+
+
+def _save_cache(cache: Dict, cache_path: str) -> None:
+    # per-process/thread temp file, so concurrent writers don't replace each other's
+    tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, cache_path)
+
+
+def fetch_layer_info(layer_url: str, session=None, token: Optional[str] = None, timeout: int = 30) -> Dict:
+    """Fetch the layer's ?f=json metadata, keeping only what the cache needs"""
+    http = session or requests
+    params = {"f": "json"}
+    if token:
+        params["token"] = token
+    response = http.get(layer_url, params=params, timeout=timeout)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        raise Exception(f"Layer info failed: {data['error'].get('message', 'Unknown error')}")
+
+    extent = data.get("extent") or {}
+    return {
+        "name": data.get("name"),
+        "type": data.get("type"),
+        "currentVersion": data.get("currentVersion"),
+        "geometryType": data.get("geometryType"),
+        # native SR of the query results (geometry_fetch.layer_crs)
+        "spatialReference": extent.get("spatialReference") or data.get("sourceSpatialReference"),
+        "extent": extent,
+        "objectIdField": data.get("objectIdField"),
+        "maxRecordCount": data.get("maxRecordCount"),
+        "capabilities": data.get("capabilities", ""),
+        "supportsAdvancedQueries": data.get("supportsAdvancedQueries"),
+        "supportsStatistics": data.get("supportsStatistics"),
+        "supportsPagination": data.get("advancedQueryCapabilities", {}).get("supportsPagination"),
+        "fields": [
+            {"name": f["name"], "type": f.get("type"), "alias": f.get("alias"), "length": f.get("length")}
+            for f in data.get("fields") or []
+        ]
+    }
+
+
+def get_layer_schema(url: str, session=None, token: Optional[str] = None, refresh: bool = False,
+                     cache_path: str = DEFAULT_CACHE_PATH, ttl_hours: float = DEFAULT_TTL_HOURS) -> LayerSchema:
+    """
+    Layer schema from the cache, fetching ?f=json only when the entry is missing,
+    expired or refresh is requested.
+    """
+    layer_url = _layer_url(url)
+    cache = _load_cache(cache_path)
+    entry = cache["layers"].get(layer_url)
+
+    expired = entry is None or (time.time() - entry.get("fetched_at", 0)) > ttl_hours * 3600
+    if not refresh and not expired:
+        return LayerSchema(layer_url, entry["info"])
+
+    info = fetch_layer_info(layer_url, session, token)
+    if entry and entry["info"].get("currentVersion") != info.get("currentVersion"):
+        print(f"Layer schema: server version changed for {layer_url}")
+
+    cache["layers"][layer_url] = {"fetched_at": time.time(), "info": info}
+    try:
+        _save_cache(cache, cache_path)
+    except OSError as e:
+        print(f"Layer schema: could not write cache ({e})")
+    return LayerSchema(layer_url, info)
+
+
+def select_out_fields(url: str, wanted: Iterable[str], required: Iterable[str] = (), session=None,
+                      token: Optional[str] = None, cache_path: str = DEFAULT_CACHE_PATH) -> List[str]:
+    """
+    select_fields() against the cached schema, refetching the schema once if a
+    required field is missing (the view may have changed since it was cached).
+    """
+    wanted, required = list(wanted), list(required)
+    schema = get_layer_schema(url, session, token, cache_path=cache_path)
+    try:
+        return schema.select_fields(wanted, required)
+    except ValueError:
+        schema = get_layer_schema(url, session, token, refresh=True, cache_path=cache_path)
+        return schema.select_fields(wanted, required)
+
+
+def check() -> bool:
+    """
+    Offline: cache a layer's info from a canned ?f=json response, read it back through
+    get_layer_schema and check that geometry_fetch.layer_crs gets the layer's CRS.
+    """
+    from geometry_fetch import layer_crs
+
+    class _Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"name": "Tracts", "currentVersion": 11.1, "geometryType": "esriGeometryPolygon",
+                    "extent": {"xmin": 0, "ymin": 0, "xmax": 1, "ymax": 1,
+                               "spatialReference": {"wkid": 102100, "latestWkid": 3857}},
+                    "fields": [{"name": "OBJECTID", "type": "esriFieldTypeOID"}]}
+
+    class _Session:
+        def get(self, url, params=None, timeout=None):
+            return _Response()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "layer_schema_cache.json")
+        url = "https://example/arcgis/rest/services/X/MapServer/0"
+        fetched = layer_crs(get_layer_schema(url, _Session(), cache_path=cache_path).info)
+        cached = layer_crs(get_layer_schema(url, cache_path=cache_path).info)
+    ok = fetched == cached == "EPSG:3857"
+    print(f"layer_crs fetched: {fetched}, from cache: {cached} - {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        sys.exit(0 if check() else 1)
+    print(__doc__)
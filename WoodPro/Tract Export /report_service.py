@@ -0,0 +1,381 @@
+"""
+Harvest Report Service
+======================
+
+Small local HTTP service for the mill and harvest reports, so the team can pull a
+report from a browser or script instead of running Report_authDebug.py by hand (which
+re-authenticates and re-queries every mill on every run).
+
+- One authenticated Canfor token is shared by a pool of POOL_SIZE requests sessions;
+  it is refreshed shortly before it expires (or when a query reports it expired).
+- Tract rows are pulled for all mills at once (mills split across the pool sessions)
+  and kept in memory for CACHE_TTL_SECONDS. Concurrent requests for the same data wait
+  for one pull instead of starting their own.
+- Reports are computed on request from the cached frame with harvest_aggregation, and
+  the rendered responses are cached too, so a repeated request is a dictionary lookup
+  and a fresh report over cached data is one grouped aggregation (milliseconds).
+
+Months are assigned the same way as the batch mode: the month of the tract's last load,
+from days_since_last_load.
+
+Endpoints:
+----------
+    GET  /health
+    GET  /reports/harvest                     all data
+    GET  /reports/harvest?month=2024-05       one month
+    GET  /reports/harvest?start=2024-01&end=2024-12
+    GET  /reports/mill?field=harvest_status
+    GET  /cache                               cached datasets and their age
+    POST /cache/refresh                       drop the cache (next request re-queries)
+
+    Add format=csv for CSV instead of JSON. Responses carry X-Cache (hit/miss) and
+    X-Report-Ms headers.
+
+Usage:
+------
+    python report_service.py [port]           listens on 127.0.0.1 (default port 8765)
+
+Credentials come from CANFOR_USERNAME / CANFOR_PASSWORD.
+
+Requirements:
+------------
+- Python 3.7+
+- requests, pandas
+"""
+
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from harvest_aggregation import (aggregate, aggregate_by, batch_document, batch_table, combine_frames, mill_results,
+                                 mill_table, report_document)
+from layer_schema import select_out_fields
+from Report_authDebug import (HARVEST_DISTINCT_FIELDS, HARVEST_FIELDS, HARVEST_VALUE_FIELDS, MILLS, REPORT_URL,
+                              add_report_month, get_arcgis_token, month_range, parse_month, query_mill_rows)
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+POOL_SIZE = 4
+CACHE_TTL_SECONDS = 15 * 60
+TOKEN_MARGIN_SECONDS = 5 * 60      # refresh the token this long before it expires
+DEFAULT_TOKEN_SECONDS = 60 * 60    # when the portal doesn't report an expiry
+RESPONSE_CACHE_SIZE = 256
+REPORTS = ("harvest", "mill")
+
+
+class UnknownReport(Exception):
+    """/reports/<name> with a name not in REPORTS (404)"""
+
+
+class SessionPool:
+    """A shared token and POOL_SIZE requests sessions carrying the login cookies"""
+
+    def __init__(self, username: str, password: str, url: str = REPORT_URL, size: int = POOL_SIZE,
+                 authenticate=get_arcgis_token):
+        self.username = username
+        self.password = password
+        self.url = url
+        self.size = size
+        self.authenticate = authenticate
+        self.lock = threading.Lock()
+        self.sessions = queue.Queue()
+        self.token = None
+        self.expires = 0.0
+        self.logins = 0
+
+    def _login(self) -> None:
+        token, expires_ms, login_session = self.authenticate(self.username, self.password, self.url)
+        self.token = token
+        self.expires = expires_ms / 1000.0 if expires_ms else time.time() + DEFAULT_TOKEN_SECONDS
+        self.logins += 1
+
+        # Fresh pool sessions with the login session's cookies (session-based auth needs them)
+        fresh = queue.Queue()
+        for _ in range(self.size):
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.cookies.update(login_session.cookies)
+            fresh.put(session)
+        self.sessions = fresh
+
+    def get_token(self) -> str:
+        """The shared token, logging in again when it is about to expire"""
+        with self.lock:
+            if self.token is None or time.time() > self.expires - TOKEN_MARGIN_SECONDS:
+                self._login()
+            return self.token
+
+    def adopt(self, token: str) -> None:
+        """A query refreshed an expired token on its own - share the new one"""
+        with self.lock:
+            if token and token != self.token:
+                self.token = token
+                self.expires = time.time() + DEFAULT_TOKEN_SECONDS
+
+    @contextmanager
+    def session(self):
+        """Borrow a pooled session (blocks while all are in use); logs in first if needed"""
+        self.get_token()
+        sessions = self.sessions
+        session = sessions.get()
+        try:
+            yield session
+        finally:
+            sessions.put(session)
+
+
+class TractCache:
+    """Tract rows for all mills per field list, kept for ttl seconds, one pull at a time per field list"""
+
+    def __init__(self, pool: SessionPool, ttl: float = CACHE_TTL_SECONDS, mills: List[str] = MILLS):
+        self.pool = pool
+        self.ttl = ttl
+        self.mills = mills
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.key_locks = {}
+
+    def get(self, fields: Tuple[str, ...]) -> Tuple[Dict, bool]:
+        """(entry, hit) for a field list; entry is {"frame", "query_log", "fetched_at", "fetch_seconds"}"""
+        with self.lock:
+            key_lock = self.key_locks.setdefault(fields, threading.Lock())
+        with key_lock:
+            entry = self.entries.get(fields)
+            if entry and time.time() - entry["fetched_at"] < self.ttl:
+                return entry, True
+            entry = self._fetch(fields)
+            with self.lock:
+                self.entries[fields] = entry
+            return entry, False
+
+    def _fetch(self, fields: Tuple[str, ...]) -> Dict:
+        """Query every mill, the mills split across the pool sessions"""
+        start = time.time()
+        token = self.pool.get_token()
+        chunks = [self.mills[i::self.pool.size] for i in range(self.pool.size)]
+
+        def fetch_chunk(chunk):
+            with self.pool.session() as session:
+                frame, log, new_token, _ = query_mill_rows(self.pool.url, chunk, ",".join(fields), self.pool.username,
+                                                           self.pool.password, token, session)
+            self.pool.adopt(new_token)
+            return frame, log
+
+        with ThreadPoolExecutor(max_workers=self.pool.size) as executor:
+            parts = list(executor.map(fetch_chunk, [c for c in chunks if c]))
+
+        logs = {}
+        for _, log in parts:
+            logs.update(log)
+        frame = add_report_month(combine_frames([frame for frame, _ in parts]))
+        return {
+            "frame": frame,
+            "query_log": {mill: logs[mill] for mill in self.mills if mill in logs},
+            "fetched_at": time.time(),
+            "fetch_seconds": round(time.time() - start, 2),
+        }
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> List[Dict]:
+        with self.lock:
+            return [{"fields": list(fields), "rows": len(entry["frame"]),
+                     "age_seconds": round(time.time() - entry["fetched_at"], 1),
+                     "fetch_seconds": entry["fetch_seconds"]} for fields, entry in self.entries.items()]
+
+
+class ReportService:
+    """Report computation over the cached tract rows, with rendered responses cached per data version"""
+
+    def __init__(self, pool: SessionPool, cache: Optional[TractCache] = None):
+        self.pool = pool
+        self.cache = cache or TractCache(pool)
+        self.responses = OrderedDict()
+        self.responses_lock = threading.Lock()
+        self._harvest_fields = None
+
+    def harvest_fields(self) -> Tuple[str, ...]:
+        if self._harvest_fields is None:
+            with self.pool.session() as session:
+                self._harvest_fields = tuple(select_out_fields(self.pool.url, HARVEST_FIELDS, required=["report_location"],
+                                                               session=session, token=self.pool.get_token()))
+        return self._harvest_fields
+
+    def _dataset(self, field: Optional[str] = None) -> Tuple[Dict, bool]:
+        """The harvest dataset, or a report_location + field pull if field isn't part of it"""
+        fields = self.harvest_fields()
+        if field and field.lower() not in (f.lower() for f in fields):
+            with self.pool.session() as session:
+                fields = tuple(select_out_fields(self.pool.url, [field], required=["report_location", field],
+                                                 session=session, token=self.pool.get_token()))
+        return self.cache.get(fields)
+
+    def render(self, report: str, params: Dict[str, str]) -> Tuple[str, bytes, bool]:
+        """(content type, body, cache hit) for /reports/<report>"""
+        output_format = params.get("format", "json")
+        if output_format not in ("json", "csv"):
+            raise ValueError(f"Unknown format: {output_format}")
+        if report not in REPORTS:
+            raise UnknownReport(report)
+        field = params.get("field", "harvest_status") if report == "mill" else None
+        entry, data_hit = self._dataset(field)
+
+        key = (report, tuple(sorted(params.items())), entry["fetched_at"])
+        with self.responses_lock:
+            if key in self.responses:
+                self.responses.move_to_end(key)
+                content_type, body = self.responses[key]
+                return content_type, body, True
+
+        document, table = self._report(report, params, entry, field)
+        if output_format == "csv":
+            content_type, body = "text/csv", table.to_csv(index=False).encode("utf-8")
+        else:
+            content_type, body = "application/json", json.dumps(document, indent=2, default=str).encode("utf-8")
+
+        with self.responses_lock:
+            self.responses[key] = (content_type, body)
+            while len(self.responses) > RESPONSE_CACHE_SIZE:
+                self.responses.popitem(last=False)
+        return content_type, body, data_hit
+
+    def _report(self, report: str, params: Dict[str, str], entry: Dict, field: Optional[str]):
+        """(JSON document, CSV table) of one report"""
+        frame, query_log = entry["frame"], entry["query_log"]
+        metadata = {"data_fetched_at": entry["fetched_at"], "data_age_seconds": round(time.time() - entry["fetched_at"], 1)}
+
+        if report == "mill":
+            resolved = next((c for c in frame.columns if c.lower() == field.lower()), field)
+            summary = aggregate(frame, value_fields=[resolved])
+            results = mill_results(summary, query_log)
+            return report_document(summary, results, dict(metadata, activity_field=resolved)), mill_table(results)
+
+        if "start" in params or "end" in params:
+            months = [f"{y}-{m:02d}" for y, m in month_range(params.get("start", params.get("end")),
+                                                              params.get("end", params.get("start")))]
+            if not months:
+                raise ValueError("Empty month range")
+            summaries = aggregate_by(frame, "report_month", months, HARVEST_VALUE_FIELDS, HARVEST_DISTINCT_FIELDS)
+            batch = {month: mill_results(summary, query_log) for month, summary in summaries.items()}
+            return batch_document(summaries, batch, dict(metadata, report_type="harvest_report_batch")), batch_table(batch)
+
+        if "month" in params:
+            year, month = parse_month(params["month"])
+            key = f"{year}-{month:02d}"
+            summary = aggregate_by(frame, "report_month", [key], HARVEST_VALUE_FIELDS, HARVEST_DISTINCT_FIELDS)[key]
+            metadata = dict(metadata, month_filter=key)
+        else:
+            summary = aggregate(frame, HARVEST_VALUE_FIELDS, HARVEST_DISTINCT_FIELDS)
+            metadata = dict(metadata, month_filter="all_months")
+        results = mill_results(summary, query_log)
+        return report_document(summary, results, dict(metadata, report_type="harvest_report")), mill_table(results)
+
+    def refresh(self) -> None:
+        self.cache.clear()
+        with self.responses_lock:
+            self.responses.clear()
+
+    def status(self) -> Dict:
+        return {
+            "status": "ok",
+            "logins": self.pool.logins,
+            "token_expires_in": round(self.pool.expires - time.time()) if self.pool.token else None,
+            "cache_ttl_seconds": self.cache.ttl,
+            "datasets": self.cache.stats(),
+            "cached_responses": len(self.responses),
+        }
+
+
+def make_handler(service: ReportService):
+    """Request handler class bound to a ReportService"""
+
+    class ReportHandler(BaseHTTPRequestHandler):
+
+        def _send(self, status: int, content_type: str, body: bytes, headers: Optional[Dict] = None) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status: int, data: Dict) -> None:
+            self._send(status, "application/json", json.dumps(data, indent=2, default=str).encode("utf-8"))
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            start = time.perf_counter()
+            try:
+                if url.path == "/health":
+                    return self._send_json(200, service.status())
+                if url.path == "/cache":
+                    return self._send_json(200, {"datasets": service.cache.stats()})
+                if url.path.startswith("/reports/"):
+                    content_type, body, hit = service.render(url.path[len("/reports/"):], params)
+                    return self._send(200, content_type, body, {
+                        "X-Cache": "hit" if hit else "miss",
+                        "X-Report-Ms": f"{(time.perf_counter() - start) * 1000:.1f}",
+                    })
+                return self._send_json(404, {"error": f"Unknown path {url.path}"})
+            except UnknownReport as e:
+                return self._send_json(404, {"error": f"Unknown report '{e}'"})
+            except ValueError as e:
+                return self._send_json(400, {"error": str(e)})
+            except Exception as e:
+                return self._send_json(500, {"error": str(e)})
+
+        def do_POST(self):
+            if urlparse(self.path).path == "/cache/refresh":
+                service.refresh()
+                return self._send_json(200, {"status": "cache cleared"})
+            return self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def log_message(self, format, *args):
+            print(f"{self.address_string()} - {format % args}")
+
+    return ReportHandler
+
+
+def serve(service: ReportService, host: str = SERVICE_HOST, port: int = SERVICE_PORT) -> ThreadingHTTPServer:
+    """Start the HTTP server in a background thread and return it (stop with shutdown())"""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    username = os.getenv("CANFOR_USERNAME")
+    password = os.getenv("CANFOR_PASSWORD")
+    if not username or not password:
+        print("ERROR: set CANFOR_USERNAME and CANFOR_PASSWORD")
+        sys.exit(1)
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else SERVICE_PORT
+    service = ReportService(SessionPool(username, password))
+    server = serve(service, port=port)
+    print(f"Harvest report service on http://{SERVICE_HOST}:{port} (cache TTL {CACHE_TTL_SECONDS}s, {POOL_SIZE} sessions)")
+    print("  /reports/harvest?month=2024-05  /reports/mill?field=harvest_status  format=csv  /health")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()